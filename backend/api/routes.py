@@ -1,5 +1,9 @@
+import inspect
+import logging
+from datetime import datetime
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Optional, Union
+from typing import Any, Callable, Optional, Union
+from backend.services.search import local_search_service
 from backend.services.telegram import TelegramService
 from backend.api.models import (
     SendMessageRequest,
@@ -8,6 +12,8 @@ from backend.api.models import (
     EditMessageRequest,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -18,6 +24,69 @@ async def health_check():
     return {"status": "ok", "connected": client.is_connected()}
 
 
+async def _stats_section(name: str, build: Callable[[], Any]) -> Any:
+    """One /stats section; a failing service reports its error instead of the section."""
+    try:
+        result = build()
+        return await result if inspect.isawaitable(result) else result
+    except Exception as e:
+        logger.error(f"Stats section {name} failed: {e}")
+        return {"error": str(e)}
+
+
+@router.get("/stats")
+async def get_stats():
+    try:
+        from backend.database import get_db_stats
+        from backend.services.ai import ai_service
+        from backend.services.consolidation import fact_consolidation_service
+        from backend.services.conversation import conversation_service
+        from backend.services.extraction_queue import extraction_queue
+        from backend.services.learning import learning_service
+        from backend.services.persistence import message_writer
+        from backend.services.telegram_scheduler import telegram_scheduler
+
+        async def extraction_stats():
+            return {
+                **extraction_queue.stats(),
+                "queue_depth": await extraction_queue.queue_depth(),
+            }
+
+        sections = {
+            "database": get_db_stats,
+            "persistence": message_writer.stats,
+            "extraction": extraction_stats,
+            "ai_rate_limiter": ai_service.rate_limiter.stats,
+            "extraction_cache": ai_service.extraction_cache.stats,
+            "semantic_retrieval": ai_service.fact_retriever.stats,
+            "history_buffer": ai_service.history_buffer.stats,
+            "fact_cache": ai_service.fact_cache.stats,
+            "reply_prompt": ai_service.prompt_builder.stats,
+            "reply_timing": conversation_service.stats,
+            "reply_admission": conversation_service.admission.stats,
+            "ingestion": lambda: {
+                "telegram_rpc": telegram_scheduler.stats(),
+                "dialogs": learning_service.ingest_progress,
+            },
+            "prefilter": learning_service.prefilter.stats,
+            "fact_consolidation": fact_consolidation_service.stats,
+        }
+        return {name: await _stats_section(name, build) for name, build in sections.items()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/prefilter/eval")
+async def evaluate_prefilter(chat_id: Optional[int] = None, limit: int = 5000):
+    """Reports what the learning pre-filter would skip on stored messages."""
+    from backend.services.learning import learning_service
+
+    try:
+        return await learning_service.evaluate_prefilter(chat_id=chat_id, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/me")
 async def get_me():
     try:
@@ -174,6 +243,23 @@ async def search_messages(chat_id: Union[int, str], query: str, limit: int = 20)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search")
+async def search_local(
+    query: str,
+    chat_id: Optional[int] = None,
+    sender_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+):
+    try:
+        return await local_search_service.search(
+            query, chat_id=chat_id, sender_id=sender_id, since=since, until=until, limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/users/{user_id}/status")
 async def get_user_status(user_id: Union[int, str]):
     try:
@@ -1,3 +1,4 @@
+from contextvars import ContextVar
 from telethon import TelegramClient
 from telethon.sessions import StringSession
 from backend.settings import settings
@@ -5,6 +6,22 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Set by the RPC scheduler around its calls: FloodWaits must reach it instead of
+# being slept through inside Telethon. Other callers keep Telethon's auto-sleep.
+flood_sleep_disabled: ContextVar[bool] = ContextVar("flood_sleep_disabled", default=False)
+
+
+class SchedulerAwareClient(TelegramClient):
+    """TelegramClient whose flood_sleep_threshold is 0 inside scheduled calls."""
+
+    @property
+    def flood_sleep_threshold(self):
+        return 0 if flood_sleep_disabled.get() else self._flood_sleep_threshold
+
+    @flood_sleep_threshold.setter
+    def flood_sleep_threshold(self, value):
+        self._flood_sleep_threshold = min(value or 0, 24 * 60 * 60)
+
 
 # Mock for testing environment if API keys are missing
 class MockClient:
@@ -43,13 +60,13 @@ def get_client():
         return MockClient()
 
     if settings.TELEGRAM_SESSION_STRING:
-        return TelegramClient(
+        return SchedulerAwareClient(
             StringSession(settings.TELEGRAM_SESSION_STRING),
             settings.TELEGRAM_API_ID,
             settings.TELEGRAM_API_HASH,
         )
     else:
-        return TelegramClient(
+        return SchedulerAwareClient(
             settings.TELEGRAM_SESSION_NAME, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH
         )
 
@@ -1,18 +1,124 @@
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
+from enum import Enum
 import os
+import sqlite3
+import threading
+from sqlalchemy import Index, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, Field, create_engine, Session, text
+from backend.settings import settings
 
 # Database setup
 # Use absolute path for database to avoid issues when running from different directories
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sqlite_file_name = os.path.join(BASE_DIR, "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
 
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+_engine_kwargs = dict(
+    connect_args={
+        "check_same_thread": False,
+        "timeout": settings.DB_BUSY_TIMEOUT_MS / 1000,
+    },
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+# Sync engine: schema creation, migrations and offline scripts
+engine = create_engine(sqlite_url, **_engine_kwargs)
+# Async engine: every runtime read/write from the event loop (see backend.repository)
+async_engine = create_async_engine(async_sqlite_url, **_engine_kwargs)
+
+
+class LockContentionCounter:
+    """Thread-safe counter of 'database is locked' errors seen by the engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def increment(self):
+        with self._lock:
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def reset(self):
+        with self._lock:
+            self._count = 0
+
+
+lock_contention = LockContentionCounter()
+
+
+def is_database_locked_error(error: BaseException) -> bool:
+    # SQLAlchemy wraps the DBAPI error; the sqlite3 one is kept in `.orig`
+    error = getattr(error, "orig", None) or error
+    return isinstance(error, sqlite3.OperationalError) and "database is locked" in str(error)
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """Applies the configured storage profile to a raw SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_SIZE)}")
+        # Negative cache_size is interpreted by SQLite as KiB instead of pages
+        cursor.execute(f"PRAGMA cache_size={-abs(int(settings.DB_CACHE_SIZE_KB))}")
+    finally:
+        cursor.close()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection)
+
+
+def _on_handle_error(exception_context):
+    if is_database_locked_error(exception_context.original_exception):
+        lock_contention.increment()
+
+
+for _sync_engine in (engine, async_engine.sync_engine):
+    event.listen(_sync_engine, "connect", _on_connect)
+    event.listen(_sync_engine, "handle_error", _on_handle_error)
+
+
+def _pool_stats(pool) -> Dict[str, Any]:
+    stats = {}
+    for attr in ("size", "checkedout", "overflow", "checkedin"):
+        if hasattr(pool, attr):
+            stats[attr] = getattr(pool, attr)()
+    return stats
+
+
+def get_db_stats() -> Dict[str, Any]:
+    """Returns storage and pool statistics for tuning concurrent writers."""
+    stats: Dict[str, Any] = {
+        "journal_mode": settings.DB_JOURNAL_MODE,
+        "synchronous": settings.DB_SYNCHRONOUS,
+        "lock_contention_count": lock_contention.count,
+    }
+    for attr, value in _pool_stats(engine.pool).items():
+        stats[f"pool_{attr}"] = value
+    for attr, value in _pool_stats(async_engine.pool).items():
+        stats[f"async_pool_{attr}"] = value
+    return stats
 
 
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_message_chat_telegram_id", "chat_id", "telegram_message_id", unique=True),
+        Index("ix_message_chat_date", "chat_id", "date"),
+        Index("ix_message_date", "date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     telegram_message_id: int
     chat_id: int
@@ -24,14 +130,214 @@ class Message(SQLModel, table=True):
 
 
 class Fact(SQLModel, table=True):
+    __table_args__ = (
+        # Tiered context retrieval: scope + category, newest first. superseded_by
+        # makes them covering, so ranking reads no table rows
+        Index(
+            "ix_fact_chat_category_created", "chat_id", "category", "created_at", "superseded_by"
+        ),
+        Index(
+            "ix_fact_sender_category_created",
+            "sender_id",
+            "category",
+            "created_at",
+            "superseded_by",
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chat_id: int
     sender_id: Optional[int] = Field(default=None)
     entity_name: str  # e.g., "User's Name", "Favorite Color"
     value: str
     category: str = "general"  # personal, work, preference, etc.
-    source_message_id: Optional[int] = None
+    source_message_id: Optional[int] = None  # Primary source (last message supporting it)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Maintained by fact consolidation: duplicates are merged into the newest row,
+    # so created_at is the last mention and first_seen_at the earliest one
+    mention_count: int = 1
+    first_seen_at: Optional[datetime] = None
+    superseded_by: Optional[int] = None  # Newer fact that replaced this value
+
+
+class FactSource(SQLModel, table=True):
+    """Links a fact to every message it was extracted from (a conversation window)."""
+
+    __tablename__ = "fact_source"
+    __table_args__ = (Index("ix_fact_source_message", "message_id"),)
+
+    fact_id: int = Field(primary_key=True)
+    message_id: int = Field(primary_key=True)
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ExtractionJob(SQLModel, table=True):
+    """Durable fact extraction job, one per stored message."""
+
+    __tablename__ = "extraction_job"
+    __table_args__ = (Index("ix_extraction_job_status_next", "status", "next_attempt_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    message_id: int = Field(unique=True)  # Message.id (DB ID)
+    chat_id: int
+    sender_id: Optional[int] = None
+    status: str = Field(default=JobStatus.PENDING.value)
+    attempts: int = 0
+    facts_count: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class BackfillCheckpoint(SQLModel, table=True):
+    """Telegram message ID range already covered by the streaming backfill of a chat."""
+
+    __tablename__ = "backfill_checkpoint"
+
+    chat_id: int = Field(primary_key=True)
+    oldest_id: int  # Oldest telegram_message_id covered
+    newest_id: int  # Newest telegram_message_id covered
+    reached_start: bool = False  # The whole history down to the first message is covered
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ExtractionCacheEntry(SQLModel, table=True):
+    """Validated extraction result for a normalized text + prompt/model version."""
+
+    __tablename__ = "extraction_cache"
+    __table_args__ = (Index("ix_extraction_cache_last_used", "last_used_at"),)
+
+    key: str = Field(primary_key=True)  # sha256(version + normalized text)
+    facts_json: str  # JSON list of ExtractedFact dicts (may be empty)
+    hits: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_used_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# Bound parameters per statement in SQLite before 3.32 (later versions allow 32766).
+# Statements are sized for the old default so any SQLite build accepts them.
+SQLITE_MAX_VARIABLES = 999
+# Keys per IN (...) lookup; composite (chat_id, telegram_message_id) keys bind two each
+BULK_INSERT_CHUNK_SIZE = SQLITE_MAX_VARIABLES // 2
+
+
+def rows_per_statement(rows: List[Dict[str, Any]]) -> int:
+    """Rows per multi-row INSERT so that their bound columns fit SQLITE_MAX_VARIABLES."""
+    return max(1, SQLITE_MAX_VARIABLES // max(1, len(rows[0]) if rows else 1))
+
+
+def message_insert_statements(rows: List[Dict[str, Any]]):
+    """
+    Yields INSERT ... ON CONFLICT DO NOTHING statements on (chat_id, telegram_message_id),
+    chunked to stay under SQLite's bound parameter limit.
+    """
+    size = rows_per_statement(rows)
+    for i in range(0, len(rows), size):
+        chunk = rows[i : i + size]
+        yield (
+            sqlite_insert(Message)
+            .values(chunk)
+            .on_conflict_do_nothing(index_elements=["chat_id", "telegram_message_id"])
+        )
+
+
+def bulk_insert_messages(session: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserts message rows ignoring duplicates. Returns the number of rows actually inserted.
+    The caller is responsible for committing the session.
+    """
+    inserted = 0
+    for statement in message_insert_statements(rows):
+        result = session.execute(statement)
+        inserted += max(result.rowcount or 0, 0)
+    return inserted
+
+
+def _migrate_message_indexes(connection):
+    """
+    Removes duplicate messages and creates the Message indexes on pre-existing tables.
+    Facts, fact sources and extraction jobs pointing at a duplicate are moved to the
+    row that is kept (the lowest ID of its group) first.
+    """
+    connection.execute(text("DROP TABLE IF EXISTS temp.message_keep"))
+    connection.execute(
+        text(
+            "CREATE TEMP TABLE message_keep AS "
+            "SELECT m.id AS old_id, k.keep_id AS new_id FROM message m JOIN ("
+            "SELECT chat_id, telegram_message_id, MIN(id) AS keep_id FROM message "
+            "GROUP BY chat_id, telegram_message_id HAVING COUNT(*) > 1) k "
+            "ON m.chat_id = k.chat_id AND m.telegram_message_id = k.telegram_message_id "
+            "WHERE m.id != k.keep_id"
+        )
+    )
+    remap = "(SELECT new_id FROM message_keep WHERE old_id = {column})"
+    moved = "{column} IN (SELECT old_id FROM message_keep)"
+    for table, column in (
+        ("fact", "source_message_id"),
+        ("fact_source", "message_id"),
+        ("extraction_job", "message_id"),
+    ):
+        # OR IGNORE: the kept message may already have the same link or job
+        connection.execute(
+            text(
+                f"UPDATE OR IGNORE {table} SET {column} = {remap.format(column=column)} "
+                f"WHERE {moved.format(column=column)}"
+            )
+        )
+        connection.execute(text(f"DELETE FROM {table} WHERE {moved.format(column=column)}"))
+    connection.execute(text("DELETE FROM message WHERE id IN (SELECT old_id FROM message_keep)"))
+    connection.execute(text("DROP TABLE message_keep"))
+    for index in Message.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    connection.commit()
+
+
+# Full-text search (FTS5) over message text and fact entity/value.
+# External-content tables kept in sync with their source tables by triggers,
+# so every insert path (bulk ingestion, write-behind queue, fact saves) is covered.
+FTS_TABLES = {
+    "message_fts": ("message", ["text"]),
+    "fact_fts": ("fact", ["entity_name", "value"]),
+}
+
+
+def _fts_statements(fts_table: str, source_table: str, columns: List[str]) -> List[str]:
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+    delete_old = f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});"
+    insert_new = f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{cols}, content='{source_table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source_table} "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source_table} "
+        f"BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source_table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_fts_tables(connection):
+    """Creates FTS5 tables and sync triggers, rebuilding the index for pre-existing rows."""
+    for fts_table, (source_table, columns) in FTS_TABLES.items():
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": fts_table},
+        ).first()
+        for statement in _fts_statements(fts_table, source_table, columns):
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
 
 
 def migrate_db():
@@ -45,6 +351,40 @@ def migrate_db():
                 print("Migrating DB: Adding sender_id to fact table...")
                 connection.execute(text("ALTER TABLE fact ADD COLUMN sender_id INTEGER"))
                 connection.commit()
+            for column, ddl in (
+                ("mention_count", "INTEGER NOT NULL DEFAULT 1"),
+                ("first_seen_at", "DATETIME"),
+                ("superseded_by", "INTEGER"),
+            ):
+                if column not in columns:
+                    print(f"Migrating DB: Adding {column} to fact table...")
+                    connection.execute(text(f"ALTER TABLE fact ADD COLUMN {column} {ddl}"))
+                    connection.commit()
+
+            result = connection.execute(text("PRAGMA index_list(message)"))
+            indexes = [row.name for row in result]
+            if "ix_message_chat_telegram_id" not in indexes:
+                print("Migrating DB: Deduplicating messages and adding message indexes...")
+                _migrate_message_indexes(connection)
+
+            result = connection.execute(text("PRAGMA index_list(fact)"))
+            if "ix_fact_chat_category_created" not in [row.name for row in result]:
+                print("Migrating DB: Adding fact tier indexes...")
+                for index in Fact.__table__.indexes:
+                    index.create(connection, checkfirst=True)
+                connection.commit()
+
+            has_links = connection.execute(text("SELECT 1 FROM fact_source LIMIT 1")).first()
+            if not has_links:
+                # Facts from before conversation windows have exactly one source
+                connection.execute(
+                    text(
+                        "INSERT OR IGNORE INTO fact_source (fact_id, message_id) "
+                        "SELECT id, source_message_id FROM fact "
+                        "WHERE source_message_id IS NOT NULL"
+                    )
+                )
+                connection.commit()
         except Exception as e:
             print(f"Migration warning: {e}")
 
@@ -52,6 +392,17 @@ def migrate_db():
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
     migrate_db()
+    try:
+        with engine.begin() as connection:
+            create_fts_tables(connection)
+    except Exception as e:
+        print(f"Full-text index warning: {e}")
+
+
+async def dispose_engines():
+    """Closes pooled connections (the aiosqlite worker threads keep the process alive)."""
+    await async_engine.dispose()
+    engine.dispose()
 
 
 def get_session():
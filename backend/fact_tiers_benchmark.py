@@ -0,0 +1,164 @@
+"""
+Micro-benchmark of tiered context fact retrieval: the former three round trips
+(core tier, work tier, NOT IN fill) against the single ROW_NUMBER() query of
+Repository.get_facts_for_context, on a synthetic fact table.
+
+    python -m backend.fact_tiers_benchmark --facts 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine, select
+
+from backend.database import Fact
+from backend.repository import CORE_FACT_CATEGORIES, WORK_FACT_CATEGORIES, Repository
+from backend.settings import settings
+
+OTHER_CATEGORIES = ["general", "evento", "lugar", "saude"]
+CATEGORIES = CORE_FACT_CATEGORIES + WORK_FACT_CATEGORIES + OTHER_CATEGORIES
+
+
+async def legacy_facts_for_context(
+    repo: Repository, chat_id: int, sender_id: Optional[int], limit: int
+) -> List[Fact]:
+    """The pre-window-function implementation, kept for comparison."""
+    scope = repo._fact_scope(chat_id, sender_id) & Fact.superseded_by.is_(None)
+    collected_ids = set()
+    final_facts: List[Fact] = []
+    async with repo.session() as session:
+        for categories, tier_limit in (
+            (CORE_FACT_CATEGORIES, settings.FACT_TIER_CORE_LIMIT),
+            (WORK_FACT_CATEGORIES, settings.FACT_TIER_WORK_LIMIT),
+        ):
+            result = await session.exec(
+                select(Fact)
+                .where(scope)
+                .where(Fact.category.in_(categories))
+                .order_by(Fact.created_at.desc())
+                .limit(tier_limit)
+            )
+            for f in result.all():
+                if f.id not in collected_ids:
+                    final_facts.append(f)
+                    collected_ids.add(f.id)
+
+        remaining = limit - len(final_facts)
+        if remaining > 0:
+            result = await session.exec(
+                select(Fact)
+                .where(scope)
+                .where(Fact.id.notin_(list(collected_ids)))
+                .order_by(Fact.created_at.desc())
+                .limit(remaining)
+            )
+            final_facts.extend(result.all())
+    final_facts.sort(key=lambda x: x.created_at, reverse=True)
+    return final_facts
+
+
+def populate(path: str, n_facts: int, n_chats: int, n_senders: int, seed: int = 0):
+    """Creates the schema and bulk-loads `n_facts` random facts with raw sqlite3."""
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    connection = sqlite3.connect(path)
+    rows = (
+        (
+            rng.randrange(n_chats),
+            rng.randrange(n_senders),
+            f"entity {i}",
+            f"value {i}",
+            rng.choice(CATEGORIES),
+            (start + timedelta(seconds=i * 30)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+        )
+        for i in range(n_facts)
+    )
+    connection.executemany(
+        "INSERT INTO fact (chat_id, sender_id, entity_name, value, category, created_at, "
+        "mention_count) VALUES (?, ?, ?, ?, ?, ?, 1)",
+        rows,
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+async def run(
+    n_facts: int = 1_000_000,
+    n_chats: int = 2_000,
+    n_senders: int = 10_000,
+    queries: int = 200,
+    limit: int = 50,
+) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "facts.db")
+        started = time.perf_counter()
+        populate(path, n_facts, n_chats, n_senders)
+        print(f"Loaded {n_facts} facts in {time.perf_counter() - started:.1f}s")
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        repo = Repository(engine)
+        rng = random.Random(1)
+        scopes: List[Tuple[int, int]] = [
+            (rng.randrange(n_chats), rng.randrange(n_senders)) for _ in range(queries)
+        ]
+
+        results = {}
+        implementations = {
+            "three_queries": lambda c, s: legacy_facts_for_context(repo, c, s, limit),
+            "row_number": lambda c, s: repo.get_facts_for_context(c, s, limit),
+        }
+        for name, fetch in implementations.items():
+            await fetch(*scopes[0])  # Warm the page cache
+            timings = []
+            for chat_id, sender_id in scopes:
+                started = time.perf_counter()
+                await fetch(chat_id, sender_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                "mean_ms": statistics.mean(timings),
+                "p50_ms": timings[len(timings) // 2],
+                "p95_ms": timings[int(len(timings) * 0.95)],
+            }
+
+        mismatches = 0
+        for chat_id, sender_id in scopes[:20]:
+            old = await legacy_facts_for_context(repo, chat_id, sender_id, limit)
+            new = await repo.get_facts_for_context(chat_id, sender_id, limit)
+            mismatches += {f.id for f in old} != {f.id for f in new}
+        print(f"Result mismatches on 20 scopes: {mismatches}")
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiered fact retrieval benchmark.")
+    parser.add_argument("--facts", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(n_facts=args.facts, queries=args.queries))
+    print(f"{'method':<14} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, timing in results.items():
+        print(
+            f"{name:<14} {timing['mean_ms']:>8.2f} {timing['p50_ms']:>8.2f} "
+            f"{timing['p95_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
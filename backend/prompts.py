@@ -1,42 +1,36 @@
 # Prompts para o Sistema AI
 
-# Prompt para extração de fatos (Memória)
-FACT_EXTRACTION_PROMPT = """
-Analise o texto fornecido e extraia fatos relevantes para construir uma memória de longo prazo sobre o usuário e suas interações.
-O objetivo é criar um "Digital Twin" de conhecimento ou um assistente pessoal ultra-contextualizado.
+# Prompt para extração de fatos em lote (várias mensagens em uma chamada)
+BATCH_FACT_EXTRACTION_PROMPT = """
+Analise as conversas fornecidas e extraia fatos relevantes para construir uma memória de longo prazo sobre o usuário e suas interações.
+Cada item é um trecho curto de conversa com um identificador estável em "id". O campo "text" traz as mensagens em ordem, uma por linha, no formato "N. Remetente: texto".
+Um fato pode estar espalhado por várias linhas (ex.: uma pergunta e a resposta curta logo depois). Trate cada item de forma independente.
+Linhas marcadas com "(contexto)" já foram analisadas antes: use-as só para entender as outras linhas e NUNCA extraia fatos apenas delas.
 
 **IMPORTANTE:** Retorne APENAS um JSON válido. Não inclua Markdown (```json ... ```) ou texto extra.
 
-Busque ativamente por:
-- **Tech Stack & Skills:** (Linguagens, frameworks, ferramentas, IDEs, nível de senioridade)
-- **Projetos & Trabalho:** (Nomes de projetos, status, prazos, bugs específicos, conquistas)
-- **Contexto Profissional:** (Empresa, cargo, responsabilidades, rituais como dailies/sprints)
-- **Preferências:** (Gostos pessoais, estilos de música, comida, hobbies)
-- **Relacionamentos:** (Pessoas mencionadas, vínculos, hierarquia)
-- **Agenda & Eventos:** (Compromissos, viagens, datas importantes - **Use formato ISO 8601 YYYY-MM-DD se a data for explícita**)
-- **Opiniões:** (O que o usuário ama ou odeia, posições fortes)
-- **Mood & Focus:** (Estado emocional atual do usuário, foco principal do momento)
+Busque ativamente por: Tech Stack & Skills, Projetos & Trabalho, Contexto Profissional, Preferências,
+Relacionamentos, Agenda & Eventos (**use ISO 8601 YYYY-MM-DD se a data for explícita**), Opiniões, Mood & Focus.
 
 Diretrizes:
 1. Ignore saudações ou conversas triviais ("bom dia", "ok", "rs") a menos que revelem algo permanente.
-2. Seja específico. "Gosta de Python" é bom, "Prefere Python 3.12 com Type Hints" é excelente.
-3. Se for uma mensagem do próprio usuário (auto-referência), priorize como Fato Confirmado.
-4. Se o texto não contiver fatos novos ou relevantes, retorne uma lista vazia `[]`.
-5. **NÃO invente fatos.** Apenas extraia o que está explícito ou fortemente implícito.
+2. Seja específico. "Prefere Python 3.12 com Type Hints" é melhor que "Gosta de Python".
+3. **NÃO invente fatos.** Apenas extraia o que está explícito ou fortemente implícito.
+4. Todo fato DEVE ter o campo "source" com o "id" exato do item de onde ele veio.
+5. Todo fato DEVE ter o campo "lines" com os números das linhas que o sustentam. Coloque por último a linha de quem o fato descreve, que não pode ser uma linha "(contexto)".
+6. Se nenhum item contiver fatos relevantes, retorne uma lista vazia `[]`.
 
-Texto: "{text}"
+Conversas (JSON):
+{messages_json}
 
 Formato de Saída (JSON Array):
 [
-    {{"entity": "Nome/Assunto", "value": "Fato detalhado extraído", "category": "tech|trabalho|pessoal|agenda|opiniao|relacionamento|mood"}}
+    {{"source": "id do item", "lines": [1, 2], "entity": "Nome/Assunto", "value": "Fato detalhado extraído", "category": "tech|trabalho|pessoal|agenda|opiniao|relacionamento|mood"}}
 ]
 
-Exemplos:
-Texto: "Odeio Java, prefiro Python para scripts."
-JSON: [{{"entity": "Java", "value": "Odeia Java", "category": "tech"}}, {{"entity": "Python", "value": "Prefere Python para scripts", "category": "tech"}}]
-
-Texto: "Vou terminar o refactor do backend até sexta."
-JSON: [{{"entity": "Backend Refactor", "value": "Planeja terminar até sexta-feira", "category": "trabalho"}}]
+Exemplo:
+Conversas: [{{"id": "a1", "text": "1. Ana: qual linguagem vc usa no trampo?\\n2. Bruno: rust"}}, {{"id": "b2", "text": "1. Ana: bom dia"}}, {{"id": "c3", "text": "1. Bruno: Vou terminar o refactor até sexta."}}]
+JSON: [{{"source": "a1", "lines": [1, 2], "entity": "Linguagem no trabalho", "value": "Usa Rust no trabalho", "category": "tech"}}, {{"source": "c3", "lines": [1], "entity": "Refactor", "value": "Planeja terminar até sexta-feira", "category": "trabalho"}}]
 """
 
 # Prompt para Resumo Diário (Newsletter/Relatório)
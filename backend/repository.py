@@ -0,0 +1,967 @@
+import logging
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+
+from sqlalchemy import (
+    and_,
+    column,
+    delete,
+    literal,
+    literal_column,
+    table,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select, func, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.database import (
+    async_engine,
+    Message,
+    Fact,
+    FactSource,
+    BackfillCheckpoint,
+    ExtractionCacheEntry,
+    ExtractionJob,
+    JobStatus,
+    message_insert_statements,
+    BULK_INSERT_CHUNK_SIZE,
+    rows_per_statement,
+)
+from backend.settings import settings
+from backend.utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Channel and supergroup IDs are "-100" + channel ID; anything above is a user or basic group
+CHANNEL_CHAT_ID_BOUND = -1_000_000_000_000
+
+message_fts = table("message_fts", column("rowid"))
+fact_fts = table("fact_fts", column("rowid"))
+
+
+def build_fts_query(query: str) -> Optional[str]:
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word becomes a quoted
+    term (all must match) and the last one also matches as a prefix.
+    Returns None if the query has no searchable words.
+    """
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] = f"{quoted[-1]}*"
+    return " ".join(quoted)
+
+
+# Tiered fact retrieval categories, in priority order.
+# Facts outside these tiers only fill the remaining slots (most recent first).
+CORE_FACT_CATEGORIES = ["pessoal", "relacionamento", "opiniao", "preference"]
+WORK_FACT_CATEGORIES = ["tech", "trabalho"]
+
+
+class Repository:
+    """
+    Async data access layer over the shared SQLite database.
+    All runtime DB work goes through here so the event loop never hands
+    queries to the default thread pool executor.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine] = None):
+        self.engine = engine or async_engine
+        # Fact versions for read caches: a global epoch plus per-chat and per-sender counters
+        self._fact_version_lock = threading.Lock()
+        self._fact_epoch = 0
+        self._chat_fact_versions: Dict[int, int] = {}
+        self._sender_fact_versions: Dict[int, int] = {}
+
+    def session(self) -> AsyncSession:
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    # --- Messages ---
+
+    async def save_messages(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk inserts messages, ignoring duplicates. Returns number of new rows."""
+        if not rows:
+            return 0
+        inserted = 0
+        async with self.session() as session:
+            for statement in message_insert_statements(rows):
+                result = await session.exec(statement)
+                inserted += max(result.rowcount or 0, 0)
+            await session.commit()
+        return inserted
+
+    async def save_message(self, row: Dict[str, Any]) -> Optional[int]:
+        """Saves a single message (ignoring duplicates) and returns its DB ID."""
+        async with self.session() as session:
+            for statement in message_insert_statements([row]):
+                await session.exec(statement)
+            await session.commit()
+            # Served by the unique (chat_id, telegram_message_id) index
+            result = await session.exec(
+                select(Message.id).where(
+                    Message.chat_id == row["chat_id"],
+                    Message.telegram_message_id == row["telegram_message_id"],
+                )
+            )
+            return result.first()
+
+    async def save_messages_returning_ids(
+        self, rows: List[Dict[str, Any]]
+    ) -> Dict[Tuple[int, int], int]:
+        """
+        Bulk inserts messages (ignoring duplicates) in one transaction and returns
+        a mapping of (chat_id, telegram_message_id) -> DB ID for every row given.
+        """
+        if not rows:
+            return {}
+        keys = list({(row["chat_id"], row["telegram_message_id"]) for row in rows})
+        ids: Dict[Tuple[int, int], int] = {}
+        async with self.session() as session:
+            for statement in message_insert_statements(rows):
+                await session.exec(statement)
+            for i in range(0, len(keys), BULK_INSERT_CHUNK_SIZE):
+                chunk = keys[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(Message.id, Message.chat_id, Message.telegram_message_id).where(
+                        tuple_(Message.chat_id, Message.telegram_message_id).in_(chunk)
+                    )
+                )
+                for db_id, chat_id, telegram_message_id in result.all():
+                    ids[(chat_id, telegram_message_id)] = db_id
+            await session.commit()
+        return ids
+
+    async def get_message_ids(
+        self, chat_id: int, telegram_message_ids: List[int]
+    ) -> Dict[int, int]:
+        """Maps telegram_message_id -> DB ID for stored messages of a chat."""
+        ids: Dict[int, int] = {}
+        async with self.session() as session:
+            for i in range(0, len(telegram_message_ids), BULK_INSERT_CHUNK_SIZE):
+                chunk = telegram_message_ids[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(Message.telegram_message_id, Message.id).where(
+                        Message.chat_id == chat_id, Message.telegram_message_id.in_(chunk)
+                    )
+                )
+                ids.update(dict(result.all()))
+        return ids
+
+    async def get_last_synced_id(self, chat_id: int) -> Optional[int]:
+        """Returns the newest stored telegram_message_id for a chat, if any."""
+        async with self.session() as session:
+            result = await session.exec(
+                select(func.max(Message.telegram_message_id)).where(Message.chat_id == chat_id)
+            )
+            return result.first()
+
+    async def get_recent_history(self, chat_id: int, limit: int = 20) -> List[Message]:
+        """Returns the last `limit` messages of a chat in chronological order."""
+        async with self.session() as session:
+            result = await session.exec(
+                select(Message)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.date.desc())
+                .limit(limit)
+            )
+            history = list(result.all())
+        history.reverse()
+        return history
+
+    async def get_message_texts(
+        self, chat_id: Optional[int] = None, limit: int = 5000
+    ) -> List[str]:
+        """Texts of the newest `limit` stored messages (optionally for one chat)."""
+        statement = select(Message.text).where(Message.text.is_not(None))
+        if chat_id is not None:
+            statement = statement.where(Message.chat_id == chat_id)
+        statement = statement.order_by(Message.id.desc()).limit(limit)
+        async with self.session() as session:
+            result = await session.exec(statement)
+            return list(result.all())
+
+    async def get_chat_messages_between(
+        self, chat_id: int, start: datetime, end: datetime
+    ) -> List[Message]:
+        """Messages of a chat within [start, end], oldest first."""
+        statement = (
+            select(Message)
+            .where(Message.chat_id == chat_id, Message.date >= start, Message.date <= end)
+            .order_by(Message.date, Message.telegram_message_id)
+        )
+        async with self.session() as session:
+            result = await session.exec(statement)
+            return list(result.all())
+
+    async def messages_since(
+        self, cutoff: datetime, chat_id: Optional[int] = None, limit: int = 5000
+    ) -> List[Message]:
+        """Returns messages newer than `cutoff` (newest first), optionally for one chat."""
+        async with self.session() as session:
+            statement = select(Message).where(Message.date >= cutoff)
+            if chat_id:
+                statement = statement.where(Message.chat_id == chat_id)
+            statement = statement.order_by(Message.date.desc()).limit(limit)
+            result = await session.exec(statement)
+            return list(result.all())
+
+    async def search_messages(
+        self,
+        query: str,
+        chat_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Full-text search over stored messages, best matches (bm25) first."""
+        match = build_fts_query(query)
+        if not match:
+            return []
+        fts = literal_column("message_fts")
+        statement = (
+            select(
+                Message,
+                func.snippet(fts, 0, "[", "]", "…", 12).label("snippet"),
+                func.bm25(fts).label("rank"),
+            )
+            .join(message_fts, message_fts.c.rowid == Message.id)
+            .where(fts.match(match))
+        )
+        if chat_id:
+            statement = statement.where(Message.chat_id == chat_id)
+        if sender_id:
+            statement = statement.where(Message.sender_id == sender_id)
+        if since:
+            statement = statement.where(Message.date >= since)
+        if until:
+            statement = statement.where(Message.date <= until)
+        statement = statement.order_by(literal_column("rank")).limit(limit)
+
+        async with self.session() as session:
+            result = await session.exec(statement)
+            return [
+                {
+                    "id": m.id,
+                    "chat_id": m.chat_id,
+                    "telegram_message_id": m.telegram_message_id,
+                    "sender_id": m.sender_id,
+                    "sender_name": m.sender_name,
+                    "date": m.date,
+                    "snippet": snippet,
+                    "rank": rank,
+                }
+                for m, snippet, rank in result.all()
+            ]
+
+    async def update_message_texts(
+        self, edits: List[Dict[str, Any]]
+    ) -> Dict[Tuple[int, int], int]:
+        """
+        Applies edits ({chat_id, telegram_message_id, text}) in one transaction.
+        Only messages whose normalized text changed are updated; facts learned from
+        them are retracted and their extraction jobs dropped so they can be queued
+        again. Returns (chat_id, telegram_message_id) -> DB ID of the changed messages.
+        """
+        if not edits:
+            return {}
+        texts = {(e["chat_id"], e["telegram_message_id"]): e["text"] or "" for e in edits}
+        keys = list(texts)
+        changed: Dict[Tuple[int, int], int] = {}
+        async with self.session() as session:
+            for i in range(0, len(keys), BULK_INSERT_CHUNK_SIZE):
+                chunk = keys[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(
+                        Message.id, Message.chat_id, Message.telegram_message_id, Message.text
+                    ).where(tuple_(Message.chat_id, Message.telegram_message_id).in_(chunk))
+                )
+                for db_id, chat_id, telegram_message_id, old_text in result.all():
+                    key = (chat_id, telegram_message_id)
+                    if normalize_text(old_text) != normalize_text(texts[key]):
+                        changed[key] = db_id
+            for key, db_id in changed.items():
+                await session.exec(
+                    update(Message).where(Message.id == db_id).values(text=texts[key])
+                )
+            retracted = await self._forget_messages(session, list(changed.values()))
+            await session.commit()
+        if retracted:
+            self._bump_fact_versions()
+        return changed
+
+    async def delete_messages(
+        self, chat_id: Optional[int], telegram_message_ids: List[int]
+    ) -> Tuple[int, int]:
+        """
+        Deletes messages plus their extraction jobs and retracts facts learned from
+        them, in one transaction. Telegram omits the chat for deletions in private
+        chats and basic groups (IDs are unique per account there), so chat_id=None
+        matches every non-channel chat. Returns (messages deleted, facts retracted).
+        """
+        if not telegram_message_ids:
+            return 0, 0
+        if chat_id is None:
+            scope = Message.chat_id > CHANNEL_CHAT_ID_BOUND
+        else:
+            scope = Message.chat_id == chat_id
+        deleted = retracted = 0
+        async with self.session() as session:
+            for i in range(0, len(telegram_message_ids), BULK_INSERT_CHUNK_SIZE):
+                chunk = telegram_message_ids[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(Message.id).where(scope, Message.telegram_message_id.in_(chunk))
+                )
+                message_ids = list(result.all())
+                if not message_ids:
+                    continue
+                retracted += await self._forget_messages(session, message_ids)
+                await session.exec(delete(Message).where(Message.id.in_(message_ids)))
+                deleted += len(message_ids)
+            await session.commit()
+        if retracted:
+            self._bump_fact_versions()
+        return deleted, retracted
+
+    async def _forget_messages(self, session: AsyncSession, message_ids: List[int]) -> int:
+        """Drops extraction jobs of messages and retracts their facts. Returns facts deleted."""
+        if not message_ids:
+            return 0
+        await session.exec(delete(ExtractionJob).where(ExtractionJob.message_id.in_(message_ids)))
+        return await self._retract_facts(session, message_ids)
+
+    # --- Facts ---
+
+    def fact_version(self, chat_id: int, sender_id: Optional[int] = None) -> Tuple[int, int, int]:
+        """
+        Changes whenever facts in the scope of (chat_id, sender_id) may have changed.
+        Writers bump it only after committing, so a reader that takes the version
+        before querying can never tag stale rows with a newer version.
+        """
+        with self._fact_version_lock:
+            return (
+                self._fact_epoch,
+                self._chat_fact_versions.get(chat_id, 0),
+                self._sender_fact_versions.get(sender_id, 0) if sender_id else 0,
+            )
+
+    def _bump_fact_versions(self, rows: Optional[List[Dict[str, Any]]] = None):
+        """Bumps the chats/senders of new fact rows, or everything when rows is None."""
+        with self._fact_version_lock:
+            if rows is None:
+                self._fact_epoch += 1
+                return
+            for chat_id in {row.get("chat_id") for row in rows}:
+                self._chat_fact_versions[chat_id] = self._chat_fact_versions.get(chat_id, 0) + 1
+            for sender_id in {row.get("sender_id") for row in rows} - {None}:
+                self._sender_fact_versions[sender_id] = (
+                    self._sender_fact_versions.get(sender_id, 0) + 1
+                )
+
+    async def search_facts(
+        self,
+        query: str,
+        chat_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Full-text search over fact entity names and values, best matches first."""
+        match = build_fts_query(query)
+        if not match:
+            return []
+        fts = literal_column("fact_fts")
+        statement = (
+            select(Fact, func.bm25(fts).label("rank"))
+            .join(fact_fts, fact_fts.c.rowid == Fact.id)
+            .where(fts.match(match))
+        )
+        if chat_id and sender_id:
+            statement = statement.where(self._fact_scope(chat_id, sender_id))
+        elif chat_id:
+            statement = statement.where(Fact.chat_id == chat_id)
+        elif sender_id:
+            statement = statement.where(Fact.sender_id == sender_id)
+        statement = statement.order_by(literal_column("rank")).limit(limit)
+
+        async with self.session() as session:
+            result = await session.exec(statement)
+            return [
+                {
+                    "id": f.id,
+                    "chat_id": f.chat_id,
+                    "sender_id": f.sender_id,
+                    "entity": f.entity_name,
+                    "value": f.value,
+                    "category": f.category,
+                    "created_at": f.created_at,
+                    "rank": rank,
+                }
+                for f, rank in result.all()
+            ]
+
+    @staticmethod
+    def _fact_scope(chat_id: int, sender_id: Optional[int] = None):
+        """Facts for the chat OR the sender (context + personalization)."""
+        if sender_id:
+            return or_(Fact.chat_id == chat_id, Fact.sender_id == sender_id)
+        return Fact.chat_id == chat_id
+
+    async def get_facts_for_context(
+        self, chat_id: int, sender_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Fact]:
+        """
+        Tiered fact retrieval for conversation context, in a single query.
+        The newest FACT_TIER_CORE_LIMIT core identity facts come first, then the
+        newest FACT_TIER_WORK_LIMIT work facts, then the most recent of the rest,
+        up to `limit`. Returned newest first.
+        """
+        limit = limit or settings.AI_CONTEXT_FACT_LIMIT
+        async with self.session() as session:
+            result = await session.exec(self._tiered_facts_statement(chat_id, sender_id, limit))
+            final_facts = list(result.all())
+
+        # Newest first so the AI sees the latest info at the top
+        final_facts.sort(key=lambda x: x.created_at, reverse=True)
+        return final_facts
+
+    def _tiered_facts_statement(self, chat_id: int, sender_id: Optional[int], limit: int):
+        """
+        Each tier contributes its newest rows (a top-N read of the covering
+        (chat_id|sender_id, category, created_at, superseded_by) indexes) and the
+        fill tier the newest `limit` rows of any category. ROW_NUMBER() over each
+        fact ID keeps a fact only in its best tier; the remaining candidates are
+        ordered by tier, then recency.
+        """
+        scope = self._fact_scope(chat_id, sender_id) & Fact.superseded_by.is_(None)
+        tiers = []
+        for priority, categories, size in (
+            (0, CORE_FACT_CATEGORIES, settings.FACT_TIER_CORE_LIMIT),
+            (1, WORK_FACT_CATEGORIES, settings.FACT_TIER_WORK_LIMIT),
+            (2, None, limit),
+        ):
+            statement = select(Fact.id, Fact.created_at, literal(priority).label("tier")).where(
+                scope
+            )
+            if categories:
+                statement = statement.where(Fact.category.in_(categories))
+            # SQLite only allows ORDER BY / LIMIT in a compound member inside a subquery
+            tiers.append(select(statement.order_by(Fact.created_at.desc()).limit(size).subquery()))
+        candidates = union_all(*tiers).subquery()
+        ranked = select(
+            candidates.c.id,
+            candidates.c.created_at,
+            candidates.c.tier,
+            func.row_number()
+            .over(partition_by=candidates.c.id, order_by=candidates.c.tier)
+            .label("tier_rank"),
+        ).subquery()
+        return (
+            select(Fact)
+            .join(ranked, ranked.c.id == Fact.id)
+            .where(ranked.c.tier_rank == 1)
+            .order_by(ranked.c.tier, ranked.c.created_at.desc())
+            .limit(limit)
+        )
+
+    async def get_current_facts(self, chat_id: int, sender_id: Optional[int] = None) -> List[Fact]:
+        """The current (not superseded) facts of a chat or sender, in ID order."""
+        async with self.session() as session:
+            result = await session.exec(
+                select(Fact)
+                .where(self._fact_scope(chat_id, sender_id), Fact.superseded_by.is_(None))
+                .order_by(Fact.id)
+            )
+            return list(result.all())
+
+    async def get_facts_after(self, fact_id: int, limit: int) -> List[Fact]:
+        """Facts with an ID above `fact_id`, in ID order (for incremental scans)."""
+        async with self.session() as session:
+            result = await session.exec(
+                select(Fact).where(Fact.id > fact_id).order_by(Fact.id).limit(limit)
+            )
+            return list(result.all())
+
+    async def get_recent_facts(
+        self, chat_id: int, sender_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Fact]:
+        """Returns the most recent current facts for a chat (or sender), newest first."""
+        async with self.session() as session:
+            result = await session.exec(
+                select(Fact)
+                .where(self._fact_scope(chat_id, sender_id), Fact.superseded_by.is_(None))
+                .order_by(Fact.created_at.desc())
+                .limit(limit or settings.AI_CONTEXT_FACT_LIMIT)
+            )
+            return list(result.all())
+
+    async def save_fact_rows(self, rows: List[Dict[str, Any]]) -> int:
+        """Saves Fact rows (dicts of Fact fields) in one transaction. Returns rows saved."""
+        if not rows:
+            return 0
+        async with self.session() as session:
+            await self._add_facts(session, rows)
+            await session.commit()
+        self._bump_fact_versions(rows)
+        return len(rows)
+
+    @staticmethod
+    async def _add_facts(session: AsyncSession, rows: List[Dict[str, Any]]):
+        """
+        Adds Fact rows plus their fact_source links. A row may carry
+        "source_message_ids" (all messages of the window supporting the fact);
+        otherwise its source_message_id is the only source.
+        """
+        facts, sources = [], []
+        for row in rows:
+            row = dict(row)
+            source_ids = row.pop("source_message_ids", None) or [row.get("source_message_id")]
+            facts.append(Fact(**row))
+            sources.append({source_id for source_id in source_ids if source_id is not None})
+        session.add_all(facts)
+        await session.flush()
+        session.add_all(
+            [
+                FactSource(fact_id=fact.id, message_id=message_id)
+                for fact, message_ids in zip(facts, sources)
+                for message_id in message_ids
+            ]
+        )
+
+    @staticmethod
+    async def _retract_facts(session: AsyncSession, message_ids: List[int]) -> int:
+        """
+        Unlinks facts from (deleted or edited) source messages. Facts left without
+        any source are deleted and values they superseded become current again;
+        the rest point at their newest remaining source. Returns facts deleted.
+        """
+        result = await session.exec(
+            select(FactSource.fact_id).where(FactSource.message_id.in_(message_ids)).distinct()
+        )
+        fact_ids = list(result.all())
+        if not fact_ids:
+            return 0
+        await session.exec(delete(FactSource).where(FactSource.message_id.in_(message_ids)))
+
+        result = await session.exec(
+            select(FactSource.fact_id).where(FactSource.fact_id.in_(fact_ids)).distinct()
+        )
+        remaining = set(result.all())
+        orphans = [fact_id for fact_id in fact_ids if fact_id not in remaining]
+        if orphans:
+            await session.exec(delete(Fact).where(Fact.id.in_(orphans)))
+            await session.exec(
+                update(Fact).where(Fact.superseded_by.in_(orphans)).values(superseded_by=None)
+            )
+        if remaining:
+            newest_source = (
+                select(func.max(FactSource.message_id))
+                .where(FactSource.fact_id == Fact.id)
+                .scalar_subquery()
+            )
+            await session.exec(
+                update(Fact)
+                .where(Fact.id.in_(remaining), Fact.source_message_id.in_(message_ids))
+                .values(source_message_id=newest_source)
+            )
+        return len(orphans)
+
+    async def get_fact_source_ids(self, fact_ids: List[int]) -> Dict[int, set]:
+        """Maps fact ID -> set of source message IDs."""
+        if not fact_ids:
+            return {}
+        async with self.session() as session:
+            result = await session.exec(
+                select(FactSource.fact_id, FactSource.message_id).where(
+                    FactSource.fact_id.in_(fact_ids)
+                )
+            )
+            sources: Dict[int, set] = {}
+            for fact_id, message_id in result.all():
+                sources.setdefault(fact_id, set()).add(message_id)
+            return sources
+
+    async def message_ids_with_facts(self, source_msg_ids: List[int]) -> set:
+        """
+        Returns the subset of message DB IDs that already support a fact, as the
+        primary source or any other message of the window it was extracted from.
+        """
+        found = set()
+        async with self.session() as session:
+            for i in range(0, len(source_msg_ids), BULK_INSERT_CHUNK_SIZE):
+                chunk = source_msg_ids[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(FactSource.message_id)
+                    .where(FactSource.message_id.in_(chunk))
+                    .distinct()
+                )
+                found.update(result.all())
+        return found
+
+    async def count_facts(self) -> int:
+        async with self.session() as session:
+            result = await session.exec(select(func.count(Fact.id)))
+            return result.one()
+
+    async def get_max_fact_id(self) -> int:
+        async with self.session() as session:
+            result = await session.exec(select(func.max(Fact.id)))
+            return result.one() or 0
+
+    async def get_changed_fact_scopes(
+        self, after_id: int, up_to_id: int, chat_id: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Consolidation scopes with a fact whose ID is in (after_id, up_to_id]:
+        ("sender", sender_id), or ("chat", chat_id) for facts without a sender.
+        Only the primary key range is scanned, so unchanged scopes cost nothing.
+        """
+        statement = (
+            select(Fact.sender_id, Fact.chat_id)
+            .where(Fact.id > after_id, Fact.id <= up_to_id)
+            .distinct()
+        )
+        if chat_id is not None:
+            statement = statement.where(Fact.chat_id == chat_id)
+        async with self.session() as session:
+            result = await session.exec(statement)
+            scopes = dict.fromkeys(
+                ("sender", sender_id) if sender_id else ("chat", fact_chat_id)
+                for sender_id, fact_chat_id in result.all()
+            )
+        return list(scopes)
+
+    async def get_facts_for_consolidation(
+        self, chat_id: Optional[int] = None, scopes: Optional[List[Tuple[str, int]]] = None
+    ) -> List[Fact]:
+        """
+        All facts (current and superseded), oldest first, optionally limited to
+        one chat and/or to the given consolidation scopes.
+        """
+        statement = select(Fact).order_by(Fact.created_at, Fact.id)
+        if chat_id is not None:
+            statement = statement.where(Fact.chat_id == chat_id)
+        if scopes is not None:
+            if not scopes:
+                return []
+            sender_ids = [scope_id for kind, scope_id in scopes if kind == "sender"]
+            chat_ids = [scope_id for kind, scope_id in scopes if kind == "chat"]
+            statement = statement.where(
+                or_(
+                    Fact.sender_id.in_(sender_ids),
+                    and_(Fact.sender_id.is_(None), Fact.chat_id.in_(chat_ids)),
+                )
+            )
+        async with self.session() as session:
+            result = await session.exec(statement)
+            return list(result.all())
+
+    async def apply_fact_consolidation(
+        self, merges: List[Dict[str, Any]], superseded: Dict[int, Optional[int]]
+    ) -> int:
+        """
+        Applies a consolidation plan in one transaction. Each merge
+        ({canonical_id, duplicate_ids, mention_count, first_seen_at}) moves the
+        duplicates' source links to the canonical fact and deletes them;
+        `superseded` maps fact ID -> superseding fact ID (None = current again).
+        Returns the number of fact rows deleted.
+        """
+        deleted = 0
+        async with self.session() as session:
+            for merge in merges:
+                duplicate_ids = merge["duplicate_ids"]
+                for i in range(0, len(duplicate_ids), BULK_INSERT_CHUNK_SIZE):
+                    chunk = duplicate_ids[i : i + BULK_INSERT_CHUNK_SIZE]
+                    await session.exec(
+                        sqlite_insert(FactSource)
+                        .from_select(
+                            ["fact_id", "message_id"],
+                            select(literal(merge["canonical_id"]), FactSource.message_id).where(
+                                FactSource.fact_id.in_(chunk)
+                            ),
+                        )
+                        .on_conflict_do_nothing()
+                    )
+                    await session.exec(delete(FactSource).where(FactSource.fact_id.in_(chunk)))
+                    result = await session.exec(delete(Fact).where(Fact.id.in_(chunk)))
+                    deleted += result.rowcount
+                await session.exec(
+                    update(Fact)
+                    .where(Fact.id == merge["canonical_id"])
+                    .values(
+                        mention_count=merge["mention_count"],
+                        first_seen_at=merge["first_seen_at"],
+                    )
+                )
+            for fact_id, superseded_by in superseded.items():
+                await session.exec(
+                    update(Fact).where(Fact.id == fact_id).values(superseded_by=superseded_by)
+                )
+            await session.commit()
+        if merges or superseded:
+            self._bump_fact_versions()
+        return deleted
+
+    async def get_messages_by_ids(self, message_ids: List[int]) -> Dict[int, Message]:
+        """Returns stored messages keyed by DB ID."""
+        messages: Dict[int, Message] = {}
+        async with self.session() as session:
+            for i in range(0, len(message_ids), BULK_INSERT_CHUNK_SIZE):
+                chunk = message_ids[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(select(Message).where(Message.id.in_(chunk)))
+                messages.update({m.id: m for m in result.all()})
+        return messages
+
+    # --- Backfill checkpoints ---
+
+    async def get_backfill_checkpoint(self, chat_id: int) -> Optional[BackfillCheckpoint]:
+        async with self.session() as session:
+            return await session.get(BackfillCheckpoint, chat_id)
+
+    async def save_backfill_checkpoint(
+        self, chat_id: int, oldest_id: int, newest_id: int, reached_start: bool = False
+    ):
+        """Creates or replaces the backfill checkpoint of a chat."""
+        async with self.session() as session:
+            checkpoint = await session.get(BackfillCheckpoint, chat_id) or BackfillCheckpoint(
+                chat_id=chat_id, oldest_id=oldest_id, newest_id=newest_id
+            )
+            checkpoint.oldest_id = oldest_id
+            checkpoint.newest_id = newest_id
+            checkpoint.reached_start = reached_start
+            checkpoint.updated_at = datetime.now(timezone.utc)
+            session.add(checkpoint)
+            await session.commit()
+
+    # --- Extraction cache ---
+
+    async def get_cached_extractions(self, keys: List[str]) -> Dict[str, str]:
+        """Maps cache key -> facts JSON for the keys present, bumping their LRU stamp."""
+        if not keys:
+            return {}
+        now = datetime.now(timezone.utc)
+        found: Dict[str, str] = {}
+        async with self.session() as session:
+            for i in range(0, len(keys), BULK_INSERT_CHUNK_SIZE):
+                chunk = keys[i : i + BULK_INSERT_CHUNK_SIZE]
+                result = await session.exec(
+                    select(ExtractionCacheEntry.key, ExtractionCacheEntry.facts_json).where(
+                        ExtractionCacheEntry.key.in_(chunk)
+                    )
+                )
+                found.update(dict(result.all()))
+            if found:
+                await session.exec(
+                    update(ExtractionCacheEntry)
+                    .where(ExtractionCacheEntry.key.in_(list(found)))
+                    .values(hits=ExtractionCacheEntry.hits + 1, last_used_at=now)
+                )
+                await session.commit()
+        return found
+
+    async def save_cached_extractions(self, entries: Dict[str, str]):
+        """Stores key -> facts JSON, replacing existing entries."""
+        if not entries:
+            return
+        rows = [{"key": key, "facts_json": facts_json} for key, facts_json in entries.items()]
+        async with self.session() as session:
+            for i in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                statement = sqlite_insert(ExtractionCacheEntry).values(
+                    rows[i : i + BULK_INSERT_CHUNK_SIZE]
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={
+                        "facts_json": statement.excluded.facts_json,
+                        "last_used_at": datetime.now(timezone.utc),
+                    },
+                )
+                await session.exec(statement)
+            await session.commit()
+
+    async def evict_cached_extractions(self, max_entries: int) -> int:
+        """Deletes least recently used entries beyond `max_entries`. Returns rows deleted."""
+        async with self.session() as session:
+            total = (await session.exec(select(func.count(ExtractionCacheEntry.key)))).one()
+            excess = total - max_entries
+            if excess <= 0:
+                return 0
+            oldest = (
+                select(ExtractionCacheEntry.key)
+                .order_by(ExtractionCacheEntry.last_used_at)
+                .limit(excess)
+                .scalar_subquery()
+            )
+            await session.exec(
+                delete(ExtractionCacheEntry).where(ExtractionCacheEntry.key.in_(oldest))
+            )
+            await session.commit()
+            return excess
+
+    async def count_cached_extractions(self) -> int:
+        async with self.session() as session:
+            return (await session.exec(select(func.count(ExtractionCacheEntry.key)))).one()
+
+    # --- Extraction jobs ---
+
+    async def enqueue_extraction_jobs(self, jobs: List[Dict[str, Any]]) -> int:
+        """
+        Inserts pending jobs ({message_id, chat_id, sender_id}); messages that already
+        have a job are skipped. Returns number of new jobs.
+        """
+        if not jobs:
+            return 0
+        inserted = 0
+        size = rows_per_statement(jobs)
+        async with self.session() as session:
+            for i in range(0, len(jobs), size):
+                statement = (
+                    sqlite_insert(ExtractionJob)
+                    .values(jobs[i : i + size])
+                    .on_conflict_do_nothing(index_elements=["message_id"])
+                )
+                result = await session.exec(statement)
+                inserted += max(result.rowcount or 0, 0)
+            await session.commit()
+        return inserted
+
+    async def claim_extraction_jobs(self, limit: int) -> List[ExtractionJob]:
+        """
+        Atomically moves up to `limit` due pending jobs to running and returns them.
+        A single UPDATE ... RETURNING, so concurrent workers never claim the same job.
+        """
+        now = datetime.now(timezone.utc)
+        due = (
+            select(ExtractionJob.id)
+            .where(
+                ExtractionJob.status == JobStatus.PENDING.value,
+                ExtractionJob.next_attempt_at <= now,
+            )
+            .order_by(ExtractionJob.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        statement = (
+            update(ExtractionJob)
+            .where(ExtractionJob.id.in_(due))
+            .values(status=JobStatus.RUNNING.value, updated_at=now)
+            .returning(ExtractionJob)
+        )
+        async with self.session() as session:
+            result = await session.exec(statement)
+            jobs = list(result.scalars().all())
+            await session.commit()
+        return jobs
+
+    async def complete_extraction_jobs(
+        self,
+        facts_by_job: Dict[int, int],
+        fact_rows: Optional[List[Dict[str, Any]]] = None,
+        covered_message_ids: Optional[List[int]] = None,
+    ) -> List[int]:
+        """
+        Marks jobs as done, recording how many facts each produced. `fact_rows` are
+        saved in the same transaction, so a crash can never leave facts behind for a
+        job that will run again. Pending jobs of `covered_message_ids` (messages a
+        conversation window already extracted) are marked done too; returns the
+        message IDs whose jobs were covered that way.
+        """
+        now = datetime.now(timezone.utc)
+        covered: List[int] = []
+        async with self.session() as session:
+            if fact_rows:
+                await self._add_facts(session, fact_rows)
+            if covered_message_ids:
+                result = await session.exec(
+                    update(ExtractionJob)
+                    .where(
+                        ExtractionJob.message_id.in_(covered_message_ids),
+                        ExtractionJob.status == JobStatus.PENDING.value,
+                    )
+                    .values(status=JobStatus.DONE.value, updated_at=now)
+                    .returning(ExtractionJob.message_id)
+                )
+                covered = list(result.scalars().all())
+            for job_id, facts_count in facts_by_job.items():
+                await session.exec(
+                    update(ExtractionJob)
+                    .where(ExtractionJob.id == job_id)
+                    .values(
+                        status=JobStatus.DONE.value,
+                        facts_count=facts_count,
+                        last_error=None,
+                        updated_at=now,
+                    )
+                )
+            await session.commit()
+        if fact_rows:
+            self._bump_fact_versions(fact_rows)
+        return covered
+
+    async def retry_extraction_jobs(
+        self, job_ids: List[int], error: str, max_attempts: int, base_delay: float
+    ) -> List[int]:
+        """
+        Records a failed attempt. Jobs go back to pending with exponential backoff,
+        or to failed once they reach `max_attempts`. Returns IDs of jobs that failed.
+        """
+        now = datetime.now(timezone.utc)
+        failed = []
+        async with self.session() as session:
+            result = await session.exec(select(ExtractionJob).where(ExtractionJob.id.in_(job_ids)))
+            for job in result.all():
+                job.attempts += 1
+                job.last_error = error[:500]
+                job.updated_at = now
+                if job.attempts >= max_attempts:
+                    job.status = JobStatus.FAILED.value
+                    failed.append(job.id)
+                else:
+                    job.status = JobStatus.PENDING.value
+                    job.next_attempt_at = now + timedelta(
+                        seconds=base_delay * (2 ** (job.attempts - 1))
+                    )
+                session.add(job)
+            await session.commit()
+        return failed
+
+    async def get_extraction_job_statuses(self, message_ids: List[int]) -> Dict[int, str]:
+        """Maps message ID -> extraction job status for messages that have a job."""
+        if not message_ids:
+            return {}
+        async with self.session() as session:
+            result = await session.exec(
+                select(ExtractionJob.message_id, ExtractionJob.status).where(
+                    ExtractionJob.message_id.in_(message_ids)
+                )
+            )
+            return dict(result.all())
+
+    async def reset_running_extraction_jobs(self) -> int:
+        """Returns jobs stuck in running (e.g. after a crash) to pending. Returns count."""
+        async with self.session() as session:
+            result = await session.exec(
+                update(ExtractionJob)
+                .where(ExtractionJob.status == JobStatus.RUNNING.value)
+                .values(status=JobStatus.PENDING.value, updated_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
+            return max(result.rowcount or 0, 0)
+
+    async def count_extraction_jobs_by_status(self) -> Dict[str, int]:
+        async with self.session() as session:
+            result = await session.exec(
+                select(ExtractionJob.status, func.count(ExtractionJob.id)).group_by(
+                    ExtractionJob.status
+                )
+            )
+            return dict(result.all())
+
+
+repository = Repository()
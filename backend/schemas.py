@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
 
@@ -14,3 +16,15 @@ class ExtractedFact(BaseModel):
         default="general",
         description="Category: pessoal, trabalho, agenda, local, tech, opiniao, relacionamento",
     )
+
+
+class BatchExtractedFact(ExtractedFact):
+    """
+    A fact extracted in batch mode, tagged with the key of its source item
+    (a conversation window) and the transcript lines supporting it.
+    """
+
+    source: str = Field(..., description="Key of the item the fact was extracted from")
+    lines: List[int] = Field(
+        default_factory=list, description="1-based transcript lines the fact is based on"
+    )
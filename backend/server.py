@@ -1,7 +1,6 @@
 import sys
 import asyncio
 import nest_asyncio
-import sqlite3
 import logging
 from telethon import events
 from mcp.server.fastmcp import FastMCP
@@ -13,10 +12,18 @@ from backend.logging_setup import setup_logging
 from backend.settings import settings
 
 # Import new services
-from backend.database import create_db_and_tables
+from backend.database import (
+    create_db_and_tables,
+    dispose_engines,
+    is_database_locked_error,
+    lock_contention,
+)
 from backend.services.learning import learning_service
 from backend.services.conversation import conversation_service
 from backend.services.reporting import reporting_service
+from backend.services.extraction_queue import extraction_queue
+from backend.services.persistence import message_writer
+from backend.services.consolidation import fact_consolidation_service
 
 # Import tools
 from backend.tools import (
@@ -52,6 +59,20 @@ mcp.add_tool(
         title="Learn From Chat History", openWorldHint=True, destructiveHint=True
     ),
 )
+mcp.add_tool(
+    learning.backfill_chat_history,
+    annotations=ToolAnnotations(
+        title="Backfill Full Chat History", openWorldHint=True, destructiveHint=True
+    ),
+)
+mcp.add_tool(
+    learning.consolidate_facts,
+    annotations=ToolAnnotations(title="Consolidate Learned Facts", destructiveHint=True),
+)
+mcp.add_tool(
+    learning.rebuild_fact_index,
+    annotations=ToolAnnotations(title="Rebuild Fact Search Index", idempotentHint=True),
+)
 
 # Reporting Tools
 mcp.add_tool(
@@ -310,6 +331,12 @@ mcp.add_tool(
         title="Search Public Chats", openWorldHint=True, readOnlyHint=True
     ),
 )
+mcp.add_tool(
+    search.search_local_history,
+    annotations=ToolAnnotations(
+        title="Search Local History", openWorldHint=False, readOnlyHint=True
+    ),
+)
 mcp.add_tool(
     search.resolve_username,
     annotations=ToolAnnotations(title="Resolve Username", openWorldHint=True, readOnlyHint=True),
@@ -365,6 +392,13 @@ async def _main() -> None:
             hour=settings.REPORT_TIME_HOUR,
             minute=settings.REPORT_TIME_MINUTE,
         )
+        # Merge duplicate facts so context retrieval sees distinct facts
+        if settings.FACT_CONSOLIDATION_ENABLED:
+            scheduler.add_job(
+                fact_consolidation_service.run_scheduled,
+                "interval",
+                minutes=settings.FACT_CONSOLIDATION_INTERVAL_MINUTES,
+            )
         scheduler.start()
 
         # Log scheduled jobs
@@ -378,9 +412,29 @@ async def _main() -> None:
         await mcp.run_stdio_async()
     except Exception as e:
         logger.error(f"Error starting client: {e}")
-        if isinstance(e, sqlite3.OperationalError) and "database is locked" in str(e):
-            logger.error("Database lock detected.")
+        if is_database_locked_error(e):
+            logger.error(
+                f"Database lock detected (lock contention count: {lock_contention.count})."
+            )
         sys.exit(1)
+    finally:
+        # Also on cancellation or errors: buffered messages must reach the DB
+        await _shutdown()
+
+
+async def _shutdown() -> None:
+    """Stops extraction workers, drains the persistence queue and closes the engines."""
+    logger.info("Stopping extraction workers and draining message persistence queue...")
+    steps = {
+        "extraction queue": extraction_queue.stop,
+        "message writer": message_writer.stop,
+        "database engines": dispose_engines,
+    }
+    for name, stop in steps.items():
+        try:
+            await stop()
+        except Exception as e:
+            logger.error(f"Error stopping {name}: {e}")
 
 
 def main() -> None:
@@ -1,26 +1,33 @@
 import json
 import logging
-import asyncio
 import re
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Tuple, Optional
+from typing import AsyncIterator, List, Dict, Any, Tuple, Optional
 
 from google import genai
 from google.genai import types
 
-from sqlmodel import Session, select, or_
-from backend.database import engine, Message, Fact
+from backend.database import Message, Fact
+from backend.repository import repository
 from backend.settings import settings
 from backend.prompts import (
-    FACT_EXTRACTION_PROMPT,
+    BATCH_FACT_EXTRACTION_PROMPT,
     SUMMARY_PROMPT,
-    CONVERSATION_SYSTEM_PROMPT,
 )
-from backend.utils import async_retry
-from backend.schemas import ExtractedFact
+from backend.services.embeddings import SemanticFactRetriever
+from backend.services.extraction_cache import ExtractionCache
+from backend.services.fact_cache import fact_cache
+from backend.services.history_buffer import RecentMessage, history_buffer
+from backend.services.prompt_builder import ConversationPromptBuilder
+from backend.services.rate_limiter import AdaptiveRateLimiter, Priority, is_rate_limit_error
+from backend.utils import async_retry, estimate_tokens
+from backend.schemas import BatchExtractedFact
 
 logger = logging.getLogger(__name__)
 
+NO_CLIENT_REPLY = "Desculpe, minha IA não está configurada."
+GENERATION_ERROR_REPLY = "Mano, minha API de cérebro deu timeout aqui. Tenta de novo? 😵‍💫"
+
 
 class AIService:
     """
@@ -31,12 +38,44 @@ class AIService:
     """
 
     def __init__(self):
+        self.rate_limiter = AdaptiveRateLimiter()
+        self.extraction_cache = ExtractionCache()
+        self.fact_retriever = SemanticFactRetriever(fact_cache=fact_cache)
+        self.history_buffer = history_buffer
+        self.fact_cache = fact_cache
+        self.prompt_builder = ConversationPromptBuilder()
         self.client: Optional[genai.Client] = None
         if settings.GOOGLE_API_KEY:
             self.client = genai.Client(api_key=settings.GOOGLE_API_KEY)
         else:
             logger.warning("GOOGLE_API_KEY not set. AI features disabled.")
 
+    async def _generate(
+        self,
+        prompt: str,
+        priority: Priority,
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> Any:
+        """
+        Single entry point for generate_content. Waits for the shared rate limiter
+        and feeds 429 / RESOURCE_EXHAUSTED responses back into it.
+        """
+        estimated = estimate_tokens(prompt) + settings.AI_RATE_OUTPUT_TOKEN_ESTIMATE
+        await self.rate_limiter.acquire(estimated, priority)
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=settings.AI_MODEL_NAME, contents=prompt, config=config
+            )
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.rate_limiter.on_rate_limited()
+            raise
+
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        self.rate_limiter.on_success(estimated, actual if isinstance(actual, int) else None)
+        return response
+
     @staticmethod
     def _clean_json_response(raw_text: str) -> str:
         """
@@ -66,70 +105,99 @@ class AIService:
 
         return raw_text
 
-    @async_retry(max_attempts=3, delay=1.0)
-    async def extract_facts(self, text: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def pack_by_token_budget(
+        items: List[Tuple[str, str]], token_budget: int, max_items: int
+    ) -> List[List[Tuple[str, str]]]:
         """
-        Uses LLM to extract facts from text.
-        Returns a list of dicts conforming to ExtractedFact schema.
+        Greedily packs (key, text) items into batches whose estimated token count
+        stays within `token_budget` (and at most `max_items` per batch).
+        An item larger than the budget gets a batch of its own.
         """
-        if not self.client:
-            return []
-
-        if not text or len(text.strip()) < 10:
-            return []
-
-        # Safe formatting
+        batches: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        current_tokens = 0
+        for key, text in items:
+            tokens = estimate_tokens(text)
+            if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append((key, text))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def extract_facts_batch(
+        self, items: Dict[str, str], contents: Optional[Dict[str, str]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Extracts facts from several conversation windows in a single LLM call.
+        `items` maps a stable item key to its transcript. Returns key -> list of facts
+        (fact dicts with entity, value, category and lines); keys without facts are omitted.
+        `contents` maps item keys to what the extraction cache keys on (the transcript
+        itself by default); items already cached are served without an LLM call.
+        API errors propagate and unparseable responses raise ValueError, so the
+        extraction queue retries with backoff instead of completing the jobs.
+        """
+        if not self.client or not items:
+            return {}
+
+        contents = {key: (contents or {}).get(key, text) for key, text in items.items()}
+        cached = await self.extraction_cache.get_many(contents)
+        results = {key: facts for key, facts in cached.items() if facts}
+        pending = {key: text for key, text in items.items() if key not in cached}
+        if not pending:
+            self.extraction_cache.saved_calls += 1
+            return results
+
+        messages_json = json.dumps(
+            [{"id": key, "text": text} for key, text in pending.items()], ensure_ascii=False
+        )
         try:
-            prompt = FACT_EXTRACTION_PROMPT.format(text=text)
+            prompt = BATCH_FACT_EXTRACTION_PROMPT.format(messages_json=messages_json)
         except Exception as e:
-            logger.error(f"Error formatting prompt for fact extraction: {e}")
-            return []
+            logger.error(f"Error formatting prompt for batch fact extraction: {e}")
+            return results
 
-        try:
-            return await self._generate_and_parse_facts(prompt)
-        except Exception as e:
-            logger.error(f"Error extracting facts: {e}")
-            return []
-
-    async def _generate_and_parse_facts(self, prompt: str) -> List[Dict[str, Any]]:
-        """Generates content from LLM and parses the JSON response."""
-        response = await self.client.aio.models.generate_content(
-            model=settings.AI_MODEL_NAME,
-            contents=prompt,
-            config=types.GenerateContentConfig(response_mime_type="application/json"),
+        response = await self._generate(
+            prompt,
+            Priority.EXTRACTION,
+            types.GenerateContentConfig(response_mime_type="application/json"),
         )
-        raw_text = self._clean_json_response(response.text)
-
         try:
-            facts = json.loads(raw_text)
+            facts = json.loads(self._clean_json_response(response.text))
         except json.JSONDecodeError as e:
-            logger.warning(f"Failed to parse JSON: {e}. Text: {raw_text[:100]}...")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error parsing JSON: {e}")
-            return []
-
-        return self._validate_facts(facts)
-
-    def _validate_facts(self, facts: Any) -> List[Dict[str, Any]]:
-        """Validates and processes extracted facts against ExtractedFact schema."""
+            raise ValueError(f"Unparseable batch extraction response: {e}") from e
         if not isinstance(facts, list):
-            logger.warning(f"Extracted facts is not a list: {facts}")
-            return []
+            raise ValueError(f"Batch extraction response is not a list: {str(facts)[:100]}")
+
+        grouped = self._group_batch_facts(facts, set(pending.keys()))
+        await self.extraction_cache.put_many(
+            {key: grouped.get(key, []) for key in pending}, contents
+        )
+        return {**results, **grouped}
 
-        valid_facts = []
+    def _group_batch_facts(self, facts: List[Any], keys: set) -> Dict[str, List[Dict[str, Any]]]:
+        """Validates batch facts and groups them by their source message key."""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
         for f in facts:
             try:
-                if isinstance(f, dict):
-                    if "category" not in f:
-                        f["category"] = "general"
-
-                    validated_fact = ExtractedFact(**f)
-                    valid_facts.append(validated_fact.model_dump())
+                if not isinstance(f, dict):
+                    continue
+                f.setdefault("category", "general")
+                f["source"] = str(f.get("source", ""))
+                validated = BatchExtractedFact(**f)
             except Exception as e:
-                logger.warning(f"Validation failed for fact {f}: {e}")
+                logger.warning(f"Validation failed for batch fact {f}: {e}")
+                continue
+            if validated.source not in keys:
+                logger.warning(f"Dropping fact with unknown source key: {validated.source}")
                 continue
-        return valid_facts
+            grouped.setdefault(validated.source, []).append(
+                validated.model_dump(exclude={"source"})
+            )
+        return grouped
 
     @async_retry(max_attempts=3, delay=2.0)
     async def summarize_conversations(self, data: Any) -> str:
@@ -166,90 +234,46 @@ class AIService:
 
         try:
             prompt = SUMMARY_PROMPT.format(text_log=text_log)
-            response = await self.client.aio.models.generate_content(
-                model=settings.AI_MODEL_NAME,
-                contents=prompt,
-            )
+            response = await self._generate(prompt, Priority.REPORT)
             return response.text
         except Exception as e:
             logger.error(f"Error summarizing: {e}")
             raise e
 
-    def _get_context(
-        self, chat_id: int, sender_id: Optional[int] = None
-    ) -> Tuple[List[Message], List[Fact]]:
-        """Helper to fetch DB context synchronously."""
-        with Session(engine) as session:
-            # Get last 20 messages for better flow
-            statement = (
-                select(Message)
-                .where(Message.chat_id == chat_id)
-                .order_by(Message.date.desc())
-                .limit(20)
-            )
-            history = session.exec(statement).all()
-            history = sorted(history, key=lambda x: x.date)
-
-            # Retrieve facts for chat OR sender (context + personalization)
-            # Implementing Tiered Retrieval for better context retention
-            if sender_id:
-                base_cond = or_(Fact.chat_id == chat_id, Fact.sender_id == sender_id)
-            else:
-                base_cond = Fact.chat_id == chat_id
-
-            limit = settings.AI_CONTEXT_FACT_LIMIT
-            collected_ids = set()
-            final_facts = []
-
-            # Tier 1: Core Identity (Personal) - High Priority
-            # We want to ensure we always remember who the user is and what they like
-            core_cats = ["pessoal", "relacionamento", "opiniao", "preference"]
-            q1 = (
-                select(Fact)
-                .where(base_cond)
-                .where(Fact.category.in_(core_cats))
-                .order_by(Fact.created_at.desc())
-                .limit(10)
-            )
-            facts_core = session.exec(q1).all()
-            for f in facts_core:
-                if f.id not in collected_ids:
-                    final_facts.append(f)
-                    collected_ids.add(f.id)
-
-            # Tier 2: Work Identity (Tech/Work) - Medium Priority
-            # Ensuring technical context is preserved
-            work_cats = ["tech", "trabalho"]
-            q2 = (
-                select(Fact)
-                .where(base_cond)
-                .where(Fact.category.in_(work_cats))
-                .order_by(Fact.created_at.desc())
-                .limit(20)
-            )
-            facts_work = session.exec(q2).all()
-            for f in facts_work:
-                if f.id not in collected_ids:
-                    final_facts.append(f)
-                    collected_ids.add(f.id)
-
-            # Tier 3: Recent General (Fill remaining slots)
-            remaining = limit - len(final_facts)
-            if remaining > 0:
-                q3 = (
-                    select(Fact)
-                    .where(base_cond)
-                    .where(Fact.id.notin_(list(collected_ids)))
-                    .order_by(Fact.created_at.desc())
-                    .limit(remaining)
-                )
-                facts_general = session.exec(q3).all()
-                final_facts.extend(facts_general)
-
-            # Sort by date descending (Newest first) so the AI sees the latest info at the top
-            final_facts.sort(key=lambda x: x.created_at, reverse=True)
-
-            return history, final_facts
+    async def _get_context(
+        self, chat_id: int, sender_id: Optional[int] = None, query: Optional[str] = None
+    ) -> Tuple[List[RecentMessage], List[Fact]]:
+        """
+        Fetches recent chat history (last 20 messages) and facts for context.
+        History comes from the in-memory buffer; the DB is only read the first
+        time a chat is seen (or after it was evicted). The tiered facts are cached
+        until a fact write touches the chat or sender.
+        Facts most similar to `query` (the incoming message) come first, then the
+        category/recency tiers fill the rest, up to AI_CONTEXT_FACT_LIMIT.
+        """
+        history = self.history_buffer.get(chat_id, limit=20)
+        if history is None:
+            rows = await repository.get_recent_history(chat_id, limit=self.history_buffer.capacity)
+            history = self.history_buffer.warm(chat_id, rows)[-20:]
+        facts = await self.fact_cache.get_or_load(
+            "context",
+            chat_id,
+            sender_id,
+            lambda: repository.get_facts_for_context(
+                chat_id, sender_id, limit=settings.AI_CONTEXT_FACT_LIMIT
+            ),
+        )
+        if query:
+            try:
+                relevant = await self.fact_retriever.search(chat_id, sender_id, query)
+            except Exception as e:
+                logger.warning(f"Semantic fact retrieval failed, using tiers only: {e}")
+                relevant = []
+            if relevant:
+                seen = {f.id for f in relevant}
+                facts = relevant + [f for f in facts if f.id not in seen]
+                facts = facts[: settings.AI_CONTEXT_FACT_LIMIT]
+        return history, facts
 
     def _format_relative_time(self, dt: datetime) -> str:
         """Helper to format datetime relatively (e.g. Today 14:00, Yesterday 10:00)."""
@@ -270,6 +294,31 @@ class AIService:
 
         return f"{day_str} {dt.strftime('%H:%M')}"
 
+    async def _build_conversation_prompt(
+        self, chat_id: int, user_message: str, sender_name: str, sender_id: Optional[int]
+    ) -> str:
+        """Reply prompt with history and facts, within per-section token budgets."""
+        # 1. Retrieve Context
+        try:
+            history, facts = await self._get_context(chat_id, sender_id, user_message)
+        except Exception as e:
+            logger.error(f"Error fetching context: {e}")
+            history, facts = [], []
+
+        history_lines = [
+            f"[{self._format_relative_time(m.date)}] {m.sender_name}: {m.text}" for m in history
+        ]
+        fact_lines = [f"- {f.entity_name} ({f.category}): {f.value}" for f in facts]
+
+        full_user_message = f"User {sender_name} says: {user_message}"
+
+        try:
+            return self.prompt_builder.build(fact_lines, history_lines, full_user_message).text
+        except Exception as e:
+            logger.error(f"Error formatting conversation prompt: {e}")
+            # Fallback prompt if formatting fails
+            return f"System: Error in context. User says: {user_message}"
+
     @async_retry(max_attempts=2, delay=0.5)
     async def generate_natural_response(
         self,
@@ -280,43 +329,64 @@ class AIService:
     ) -> str:
         """
         Generates a natural response using history and facts.
+        The prompt is assembled within per-section token budgets.
         Includes safety check for prompt formatting.
         """
         if not self.client:
-            return "Desculpe, minha IA não está configurada."
-
-        # 1. Retrieve Context (Non-blocking)
-        try:
-            history, facts = await asyncio.to_thread(self._get_context, chat_id, sender_id)
-        except Exception as e:
-            logger.error(f"Error fetching context: {e}")
-            history, facts = [], []
+            return NO_CLIENT_REPLY
 
-        history_text = "\n".join(
-            [f"[{self._format_relative_time(m.date)}] {m.sender_name}: {m.text}" for m in history]
+        prompt = await self._build_conversation_prompt(
+            chat_id, user_message, sender_name, sender_id
         )
-        facts_text = "\n".join([f"- {f.entity_name} ({f.category}): {f.value}" for f in facts])
-
-        full_user_message = f"User {sender_name} says: {user_message}"
-
         try:
-            prompt = CONVERSATION_SYSTEM_PROMPT.format(
-                facts_text=facts_text, history_text=history_text, user_message=full_user_message
-            )
+            response = await self._generate(prompt, Priority.CONVERSATION)
+            return response.text
         except Exception as e:
-            logger.error(f"Error formatting conversation prompt: {e}")
-            # Fallback prompt if formatting fails
-            prompt = f"System: Error in context. User says: {user_message}"
+            logger.error(f"Error generating response: {e}")
+            return GENERATION_ERROR_REPLY
 
+    async def stream_natural_response(
+        self,
+        chat_id: int,
+        user_message: str,
+        sender_name: str = "User",
+        sender_id: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Same reply as generate_natural_response, yielded as text chunks while the
+        model produces them (generate_content_stream). A failure before the first
+        chunk yields the usual error reply; a failure mid-stream ends the stream.
+        """
+        if not self.client:
+            yield NO_CLIENT_REPLY
+            return
+
+        prompt = await self._build_conversation_prompt(
+            chat_id, user_message, sender_name, sender_id
+        )
+        estimated = estimate_tokens(prompt) + settings.AI_RATE_OUTPUT_TOKEN_ESTIMATE
+        await self.rate_limiter.acquire(estimated, Priority.CONVERSATION)
+        yielded = False
+        usage = None
         try:
-            response = await self.client.aio.models.generate_content(
-                model=settings.AI_MODEL_NAME,
-                contents=prompt,
+            stream = await self.client.aio.models.generate_content_stream(
+                model=settings.AI_MODEL_NAME, contents=prompt
             )
-            return response.text
+            async for chunk in stream:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yielded = True
+                    yield chunk.text
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return "Mano, minha API de cérebro deu timeout aqui. Tenta de novo? 😵‍💫"
+            if is_rate_limit_error(e):
+                self.rate_limiter.on_rate_limited()
+            logger.error(f"Error streaming response: {e}")
+            if not yielded:
+                yield GENERATION_ERROR_REPLY
+            return
+
+        actual = getattr(usage, "total_token_count", None)
+        self.rate_limiter.on_success(estimated, actual if isinstance(actual, int) else None)
 
 
 ai_service = AIService()
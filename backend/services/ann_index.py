@@ -0,0 +1,301 @@
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TRAIN_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK_ROWS = 65_536
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0
+) -> np.ndarray:
+    """Lloyd's k-means on unit vectors (cosine). Returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Restart empty clusters on random points
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file ("IVF-flat") approximate nearest-neighbour index.
+
+    Spherical k-means splits the vectors into `n_lists` cells; each cell keeps
+    the row numbers of its vectors, and the vectors themselves stay in the
+    caller's (memory-mapped) matrix. A search scores the `nprobe` closest
+    centroids, then only the rows of those cells, so the cost is roughly
+    nprobe / n_lists of a brute-force scan. New rows are appended to their
+    nearest cell without retraining; removed rows are tombstoned and skipped
+    until the next rebuild. A search can be restricted to a subset of rows (one
+    chat's facts): the mask is applied before ranking, and `search_until`
+    widens the probe until the subset yields k hits.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: Optional[List[np.ndarray]] = None):
+        self.centroids = centroids.astype(np.float32)
+        self._lists: List[np.ndarray] = lists or [
+            np.empty(0, dtype=np.int64) for _ in range(len(centroids))
+        ]
+        self._pending: List[List[int]] = [[] for _ in range(len(centroids))]
+        self.tombstones: set = set()
+        self.indexed_rows = sum(len(rows) for rows in self._lists)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, n_lists: Optional[int] = None, seed: int = 0
+    ) -> "IVFFlatIndex":
+        """Trains centroids on a sample of `vectors` and assigns every row."""
+        n_lists = n_lists or default_n_lists(len(vectors))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), n_lists * TRAIN_SAMPLES_PER_LIST)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        index = cls(spherical_kmeans(sample, n_lists, seed=seed))
+        index.add(np.arange(len(vectors)), vectors)
+        index._merge_pending()
+        return index
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Appends rows (with their vectors) to their nearest cells."""
+        for start in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start : start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+            cells = np.argmax(chunk @ self.centroids.T, axis=1)
+            for row, cell in zip(rows[start : start + ASSIGN_CHUNK_ROWS], cells):
+                self._pending[cell].append(int(row))
+        self.indexed_rows += len(rows)
+
+    def remove(self, rows: List[int]):
+        self.tombstones.update(int(row) for row in rows)
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        nprobe: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k (row, cosine score) over the `nprobe` closest cells,
+        among the rows set in `mask` (a boolean array indexed by row) if given.
+        """
+        nprobe = min(nprobe, self.n_lists)
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        for cell in cells:
+            self._merge_pending(cell)
+        rows = np.concatenate([self._lists[cell] for cell in cells])
+        if mask is not None:
+            rows = rows[rows < len(mask)]
+            rows = rows[mask[rows]]
+        if self.tombstones:
+            rows = rows[~np.isin(rows, np.fromiter(self.tombstones, dtype=np.int64))]
+        if not len(rows):
+            return []
+        scores = vectors[rows] @ query
+        best = np.argpartition(-scores, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def search_until(
+        self, vectors: np.ndarray, query: np.ndarray, k: int, nprobe: int, mask: np.ndarray
+    ) -> List[Tuple[int, float]]:
+        """
+        Masked search that doubles nprobe until k rows are found or every cell
+        was probed, so a sparse subset keeps its recall instead of coming back short.
+        """
+        while True:
+            hits = self.search(vectors, query, k, nprobe, mask)
+            if len(hits) >= k or nprobe >= self.n_lists:
+                return hits
+            nprobe *= 2
+
+    def save(self, path: str):
+        """Writes centroids and cells (tombstoned rows dropped) to `path` atomically."""
+        self._merge_pending()
+        lists = [
+            rows[~np.isin(rows, np.fromiter(self.tombstones, dtype=np.int64))]
+            for rows in self._lists
+        ]
+        offsets = np.cumsum([0] + [len(rows) for rows in lists])
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            rows=np.concatenate(lists) if lists else np.empty(0, dtype=np.int64),
+            offsets=offsets,
+            indexed_rows=np.array([self.indexed_rows]),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFFlatIndex"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            offsets = data["offsets"]
+            rows = data["rows"]
+            lists = [rows[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]
+            index = cls(data["centroids"], lists)
+            index.indexed_rows = int(data["indexed_rows"][0])
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [len(rows) + len(self._pending[i]) for i, rows in enumerate(self._lists)]
+        return {
+            "lists": self.n_lists,
+            "indexed_rows": self.indexed_rows,
+            "tombstones": len(self.tombstones),
+            "largest_list": max(sizes) if sizes else 0,
+        }
+
+    def _merge_pending(self, cell: Optional[int] = None):
+        cells = range(self.n_lists) if cell is None else [cell]
+        for c in cells:
+            if self._pending[c]:
+                self._lists[c] = np.concatenate(
+                    [self._lists[c], np.array(self._pending[c], dtype=np.int64)]
+                )
+                self._pending[c] = []
+
+
+def default_n_lists(n_rows: int) -> int:
+    """About sqrt(N) cells, the usual IVF trade-off between centroid and cell scans."""
+    return max(16, int(np.sqrt(max(n_rows, 1))))
+
+
+def brute_force_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def benchmark(
+    n_rows: int = 1_000_000,
+    dim: Optional[int] = None,
+    queries: int = 100,
+    k: int = 10,
+    nprobes: Tuple[int, ...] = (1, 4, 8, 16, 32),
+    seed: int = 0,
+    scope_fraction: float = 0.1,
+) -> List[Dict[str, float]]:
+    """
+    Recall@k and latency of the IVF index against brute force on a synthetic
+    corpus: unit vectors drawn around random topic centres, like facts that
+    cluster by subject. Queries are perturbed copies of corpus rows. Vectors
+    default to the production EMBEDDING_DIM. "ivf_scoped" rows restrict each
+    query to a random `scope_fraction` of the rows (one chat's facts) and use
+    `search_until`, against brute force over the same subset.
+    """
+    dim = dim or settings.EMBEDDING_DIM
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(64, n_rows // 1000), dim)).astype(np.float32)
+    vectors = np.empty((n_rows, dim), dtype=np.float32)
+    for start in range(0, n_rows, ASSIGN_CHUNK_ROWS):
+        size = min(ASSIGN_CHUNK_ROWS, n_rows - start)
+        chunk = topics[rng.integers(0, len(topics), size)]
+        chunk += 0.8 * rng.standard_normal((size, dim)).astype(np.float32)
+        vectors[start : start + size] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    query_rows = rng.choice(n_rows, queries, replace=False)
+    query_vectors = vectors[query_rows] + 0.3 * rng.standard_normal((queries, dim)).astype(
+        np.float32
+    )
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    scope = rng.random(n_rows) < scope_fraction
+    scope[query_rows] = True
+    scope_rows = np.flatnonzero(scope)
+
+    started = time.perf_counter()
+    index = IVFFlatIndex.build(vectors, seed=seed)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    truth = [set(brute_force_top_k(vectors, q, k).tolist()) for q in query_vectors]
+    brute_ms = (time.perf_counter() - started) / queries * 1000
+    scoped_truth = [
+        set(scope_rows[brute_force_top_k(vectors[scope_rows], q, k)].tolist())
+        for q in query_vectors
+    ]
+
+    results = [{"method": "brute_force", "nprobe": 0, "recall": 1.0, "latency_ms": brute_ms}]
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        found = [index.search(vectors, q, k, nprobe) for q in query_vectors]
+        latency_ms = (time.perf_counter() - started) / queries * 1000
+        recall = np.mean(
+            [len(truth[i] & {row for row, _ in hits}) / k for i, hits in enumerate(found)]
+        )
+        results.append(
+            {
+                "method": "ivf_flat",
+                "nprobe": nprobe,
+                "recall": float(recall),
+                "latency_ms": latency_ms,
+            }
+        )
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        found = [index.search_until(vectors, q, k, nprobe, scope) for q in query_vectors]
+        latency_ms = (time.perf_counter() - started) / queries * 1000
+        recall = np.mean(
+            [len(scoped_truth[i] & {row for row, _ in hits}) / k for i, hits in enumerate(found)]
+        )
+        results.append(
+            {
+                "method": "ivf_scoped",
+                "nprobe": nprobe,
+                "recall": float(recall),
+                "latency_ms": latency_ms,
+            }
+        )
+    logger.info(
+        f"Built IVF index ({index.n_lists} lists) over {n_rows} rows in {build_seconds:.1f}s"
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF-flat recall vs latency benchmark.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--scope-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = benchmark(
+        args.rows, args.dim, args.queries, args.k, scope_fraction=args.scope_fraction
+    )
+    print(f"{'method':<12} {'nprobe':>6} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+    for result in results:
+        print(
+            f"{result['method']:<12} {result['nprobe']:>6} "
+            f"{result['recall']:>10.3f} {result['latency_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
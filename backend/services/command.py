@@ -1,9 +1,9 @@
-import asyncio
 import logging
-from typing import Optional
-from sqlmodel import Session, select, or_
-from backend.database import engine, Fact
+from typing import List, Optional
+from backend.database import Fact
+from backend.repository import repository
 from backend.settings import settings
+from backend.services.fact_cache import fact_cache
 from backend.services.learning import learning_service
 from backend.services.reporting import reporting_service
 
@@ -65,7 +65,7 @@ class CommandService:
             "💡 **Contexto:** Te ajudo a não perder o fio da meada.\n\n"
             "**Comandos:**\n"
             "`/start` - Esse texto aqui.\n"
-            "`/aprender [n]` - Leio as últimas n mensagens pra ficar por dentro.\n"
+            "`/aprender [n|tudo]` - Leio as últimas n mensagens (ou tudo) pra ficar por dentro.\n"
             "`/aprender_tudo [n]` - Varro os últimos n chats em busca de conhecimento.\n"
             "`/relatorio` - Resumo rápido dessa conversa.\n"
             "`/relatorio_global` - O resumo oficial do dia (vai pro canal).\n"
@@ -80,10 +80,16 @@ class CommandService:
         parts = text.split()
         limit = settings.LEARNING_HISTORY_LIMIT
         if len(parts) > 1:
+            if parts[1].lower() in ("tudo", "all"):
+                await self._handle_backfill(chat_id, None)
+                return
             try:
                 parsed_limit = int(parts[1])
+                if parsed_limit > settings.LEARN_COMMAND_MAX_LIMIT:
+                    await self._handle_backfill(chat_id, parsed_limit)
+                    return
                 if parsed_limit > 0:
-                    limit = min(parsed_limit, 500)  # Max limit 500
+                    limit = parsed_limit
             except ValueError:
                 pass
 
@@ -95,6 +101,16 @@ class CommandService:
         result = await learning_service.ingest_history(chat_id, limit, force_rescan=True)
         await self.client.send_message(chat_id, f"✅ {result.message}")
 
+    async def _handle_backfill(self, chat_id: int, limit: Optional[int]):
+        scope = "o histórico inteiro" if limit is None else f"as últimas {limit} mensagens"
+        await self.client.send_message(
+            chat_id,
+            f"📚 Vou ler {scope} aos poucos. Se eu cair no meio, continuo de onde parei.",
+        )
+
+        result = await learning_service.backfill_history(chat_id, limit)
+        await self.client.send_message(chat_id, f"✅ {result.message}")
+
     async def _handle_learn_all(self, chat_id: int, text: str):
         parts = text.split()
         limit_dialogs = 10
@@ -144,7 +160,7 @@ class CommandService:
         await self.client.send_message(chat_id, "🧠 Buscando fatos conhecidos...")
 
         try:
-            facts = await asyncio.to_thread(self._fetch_facts, chat_id, sender_id)
+            facts = await self._fetch_facts(chat_id, sender_id)
             if not facts:
                 await self.client.send_message(
                     chat_id, "🤷‍♂️ Não conheço nenhum fato sobre esta conversa (ou você) ainda."
@@ -171,15 +187,12 @@ class CommandService:
             logger.error(f"Error fetching facts: {e}")
             await self.client.send_message(chat_id, "❌ Erro ao buscar fatos.")
 
-    def _fetch_facts(self, chat_id: int, sender_id: Optional[int] = None):
-        with Session(engine) as session:
-            query = select(Fact).where(Fact.chat_id == chat_id)
-            if sender_id:
-                query = select(Fact).where(
-                    or_(Fact.chat_id == chat_id, Fact.sender_id == sender_id)
-                )
-
-            statement = query.order_by(Fact.created_at.desc()).limit(
-                settings.AI_CONTEXT_FACT_LIMIT
-            )
-            return session.exec(statement).all()
+    async def _fetch_facts(self, chat_id: int, sender_id: Optional[int] = None) -> List[Fact]:
+        return await fact_cache.get_or_load(
+            "recent",
+            chat_id,
+            sender_id,
+            lambda: repository.get_recent_facts(
+                chat_id, sender_id, limit=settings.AI_CONTEXT_FACT_LIMIT
+            ),
+        )
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from backend.database import Fact
+from backend.repository import repository as default_repository
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+# A new value replaces the old one only for single-valued facts (one city, one
+# job, a favourite...); multi-valued ones (pets, hobbies, foods) accumulate
+SINGLE_VALUED_CATEGORIES = frozenset({"mood"})
+SINGLE_VALUED_ENTITY_TOKENS = frozenset(
+    {
+        "nome",
+        "idade",
+        "aniversario",
+        "cidade",
+        "endereco",
+        "bairro",
+        "cargo",
+        "profissao",
+        "emprego",
+        "civil",
+        "humor",
+        "mood",
+        "atual",
+        "favorito",
+        "favorita",
+        "preferido",
+        "preferida",
+    }
+)
+# Values equal but for these words contradict each other ("gosta"/"nao gosta")
+NEGATION_TOKENS = frozenset({"nao", "nunca", "jamais", "nem", "ex", "parou", "deixou"})
+
+
+def normalize_key(text: str) -> str:
+    """Lowercase, accent- and punctuation-free form used to compare entities and values."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return NON_WORD_PATTERN.sub(" ", stripped.lower()).strip()
+
+
+def token_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two token sets; 0 when only one of them is negated."""
+    if not a or not b or (a & NEGATION_TOKENS) != (b & NEGATION_TOKENS):
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def conflicts(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    """Same statement with opposite polarity, e.g. "gosta de sushi" / "nao gosta de sushi"."""
+    return a - NEGATION_TOKENS == b - NEGATION_TOKENS and a != b
+
+
+def is_single_valued(entity_tokens: FrozenSet[str], category: str) -> bool:
+    return normalize_key(category) in SINGLE_VALUED_CATEGORIES or not entity_tokens.isdisjoint(
+        SINGLE_VALUED_ENTITY_TOKENS
+    )
+
+
+@dataclass
+class _Cluster:
+    key: str
+    tokens: FrozenSet[str]
+    facts: List[Fact] = field(default_factory=list)
+
+
+def _cluster(facts: List[Fact], text_of, threshold: float) -> List[_Cluster]:
+    """Greedy clustering: same normalized text, or token similarity >= threshold."""
+    clusters: List[_Cluster] = []
+    by_key: Dict[str, _Cluster] = {}
+    for fact in facts:
+        key = normalize_key(text_of(fact))
+        cluster = by_key.get(key)
+        if cluster is None:
+            tokens = frozenset(key.split())
+            cluster = next(
+                (c for c in clusters if token_similarity(tokens, c.tokens) >= threshold), None
+            )
+            if cluster is None:
+                cluster = _Cluster(key, tokens)
+                clusters.append(cluster)
+            by_key[key] = cluster
+        cluster.facts.append(fact)
+    return clusters
+
+
+@dataclass
+class ConsolidationPlan:
+    merges: List[Dict[str, Any]]
+    superseded: Dict[int, Optional[int]]  # Fact ID -> superseding fact ID (None = current)
+    clusters: int
+
+
+def plan_consolidation(facts: List[Fact], threshold: float) -> ConsolidationPlan:
+    """
+    Groups facts per scope (the sender when known, otherwise the chat) and
+    entity, then per value. Each value group collapses into its newest row.
+    For a single-valued entity every value group but the most recently
+    mentioned one is marked as superseded by it; otherwise values coexist and
+    only one contradicted by a newer value is superseded. Facts must be
+    ordered oldest first.
+    """
+    scopes: Dict[Tuple[str, int], List[Fact]] = {}
+    for fact in facts:
+        scope = ("sender", fact.sender_id) if fact.sender_id else ("chat", fact.chat_id)
+        scopes.setdefault(scope, []).append(fact)
+
+    merges: List[Dict[str, Any]] = []
+    superseded: Dict[int, Optional[int]] = {}
+    clusters = 0
+    for scope_facts in scopes.values():
+        for entity in _cluster(scope_facts, lambda f: f.entity_name, threshold):
+            clusters += 1
+            canonicals = []
+            for group in _cluster(entity.facts, lambda f: f.value, threshold):
+                canonical = group.facts[-1]
+                canonicals.append((canonical, group.tokens))
+                if len(group.facts) > 1:
+                    merges.append(
+                        {
+                            "canonical_id": canonical.id,
+                            "duplicate_ids": [f.id for f in group.facts[:-1]],
+                            "mention_count": sum(f.mention_count or 1 for f in group.facts),
+                            "first_seen_at": min(
+                                f.first_seen_at or f.created_at for f in group.facts
+                            ),
+                        }
+                    )
+
+            canonicals.sort(key=lambda c: (c[0].created_at, c[0].id))
+            newest = canonicals[-1][0]
+            single_valued = is_single_valued(entity.tokens, newest.category)
+            for i, (canonical, tokens) in enumerate(canonicals):
+                newer = [
+                    fact
+                    for fact, newer_tokens in canonicals[i + 1 :]
+                    if single_valued or conflicts(tokens, newer_tokens)
+                ]
+                superseded_by = newer[-1].id if newer else None
+                if canonical.superseded_by != superseded_by:
+                    superseded[canonical.id] = superseded_by
+    return ConsolidationPlan(merges, superseded, clusters)
+
+
+@dataclass
+class ConsolidationReport:
+    scopes: int  # Senders/chats revisited (only changed ones when incremental)
+    facts_scanned: int
+    clusters: int
+    rows_reclaimed: int  # Duplicate rows merged away
+    superseded: int  # Values newly marked as replaced by a newer one
+    duration_seconds: float
+
+
+class FactConsolidationService:
+    """
+    Periodic compaction of the fact table.
+
+    Every mention of a fact used to add a row, so context slots were spent on
+    near-duplicates. Consolidation merges each cluster of equivalent facts into
+    its newest row (keeping mention_count, first_seen_at and every source
+    message) and marks older, contradicted values with superseded_by so context
+    retrieval skips them. Runs on the APScheduler every
+    FACT_CONSOLIDATION_INTERVAL_MINUTES and on demand. Scheduled runs are
+    incremental: only scopes that gained facts since the previous run are
+    loaded, FACT_CONSOLIDATION_SCOPES_PER_PAGE scopes at a time.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or default_repository
+        self._lock: Optional[asyncio.Lock] = None
+        self.runs = 0
+        self.rows_reclaimed = 0
+        self.last_report: Optional[ConsolidationReport] = None
+        self.last_run_at: Optional[datetime] = None
+        self.consolidated_up_to = 0  # Highest fact ID every scope was consolidated with
+
+    async def consolidate(
+        self, chat_id: Optional[int] = None, incremental: bool = False
+    ) -> ConsolidationReport:
+        """
+        Consolidates all facts (or one chat's); `incremental` only revisits scopes
+        with facts added since the last all-chats run. Concurrent runs are serialized.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            started = time.monotonic()
+            up_to_id = await self.repository.get_max_fact_id()
+            scopes = await self.repository.get_changed_fact_scopes(
+                self.consolidated_up_to if incremental else 0, up_to_id, chat_id
+            )
+            report = ConsolidationReport(len(scopes), 0, 0, 0, 0, 0.0)
+            page_size = settings.FACT_CONSOLIDATION_SCOPES_PER_PAGE
+            for i in range(0, len(scopes), page_size):
+                facts = await self.repository.get_facts_for_consolidation(
+                    chat_id, scopes[i : i + page_size]
+                )
+                plan = await asyncio.to_thread(
+                    plan_consolidation, facts, settings.FACT_SIMILARITY_THRESHOLD
+                )
+                report.facts_scanned += len(facts)
+                report.clusters += plan.clusters
+                report.rows_reclaimed += await self.repository.apply_fact_consolidation(
+                    plan.merges, plan.superseded
+                )
+                report.superseded += sum(1 for v in plan.superseded.values() if v is not None)
+            report.duration_seconds = round(time.monotonic() - started, 3)
+            if chat_id is None:
+                self.consolidated_up_to = up_to_id
+
+        self.runs += 1
+        self.rows_reclaimed += report.rows_reclaimed
+        self.last_report = report
+        self.last_run_at = datetime.now(timezone.utc)
+        logger.info(
+            f"Fact consolidation: scanned {report.facts_scanned} facts of {report.scopes} "
+            f"scopes in {report.clusters} "
+            f"clusters, reclaimed {report.rows_reclaimed} rows, "
+            f"superseded {report.superseded} values in {report.duration_seconds}s"
+        )
+        return report
+
+    async def run_scheduled(self):
+        """Scheduler entry point; errors are logged instead of killing the job."""
+        try:
+            await self.consolidate(incremental=True)
+        except Exception as e:
+            logger.error(f"Fact consolidation failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "rows_reclaimed": self.rows_reclaimed,
+            "consolidated_up_to": self.consolidated_up_to,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_report": asdict(self.last_report) if self.last_report else None,
+        }
+
+
+fact_consolidation_service = FactConsolidationService()
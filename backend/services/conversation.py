@@ -1,23 +1,61 @@
 import asyncio
 import logging
 import random
-import re
-from typing import Optional
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from statistics import mean
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 from telethon.tl.types import User
 from backend.client import client
 from backend.services.ai import ai_service
 from backend.services.command import CommandService
+from backend.services.reply_admission import ReplyAdmissionController
+from backend.services.reply_stream import ProgressiveReply, split_reaction
 from backend.settings import settings
 from backend.utils import get_sender_name
 from backend.tools.reactions import send_reaction
 
 logger = logging.getLogger(__name__)
 
+REPLY_TIMING_WINDOW = 100
+# Sent instead of a reply shed under load when there is no message to react to
+SHED_REPLY = "Tô com muita mensagem aqui agora, me chama de novo daqui a pouco? 🙏"
+
+
+@dataclass
+class ReplyTiming:
+    target_seconds: float  # Human-like delay before the reply shows up
+    generation_seconds: float  # Time until the reply (first sentence when streaming) was ready
+    slack_seconds: float  # target - generation; negative when the LLM was the bottleneck
+
+
+@dataclass
+class _PendingTurn:
+    """A burst of messages from one sender answered by a single reply."""
+
+    chat_id: int
+    sender_name: str
+    sender_id: Optional[int]
+    first_at: float
+    last_at: float = 0.0
+    texts: List[str] = field(default_factory=list)
+    reply_to_msg_id: Optional[int] = None
+    task: Optional[asyncio.Task] = None
+    generating: bool = False
+    committed: bool = False  # The first message of the reply is being sent
+
 
 class ConversationService:
     def __init__(self):
         self.client = client
         self.command_service = CommandService(client)
+        self.reply_timings: Deque[ReplyTiming] = deque(maxlen=REPLY_TIMING_WINDOW)
+        # (chat_id, sender_id) -> turn whose reply has not been sent yet
+        self._turns: Dict[Tuple[int, Optional[int]], _PendingTurn] = {}
+        self.coalesced_messages = 0
+        self.cancelled_generations = 0
+        self.admission = ReplyAdmissionController()
 
     async def handle_incoming_message(self, event):
         """
@@ -53,6 +91,28 @@ class ConversationService:
             sender_name = get_sender_name(event.message) or "Unknown"
 
             # Trigger reply
+            self._schedule_reply(chat_id, text, sender_name, sender_id, reply_to_msg_id)
+
+        except Exception as e:
+            logger.error(f"Error in ConversationService handler: {e}")
+
+    def _schedule_reply(
+        self,
+        chat_id: int,
+        text: str,
+        sender_name: str,
+        sender_id: Optional[int],
+        reply_to_msg_id: Optional[int],
+    ):
+        """
+        Debounces bursts: messages from the same sender in a chat that arrive
+        while their reply has not been sent yet join one pending turn, whose
+        debounce wait or in-flight generation is cancelled and restarted with the
+        merged text. Once CONVERSATION_DEBOUNCE_MAX_WAIT has passed since the
+        first message, a running generation is left alone and new messages start
+        the next turn.
+        """
+        if settings.CONVERSATION_DEBOUNCE_SECONDS <= 0:
             asyncio.create_task(
                 self._generate_and_send_reply(
                     chat_id,
@@ -62,9 +122,51 @@ class ConversationService:
                     reply_to_msg_id=reply_to_msg_id,
                 )
             )
+            return
 
-        except Exception as e:
-            logger.error(f"Error in ConversationService handler: {e}")
+        now = time.monotonic()
+        key = (chat_id, sender_id)
+        turn = self._turns.get(key)
+        if turn is not None and not turn.committed:
+            overdue = now - turn.first_at >= settings.CONVERSATION_DEBOUNCE_MAX_WAIT
+            if turn.generating and overdue:
+                turn = None
+            else:
+                turn.task.cancel()
+                self.coalesced_messages += 1
+                if turn.generating:
+                    self.cancelled_generations += 1
+                turn.generating = False
+        if turn is None or turn.committed:
+            turn = _PendingTurn(chat_id, sender_name, sender_id, first_at=now)
+            self._turns[key] = turn
+        turn.texts.append(text)
+        turn.reply_to_msg_id = reply_to_msg_id  # Answer the latest message of the burst
+        turn.last_at = now
+        turn.task = asyncio.create_task(self._run_turn(key, turn))
+
+    async def _run_turn(self, key: Tuple[int, Optional[int]], turn: "_PendingTurn"):
+        wait = min(
+            settings.CONVERSATION_DEBOUNCE_SECONDS,
+            turn.first_at + settings.CONVERSATION_DEBOUNCE_MAX_WAIT - time.monotonic(),
+        )
+        await asyncio.sleep(max(0.0, wait))
+        turn.generating = True
+
+        def commit():
+            turn.committed = True
+
+        await self._generate_and_send_reply(
+            turn.chat_id,
+            "\n".join(turn.texts),
+            turn.sender_name,
+            sender_id=turn.sender_id,
+            reply_to_msg_id=turn.reply_to_msg_id,
+            started=turn.last_at,
+            on_commit=commit,
+        )
+        if self._turns.get(key) is turn:
+            del self._turns[key]
 
     async def _generate_and_send_reply(
         self,
@@ -73,56 +175,202 @@ class ConversationService:
         sender_name: str,
         sender_id: Optional[int] = None,
         reply_to_msg_id: int = None,
+        started: Optional[float] = None,
+        on_commit: Optional[Callable[[], None]] = None,
     ):
-        """Generates a response using AI and sends it."""
+        """
+        Generates a response using AI and sends it.
+        The human-like reading/typing delay is a target for the whole reply,
+        counted from `started` (the last message of the turn): generation starts
+        immediately and only what is left of the delay is slept. `on_commit` runs
+        right before the first message goes out; until then the task may be
+        cancelled.
+        """
+        started = started or time.monotonic()
+        if not await self.admission.acquire(chat_id):
+            if on_commit:
+                on_commit()
+            await self._send_shed_fallback(chat_id, reply_to_msg_id)
+            return
         try:
-            # Simulate processing/reading time with jitter
-            base_delay = max(
-                settings.CONVERSATION_MIN_DELAY,
-                len(user_message) * settings.CONVERSATION_TYPING_SPEED,
-            )
-            # Add random jitter (±20%)
-            jitter = random.uniform(0.8, 1.2)
-            delay = min(settings.CONVERSATION_MAX_DELAY, base_delay * jitter)
-
-            await asyncio.sleep(delay)
+            reading_delay = self._reading_delay(user_message)
 
             async with self.client.action(chat_id, "typing"):
-                # Generate response
-                response_text = await ai_service.generate_natural_response(
-                    chat_id, user_message, sender_name, sender_id
-                )
-
-                # Check for reaction tag [REACTION: <emoji>]
-                reaction_match = re.search(r"\[REACTION:\s*(.+?)\]", response_text)
-                if reaction_match:
-                    emoji = reaction_match.group(1).strip()
-                    # Remove the tag from the text
-                    response_text = response_text.replace(reaction_match.group(0), "").strip()
-
-                    # Send reaction if we have a message ID to react to
-                    if reply_to_msg_id:
-                        try:
-                            await send_reaction(chat_id, reply_to_msg_id, emoji)
-                            logger.info(f"Reacted with {emoji} to message {reply_to_msg_id}")
-                        except Exception as e:
-                            logger.error(f"Failed to send reaction: {e}")
-
-                # Wait a bit more to simulate typing the response
-                base_typing_delay = len(response_text) * settings.CONVERSATION_TYPING_SPEED
-                typing_delay = min(
-                    settings.CONVERSATION_MAX_DELAY * 1.5,
-                    base_typing_delay * random.uniform(0.8, 1.2),
-                )
-                await asyncio.sleep(typing_delay)
-
-                if response_text:
-                    await self.client.send_message(
-                        chat_id, response_text, reply_to=reply_to_msg_id
+                if settings.CONVERSATION_STREAMING_ENABLED:
+                    await self._stream_reply(
+                        chat_id,
+                        user_message,
+                        sender_name,
+                        sender_id,
+                        reply_to_msg_id,
+                        started,
+                        reading_delay,
+                        on_commit,
+                    )
+                else:
+                    await self._send_full_reply(
+                        chat_id,
+                        user_message,
+                        sender_name,
+                        sender_id,
+                        reply_to_msg_id,
+                        started,
+                        reading_delay,
+                        on_commit,
                     )
-                    logger.info(f"Sent reply to chat {chat_id} (User: {sender_name})")
         except Exception as e:
             logger.error(f"Error sending reply to {chat_id}: {e}")
+        finally:
+            self.admission.release(chat_id)
+
+    async def _send_shed_fallback(self, chat_id: int, reply_to_msg_id: Optional[int]):
+        """Cheap acknowledgement for a reply dropped under load: a reaction if possible."""
+        try:
+            if reply_to_msg_id:
+                await send_reaction(chat_id, reply_to_msg_id, settings.REPLY_SHED_REACTION)
+            else:
+                await self.client.send_message(chat_id, SHED_REPLY)
+        except Exception as e:
+            logger.error(f"Failed to send shed fallback to {chat_id}: {e}")
+
+    @staticmethod
+    def _reading_delay(user_message: str) -> float:
+        """Simulated processing/reading time with jitter."""
+        base_delay = max(
+            settings.CONVERSATION_MIN_DELAY,
+            len(user_message) * settings.CONVERSATION_TYPING_SPEED,
+        )
+        # Add random jitter (±20%)
+        jitter = random.uniform(0.8, 1.2)
+        return min(settings.CONVERSATION_MAX_DELAY, base_delay * jitter)
+
+    @staticmethod
+    def _typing_delay(response_text: str) -> float:
+        """Simulated time to type the response."""
+        base_typing_delay = len(response_text) * settings.CONVERSATION_TYPING_SPEED
+        return min(
+            settings.CONVERSATION_MAX_DELAY * 1.5,
+            base_typing_delay * random.uniform(0.8, 1.2),
+        )
+
+    async def _send_full_reply(
+        self,
+        chat_id: int,
+        user_message: str,
+        sender_name: str,
+        sender_id: Optional[int],
+        reply_to_msg_id: Optional[int],
+        started: float,
+        reading_delay: float,
+        on_commit: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Waits for the whole response and sends one message once the reading plus
+        typing delay since `started` has passed.
+        """
+        response_text = await ai_service.generate_natural_response(
+            chat_id, user_message, sender_name, sender_id
+        )
+        generation = time.monotonic() - started
+
+        # Check for reaction tag [REACTION: <emoji>]
+        emoji, response_text = split_reaction(response_text)
+        if emoji:
+            await self._react(chat_id, reply_to_msg_id, emoji)
+
+        # Sleep only what generation did not already cover
+        target = reading_delay + self._typing_delay(response_text)
+        await asyncio.sleep(max(0.0, target - (time.monotonic() - started)))
+
+        if on_commit:
+            on_commit()
+        if response_text:
+            await self.client.send_message(chat_id, response_text, reply_to=reply_to_msg_id)
+            logger.info(f"Sent reply to chat {chat_id} (User: {sender_name})")
+        self._record_timing(chat_id, target, generation)
+
+    async def _stream_reply(
+        self,
+        chat_id: int,
+        user_message: str,
+        sender_name: str,
+        sender_id: Optional[int],
+        reply_to_msg_id: Optional[int],
+        started: float,
+        reading_delay: float,
+        on_commit: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Streams the response into the chat: the first sentence is sent once it is
+        generated and the reading delay has passed, and the message is then edited
+        as the rest arrives. The generation itself paces the output, so there is
+        no simulated typing delay.
+        """
+        reply = ProgressiveReply(
+            self.client,
+            chat_id,
+            reply_to=reply_to_msg_id,
+            on_reaction=lambda emoji: self._react(chat_id, reply_to_msg_id, emoji),
+            not_before=started + reading_delay,
+            on_first_send=on_commit,
+        )
+        async for chunk in ai_service.stream_natural_response(
+            chat_id, user_message, sender_name, sender_id
+        ):
+            await reply.feed(chunk)
+        text = await reply.finish()
+        if text:
+            logger.info(
+                f"Streamed reply to chat {chat_id} (User: {sender_name}): first message after "
+                f"{reply.first_sent_after:.2f}s, {reply.edits} edits"
+            )
+        ready = reply.first_ready_after
+        if ready is None:  # Nothing to show (reaction only)
+            ready = time.monotonic() - reply.started
+        self._record_timing(chat_id, reading_delay, ready + reply.started - started)
+
+    def _record_timing(self, chat_id: int, target: float, generation: float):
+        timing = ReplyTiming(
+            target_seconds=round(target, 3),
+            generation_seconds=round(generation, 3),
+            slack_seconds=round(target - generation, 3),
+        )
+        self.reply_timings.append(timing)
+        logger.info(
+            f"Reply timing for chat {chat_id}: target {timing.target_seconds}s, "
+            f"generation {timing.generation_seconds}s, slack {timing.slack_seconds}s"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Reply latency over the last REPLY_TIMING_WINDOW replies, plus burst coalescing."""
+        timings = list(self.reply_timings)
+        coalescing = {
+            "coalesced_messages": self.coalesced_messages,
+            "cancelled_generations": self.cancelled_generations,
+            "pending_turns": len(self._turns),
+        }
+        if not timings:
+            return {"replies": 0, **coalescing}
+        return {
+            **coalescing,
+            "replies": len(timings),
+            "avg_target_seconds": round(mean(t.target_seconds for t in timings), 3),
+            "avg_generation_seconds": round(mean(t.generation_seconds for t in timings), 3),
+            "avg_slack_seconds": round(mean(t.slack_seconds for t in timings), 3),
+            # Replies where generation outlasted the human-like delay
+            "late_replies": sum(1 for t in timings if t.slack_seconds < 0),
+            "last": asdict(timings[-1]),
+        }
+
+    async def _react(self, chat_id: int, reply_to_msg_id: Optional[int], emoji: str):
+        # Send reaction if we have a message ID to react to
+        if not reply_to_msg_id:
+            return
+        try:
+            await send_reaction(chat_id, reply_to_msg_id, emoji)
+            logger.info(f"Reacted with {emoji} to message {reply_to_msg_id}")
+        except Exception as e:
+            logger.error(f"Failed to send reaction: {e}")
 
 
 conversation_service = ConversationService()
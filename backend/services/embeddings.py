@@ -0,0 +1,476 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+from backend.database import BASE_DIR, Fact
+from backend.repository import repository as default_repository
+from backend.services.ann_index import IVFFlatIndex
+from backend.services.fact_cache import FactSetCache
+from backend.services.prefilter import STOPWORDS
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+NGRAM_SIZE = 3
+TOMBSTONE = -1  # Fact ID of a removed row
+NGRAM_WEIGHT = 0.5  # Relative to whole words; n-grams catch inflections ("programo"/"programar")
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into L2-normalized float32 vectors of a fixed size."""
+
+    dim: int
+    signature: str  # Changes when vectors stop being comparable (forces a re-embed)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Returns a (len(texts), dim) matrix."""
+
+
+class HashingEmbedder:
+    """
+    CPU-only, offline embedder: signed feature hashing of accent-free words and
+    character trigrams into `dim` buckets, with sublinear term frequency and
+    stopwords dropped. No vocabulary or model file is needed, so vectors are
+    stable across restarts and new words never require a refit.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or settings.EMBEDDING_DIM
+        self.signature = f"hashing-v1-{self.dim}"
+
+    def features(self, text: str) -> Dict[str, float]:
+        decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+        stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+        counts: Dict[str, float] = {}
+        for word in TOKEN_PATTERN.findall(stripped):
+            if word in STOPWORDS:
+                continue
+            counts[f"w:{word}"] = counts.get(f"w:{word}", 0.0) + 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - NGRAM_SIZE + 1):
+                gram = f"g:{padded[i : i + NGRAM_SIZE]}"
+                counts[gram] = counts.get(gram, 0.0) + NGRAM_WEIGHT
+        return {feature: (1 + math.log(n)) if n >= 1 else n for feature, n in counts.items()}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text).items():
+                # crc32 is stable across processes (unlike hash()); bit 31 picks the sign
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class EmbeddingStore:
+    """
+    Fact vectors in a float32 matrix memory-mapped from `<path>.f32`, with the
+    fact ID of each row in `<path>.ids` and the row count and embedder
+    signature in `<path>.json`. Capacity doubles as rows are appended, so the
+    OS page cache (not the Python heap) holds the vectors. Removed facts leave
+    tombstoned rows until the next rebuild. A different signature on load
+    discards the old vectors.
+    """
+
+    def __init__(self, path: str, dim: int, signature: str):
+        self.path = path
+        self.dim = dim
+        self.signature = signature
+        self.count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._ids: Optional[np.memmap] = None
+        self._rows: Dict[int, int] = {}  # fact ID -> row
+        self._max_fact_id = 0  # Highest fact ID ever stored (the sync watermark)
+        self._flush_lock = threading.Lock()  # Flushes may run on worker threads
+
+    def __len__(self) -> int:
+        """Live (not tombstoned) vectors."""
+        self._open()
+        return len(self._rows)
+
+    def __contains__(self, fact_id: int) -> bool:
+        self._open()
+        return fact_id in self._rows
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The used part of the matrix (tombstoned rows are zero)."""
+        self._open()
+        return self._vectors[: self.count]
+
+    @property
+    def max_fact_id(self) -> int:
+        self._open()
+        return self._max_fact_id
+
+    def fact_id(self, row: int) -> int:
+        return int(self._ids[row])
+
+    def add(self, fact_ids: List[int], vectors: np.ndarray, flush: bool = True) -> List[int]:
+        """
+        Appends vectors (or overwrites the rows of IDs already stored) and returns
+        their rows. With flush=False the caller persists them later with flush().
+        """
+        self._open()
+        rows = []
+        for fact_id, vector in zip(fact_ids, vectors):
+            row = self._rows.get(fact_id)
+            if row is None:
+                row = self.count
+                self._reserve(row + 1)
+                self._ids[row] = fact_id
+                self._rows[fact_id] = row
+                self._max_fact_id = max(self._max_fact_id, fact_id)
+                self.count += 1
+            self._vectors[row] = vector
+            rows.append(row)
+        if flush:
+            self.flush()
+        return rows
+
+    def remove(self, fact_ids: List[int]) -> List[int]:
+        """Tombstones the rows of deleted facts (reclaimed by a rebuild). Returns the rows."""
+        self._open()
+        rows = [self._rows.pop(fact_id) for fact_id in fact_ids if fact_id in self._rows]
+        for row in rows:
+            self._ids[row] = TOMBSTONE
+            self._vectors[row] = 0
+        self.flush()
+        return rows
+
+    def rows(self, fact_ids: Iterable[int]) -> np.ndarray:
+        """Rows of the stored facts among `fact_ids` (facts not stored are skipped)."""
+        self._open()
+        return np.fromiter((self._rows[i] for i in fact_ids if i in self._rows), dtype=np.int64)
+
+    def tombstoned_rows(self) -> np.ndarray:
+        self._open()
+        return np.flatnonzero(self._ids[: self.count] == TOMBSTONE)
+
+    def top_k(
+        self, query: np.ndarray, k: int, candidate_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Cosine top-k (vectors are normalized, so a dot product) among the candidates."""
+        self._open()
+        if candidate_ids is None:
+            rows = np.flatnonzero(self._ids[: self.count] != TOMBSTONE)
+        else:
+            rows = self.rows(candidate_ids)
+        if not len(rows) or k <= 0:
+            return []
+        scores = self._vectors[rows] @ query.astype(np.float32)
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(self._ids[rows[i]]), float(scores[i])) for i in best]
+
+    def flush(self):
+        if self._vectors is None:
+            return
+        with self._flush_lock:
+            self._vectors.flush()
+            self._ids.flush()
+            with open(f"{self.path}.json", "w") as f:
+                json.dump({"signature": self.signature, "dim": self.dim, "count": self.count}, f)
+
+    def _open(self):
+        if self._vectors is not None:
+            return
+        meta = {}
+        if os.path.exists(f"{self.path}.json"):
+            with open(f"{self.path}.json") as f:
+                meta = json.load(f)
+        if meta.get("signature") != self.signature or meta.get("dim") != self.dim:
+            if meta:
+                logger.info("Embedder changed; discarding stored fact embeddings.")
+            for suffix in (".f32", ".ids"):
+                if os.path.exists(f"{self.path}{suffix}"):
+                    os.remove(f"{self.path}{suffix}")
+            meta = {"count": 0}
+        self.count = meta["count"]
+        self._map(max(self.count, 1024))
+        self._rows = {
+            int(fact_id): row
+            for row, fact_id in enumerate(self._ids[: self.count])
+            if fact_id != TOMBSTONE
+        }
+        self._max_fact_id = max(self._rows, default=0)
+
+    def _reserve(self, rows: int):
+        if rows > len(self._ids):
+            self._map(max(rows, 2 * len(self._ids)))
+
+    def _map(self, capacity: int):
+        for suffix, dtype, width in ((".f32", np.float32, self.dim), (".ids", np.int64, 1)):
+            file_path, size = f"{self.path}{suffix}", capacity * width * np.dtype(dtype).itemsize
+            if not os.path.exists(file_path) or os.path.getsize(file_path) < size:
+                with open(file_path, "ab") as f:
+                    f.truncate(size)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._ids.flush()
+        self._vectors = np.memmap(
+            f"{self.path}.f32", dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+        self._ids = np.memmap(f"{self.path}.ids", dtype=np.int64, mode="r+", shape=(capacity,))
+
+
+def fact_text(fact: Fact) -> str:
+    return f"{fact.entity_name}: {fact.value} ({fact.category})"
+
+
+class SemanticFactRetriever:
+    """
+    Picks the facts most similar to the incoming message.
+
+    New facts are embedded incrementally by `sync()` after each extraction
+    batch; a search that finds facts in scope (the chat OR the sender, current
+    values only) not embedded yet starts a background sync, so every write
+    path is covered. Once ANN_MIN_ROWS facts are stored, a background
+    `rebuild()` trains the IVF-flat index persisted next to the vectors
+    (`<path>.ivf.npz`). A scope is then searched through the index, masked to
+    its rows and widening the probe until it yields k hits, whenever that scans
+    fewer rows than scoring the scope exactly; smaller scopes are scored with
+    one vectorized matrix-vector product.
+
+    The scope's facts come from the versioned fact cache, so a search only
+    reads the database after a fact write to the chat or sender. Deleted facts
+    are never scored; `rebuild()` drops their vectors. Embedding and flushes
+    run on worker threads, off the event loop.
+    """
+
+    def __init__(
+        self,
+        repository=None,
+        embedder: Optional[Embedder] = None,
+        path: str = None,
+        fact_cache: Optional[FactSetCache] = None,
+    ):
+        self.repository = repository or default_repository
+        self.fact_cache = fact_cache or FactSetCache(self.repository)
+        self.embedder = embedder or HashingEmbedder()
+        self.path = (
+            path or settings.EMBEDDING_STORE_PATH or os.path.join(BASE_DIR, "fact_embeddings")
+        )
+        self._store: Optional[EmbeddingStore] = None
+        self._index: Optional[IVFFlatIndex] = None
+        self._index_loaded = False
+        self._rebuilding = False
+        self._rebuild_lock: Optional[asyncio.Lock] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self.searches = 0
+        self.ann_searches = 0
+        self.facts_embedded = 0
+        self._search_seconds = 0.0
+
+    @property
+    def store(self) -> EmbeddingStore:
+        if self._store is None:
+            self._store = EmbeddingStore(self.path, self.embedder.dim, self.embedder.signature)
+        return self._store
+
+    @property
+    def index(self) -> Optional[IVFFlatIndex]:
+        """The persisted IVF index, caught up with rows stored after it was saved."""
+        if not self._index_loaded:
+            self._index_loaded = True
+            self._index = IVFFlatIndex.load(self.index_path)
+            if self._index is not None:
+                store = self.store
+                rows = np.arange(self._index.indexed_rows, store.count)
+                self._index.add(rows, store.vectors[rows])
+                self._index.remove(store.tombstoned_rows().tolist())
+        return self._index
+
+    @property
+    def index_path(self) -> str:
+        return f"{self.path}.ivf.npz"
+
+    async def search(
+        self, chat_id: int, sender_id: Optional[int], query: str, k: Optional[int] = None
+    ) -> List[Fact]:
+        """Top-k current facts in scope by cosine similarity to `query`, best first."""
+        if not settings.SEMANTIC_RETRIEVAL_ENABLED or not (query or "").strip():
+            return []
+        started = time.monotonic()
+        k = k or settings.SEMANTIC_FACT_TOP_K
+        scope = await self.fact_cache.get_or_load(
+            "semantic",
+            chat_id,
+            sender_id,
+            lambda: self.repository.get_current_facts(chat_id, sender_id),
+        )
+        if not scope:
+            return []
+        facts = {f.id: f for f in scope}
+        if any(fact_id not in self.store for fact_id in facts):
+            self._start_sync()
+
+        query_vector = self.embedder.embed([query])[0]
+        index = self.index
+        if index is not None and len(facts) > self._probed_rows(index):
+            hits = self._ann_top_k(index, query_vector, k, facts)
+        else:
+            hits = self.store.top_k(query_vector, k, facts)
+        hits = [
+            (fact_id, score) for fact_id, score in hits if score >= settings.SEMANTIC_MIN_SCORE
+        ]
+
+        self.searches += 1
+        self._search_seconds += time.monotonic() - started
+        return [facts[fact_id] for fact_id, _ in hits]
+
+    async def sync(self, batch_size: int = 1000) -> int:
+        """Embeds facts saved since the last sync (incremental insert). Returns facts added."""
+        if not settings.SEMANTIC_RETRIEVAL_ENABLED or self._rebuilding:
+            return 0
+        added = 0
+        while True:
+            facts = await self.repository.get_facts_after(self.store.max_fact_id, batch_size)
+            if not facts:
+                break
+            await self._add(facts)
+            added += len(facts)
+            if len(facts) < batch_size:
+                break
+        if self.index is None and len(self.store) >= settings.ANN_MIN_ROWS:
+            self._start_rebuild()
+        return added
+
+    async def rebuild(self, batch_size: int = 5000) -> Dict[str, Any]:
+        """
+        Re-embeds every fact into a fresh store (dropping tombstones) and retrains
+        the IVF index when there are at least ANN_MIN_ROWS facts, then swaps the
+        new files in. Searches keep using the old store meanwhile; concurrent
+        rebuilds run one after the other.
+        """
+        if self._rebuild_lock is None:
+            self._rebuild_lock = asyncio.Lock()
+        async with self._rebuild_lock:
+            return await self._rebuild(batch_size)
+
+    async def _rebuild(self, batch_size: int) -> Dict[str, Any]:
+        started = time.monotonic()
+        tmp_path = f"{self.path}.rebuild"
+        self._rebuilding = True
+        try:
+            for suffix in (".f32", ".ids", ".json"):
+                if os.path.exists(f"{tmp_path}{suffix}"):
+                    os.remove(f"{tmp_path}{suffix}")
+            store = EmbeddingStore(tmp_path, self.embedder.dim, self.embedder.signature)
+            last_id = 0
+            while True:
+                facts = await self.repository.get_facts_after(last_id, batch_size)
+                if not facts:
+                    break
+                vectors = await asyncio.to_thread(
+                    self.embedder.embed, [fact_text(f) for f in facts]
+                )
+                store.add([f.id for f in facts], vectors, flush=False)
+                last_id = facts[-1].id
+            await asyncio.to_thread(store.flush)
+
+            index = None
+            if len(store) >= settings.ANN_MIN_ROWS:
+                index = await asyncio.to_thread(IVFFlatIndex.build, store.vectors)
+
+            for suffix in (".f32", ".ids", ".json"):
+                os.replace(f"{tmp_path}{suffix}", f"{self.path}{suffix}")
+            if index is not None:
+                await asyncio.to_thread(index.save, self.index_path)
+            elif os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            self._store, self._index, self._index_loaded = None, index, True
+        finally:
+            self._rebuilding = False
+
+        report = {
+            "facts": len(store),
+            "index_lists": index.n_lists if index else 0,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        logger.info(f"Rebuilt fact embeddings: {report}")
+        return report
+
+    @staticmethod
+    def _probed_rows(index: IVFFlatIndex) -> float:
+        """Rows an ANN_NPROBE search scans on average."""
+        return settings.ANN_NPROBE * index.indexed_rows / index.n_lists
+
+    def _ann_top_k(
+        self, index: IVFFlatIndex, query_vector: np.ndarray, k: int, scope: Iterable[int]
+    ) -> List[Tuple[int, float]]:
+        """Approximate top-k among the scope's rows only (the mask is applied before ranking)."""
+        self.ann_searches += 1
+        mask = np.zeros(self.store.count, dtype=bool)
+        mask[self.store.rows(scope)] = True
+        candidates = index.search_until(
+            self.store.vectors, query_vector, k, settings.ANN_NPROBE, mask
+        )
+        return [(self.store.fact_id(row), score) for row, score in candidates]
+
+    def _start_sync(self):
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._run_in_background("sync", self.sync))
+
+    def _start_rebuild(self):
+        if not self._rebuilding and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(
+                self._run_in_background("rebuild", self.rebuild)
+            )
+
+    async def _run_in_background(self, name: str, job: Callable[[], Awaitable[Any]]):
+        try:
+            await job()
+        except Exception as e:
+            logger.warning(f"Background embedding {name} failed: {e}")
+
+    async def _add(self, facts: List[Fact]):
+        """
+        Embeds and stores the facts not stored yet. The hashing and the flush run
+        on worker threads; the store and index are only mutated on the event loop.
+        """
+        facts = [f for f in facts if f.id not in self.store]
+        if not facts:
+            return
+        vectors = await asyncio.to_thread(self.embedder.embed, [fact_text(f) for f in facts])
+        # A concurrent search may have stored some of them while this one waited
+        fresh = [i for i, f in enumerate(facts) if f.id not in self.store]
+        if not fresh:
+            return
+        facts, vectors = [facts[i] for i in fresh], vectors[fresh]
+        rows = self.store.add([f.id for f in facts], vectors, flush=False)
+        if self.index is not None:
+            self.index.add(np.array(rows), vectors)
+        self.facts_embedded += len(facts)
+        await asyncio.to_thread(self.store.flush)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.SEMANTIC_RETRIEVAL_ENABLED,
+            "embedder": self.embedder.signature,
+            "stored_vectors": len(self.store) if self._store else None,
+            "facts_embedded": self.facts_embedded,
+            "searches": self.searches,
+            "ann_searches": self.ann_searches,
+            "ann_index": self._index.stats() if self._index else None,
+            "avg_search_ms": (
+                round(self._search_seconds / self.searches * 1000, 2) if self.searches else 0
+            ),
+        }
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List
+
+from backend.prompts import BATCH_FACT_EXTRACTION_PROMPT
+from backend.repository import repository as default_repository
+from backend.settings import settings
+from backend.utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def extraction_version() -> str:
+    """Changes whenever the model or the extraction prompt changes, invalidating old entries."""
+    fingerprint = "\n".join([settings.AI_MODEL_NAME, BATCH_FACT_EXTRACTION_PROMPT])
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """
+    Persistent cache of validated extraction results keyed by
+    sha256(prompt/model version + normalized content). For conversation windows
+    the content is the message texts alone, so sender names and numbering never
+    turn a repeated conversation into a miss.
+
+    Forwarded messages, copy-pasted announcements and rescans of the same
+    history are served from the extraction_cache table without an LLM call.
+    Empty results are cached too. The table is trimmed to
+    EXTRACTION_CACHE_MAX_ENTRIES, least recently used first. Errors never
+    propagate: a broken cache simply behaves as a miss.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or default_repository
+        self.version = extraction_version()
+        self.hits = 0
+        self.misses = 0
+        self.saved_calls = 0
+        self.evicted = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.version}\n{normalize_text(text)}".encode("utf-8")
+        ).hexdigest()
+
+    async def get_many(self, texts: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Maps item key -> cached facts for the texts that are cached."""
+        if not settings.EXTRACTION_CACHE_ENABLED or not texts:
+            return {}
+        keys = {item_key: self.key(text) for item_key, text in texts.items()}
+        try:
+            found = await self.repository.get_cached_extractions(list(set(keys.values())))
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+            return {}
+
+        cached = {
+            item_key: json.loads(found[cache_key])
+            for item_key, cache_key in keys.items()
+            if cache_key in found
+        }
+        self.hits += len(cached)
+        self.misses += len(texts) - len(cached)
+        return cached
+
+    async def put_many(self, results: Dict[str, List[Dict[str, Any]]], texts: Dict[str, str]):
+        """Stores validated facts (possibly empty) for each item key in `results`."""
+        if not settings.EXTRACTION_CACHE_ENABLED or not results:
+            return
+        entries = {
+            self.key(texts[item_key]): json.dumps(facts, ensure_ascii=False)
+            for item_key, facts in results.items()
+        }
+        try:
+            await self.repository.save_cached_extractions(entries)
+            self.evicted += await self.repository.evict_cached_extractions(
+                settings.EXTRACTION_CACHE_MAX_ENTRIES
+            )
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.EXTRACTION_CACHE_ENABLED,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "saved_calls": self.saved_calls,
+            "evicted": self.evicted,
+        }
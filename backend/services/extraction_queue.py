@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from backend.database import ExtractionJob, JobStatus
+from backend.repository import repository as default_repository
+from backend.services.ai import ai_service
+from backend.services.windowing import ConversationWindow, build_windows, merge_time_ranges
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+THROUGHPUT_WINDOW_SECONDS = 60
+STOP_GRACE_SECONDS = 10
+
+
+class ExtractionQueue:
+    """
+    Durable fact-extraction queue backed by the extraction_job table.
+
+    Live messages and backfill both enqueue one job per message. A fixed pool of
+    EXTRACTION_WORKERS workers claims due jobs atomically, groups each claimed
+    message with its neighbours into conversation windows, packs the windows
+    into batched LLM calls and saves facts + job completion in one transaction. Failed calls go
+    back to pending with exponential backoff until EXTRACTION_MAX_ATTEMPTS, and
+    jobs left running by a crash are picked up again on the next start.
+    """
+
+    def __init__(self, repository=None, workers: Optional[int] = None):
+        self.repository = repository or default_repository
+        self.workers = workers or settings.EXTRACTION_WORKERS
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        # message_id -> future resolving to the facts learned from it
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._completions: deque = deque()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.failed_attempts = 0
+        self.facts_extracted = 0
+        self.windows_extracted = 0
+        self.recovered_jobs = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        """Recovers interrupted jobs and starts the worker pool (idempotent)."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.running:
+                return
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            try:
+                recovered = await self.repository.reset_running_extraction_jobs()
+            except Exception as e:
+                logger.error(f"Error recovering extraction jobs: {e}")
+                recovered = 0
+            if recovered:
+                self.recovered_jobs += recovered
+                logger.info(f"Recovered {recovered} interrupted extraction jobs.")
+            self._tasks = [
+                asyncio.create_task(self._worker(i), name=f"extraction-worker-{i}")
+                for i in range(max(1, self.workers))
+            ]
+
+    async def stop(self):
+        """
+        Stops the workers, letting in-flight batches finish for up to STOP_GRACE_SECONDS.
+        Jobs still running after that are returned to pending for the next run.
+        """
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=STOP_GRACE_SECONDS)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self.repository.reset_running_extraction_jobs()
+        except Exception as e:
+            logger.error(f"Error releasing extraction jobs on shutdown: {e}")
+
+    async def enqueue(self, jobs: List[Dict[str, Any]]) -> int:
+        """Queues jobs ({message_id, chat_id, sender_id}). Returns number of new jobs."""
+        if not jobs:
+            return 0
+        inserted = await self.repository.enqueue_extraction_jobs(jobs)
+        if self._wakeup:
+            self._wakeup.set()
+        return inserted
+
+    async def enqueue_and_wait(self, jobs: List[Dict[str, Any]]) -> int:
+        """
+        Queues jobs and waits until every one of them is done or failed.
+        Returns the number of facts learned from these messages in this run.
+        """
+        if not jobs:
+            return 0
+        await self.start()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for job in jobs:
+            future = self._waiters.get(job["message_id"])
+            if future is None or future.done():
+                future = loop.create_future()
+                self._waiters[job["message_id"]] = future
+            futures.append(future)
+
+        await self.enqueue(jobs)
+
+        # Messages that already had a finished job will never be resolved by a worker
+        statuses = await self.repository.get_extraction_job_statuses(
+            [job["message_id"] for job in jobs]
+        )
+        for message_id, status in statuses.items():
+            if status in (JobStatus.DONE.value, JobStatus.FAILED.value):
+                self._resolve(message_id, 0)
+
+        results = await asyncio.gather(*futures)
+        return sum(results)
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim_completions()
+        return {
+            "workers": len([t for t in self._tasks if not t.done()]),
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "failed_attempts": self.failed_attempts,
+            "facts_extracted": self.facts_extracted,
+            "windows_extracted": self.windows_extracted,
+            "recovered_jobs": self.recovered_jobs,
+            "jobs_per_minute": sum(n for _, n in self._completions)
+            * 60
+            / THROUGHPUT_WINDOW_SECONDS,
+        }
+
+    async def queue_depth(self) -> Dict[str, int]:
+        """Job counts by status, straight from the table."""
+        return await self.repository.count_extraction_jobs_by_status()
+
+    async def _worker(self, worker_id: int):
+        while not self._stopping:
+            try:
+                self._wakeup.clear()
+                jobs = await self.repository.claim_extraction_jobs(
+                    settings.LEARNING_BATCH_MAX_MESSAGES
+                )
+                if not jobs:
+                    if self._stopping:
+                        break
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), settings.EXTRACTION_POLL_INTERVAL
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(jobs)
+                await asyncio.sleep(settings.LEARNING_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Extraction worker {worker_id} error: {e}", exc_info=True)
+                await asyncio.sleep(settings.EXTRACTION_POLL_INTERVAL)
+
+    async def _process(self, jobs: List[ExtractionJob]):
+        messages = await self.repository.get_messages_by_ids([job.message_id for job in jobs])
+
+        # Messages deleted since they were queued have nothing left to learn
+        orphans = {job.id: 0 for job in jobs if job.message_id not in messages}
+        if orphans:
+            await self.repository.complete_extraction_jobs(orphans)
+            for job in jobs:
+                if job.id in orphans:
+                    self._resolve(job.message_id, 0)
+
+        jobs_by_message = {job.message_id: job for job in jobs if job.message_id in messages}
+        windows = await self._build_windows(jobs_by_message, messages)
+        windows_by_key = {f"w{i}": window for i, window in enumerate(windows)}
+        batches = ai_service.pack_by_token_budget(
+            [(key, window.transcript()) for key, window in windows_by_key.items()],
+            settings.LEARNING_BATCH_TOKEN_BUDGET,
+            settings.LEARNING_BATCH_MAX_MESSAGES,
+        )
+        for batch in batches:
+            await self._process_batch(
+                {key: windows_by_key[key] for key, _ in batch}, dict(batch), jobs_by_message
+            )
+
+    async def _build_windows(
+        self, jobs_by_message: Dict[int, ExtractionJob], messages: Dict[int, Any]
+    ) -> List[ConversationWindow]:
+        """
+        Groups each claimed message with its neighbours (within the window gap,
+        including short or filtered-out messages) into conversation windows.
+        Only windows containing at least one claimed message are returned.
+        Neighbours already extracted (a done or running job, or a fact source link)
+        are marked context-only, so their facts are not extracted twice.
+        """
+        gap = settings.LEARNING_WINDOW_MAX_GAP_SECONDS
+        dates_by_chat: Dict[int, List[Any]] = {}
+        for message_id in jobs_by_message:
+            message = messages[message_id]
+            dates_by_chat.setdefault(message.chat_id, []).append(message.date)
+
+        windows: List[ConversationWindow] = []
+        for chat_id, dates in dates_by_chat.items():
+            for start, end in merge_time_ranges(dates, gap):
+                context = await self.repository.get_chat_messages_between(chat_id, start, end)
+                windows.extend(
+                    window
+                    for window in build_windows(chat_id, context)
+                    if any(m.id in jobs_by_message for m in window.messages)
+                )
+
+        neighbours = [
+            m.id for window in windows for m in window.messages if m.id not in jobs_by_message
+        ]
+        statuses = await self.repository.get_extraction_job_statuses(neighbours)
+        extracted = await self.repository.message_ids_with_facts(neighbours)
+        extracted.update(
+            message_id
+            for message_id, status in statuses.items()
+            if status in (JobStatus.DONE.value, JobStatus.RUNNING.value)
+        )
+        for window in windows:
+            window.context_ids = extracted.intersection(window.message_ids)
+        return windows
+
+    async def _process_batch(
+        self,
+        windows: Dict[str, ConversationWindow],
+        texts: Dict[str, str],
+        jobs_by_message: Dict[int, ExtractionJob],
+    ):
+        jobs = [
+            jobs_by_message[m.id]
+            for window in windows.values()
+            for m in window.messages
+            if m.id in jobs_by_message
+        ]
+        try:
+            facts_by_key = await ai_service.extract_facts_batch(
+                texts, {key: window.content() for key, window in windows.items()}
+            )
+            rows, facts_by_job = [], {job.id: 0 for job in jobs}
+            for key, window in windows.items():
+                window_jobs = [
+                    jobs_by_message[i] for i in window.message_ids if i in jobs_by_message
+                ]
+                for fact in facts_by_key.get(key, []):
+                    lines = fact.get("lines", [])
+                    sources = [
+                        m
+                        for m in window.messages_for_lines(lines)
+                        if m.id not in window.context_ids
+                    ]
+                    if not sources and lines:
+                        continue  # Only cites context lines: already learned from them
+                    sources = sources or window.extractable
+                    primary = sources[-1]
+                    rows.append(
+                        {
+                            "chat_id": window.chat_id,
+                            "sender_id": primary.sender_id,
+                            "entity_name": fact["entity"],
+                            "value": fact["value"],
+                            "category": fact.get("category", "general"),
+                            "source_message_id": primary.id,
+                            "source_message_ids": [m.id for m in sources],
+                        }
+                    )
+                    owner = jobs_by_message.get(primary.id, window_jobs[-1])
+                    facts_by_job[owner.id] += 1
+            covered = await self.repository.complete_extraction_jobs(
+                facts_by_job,
+                rows,
+                covered_message_ids=[
+                    message_id
+                    for window in windows.values()
+                    for message_id in window.message_ids
+                    if message_id not in jobs_by_message and message_id not in window.context_ids
+                ],
+            )
+        except Exception as e:
+            self.failed_attempts += 1
+            logger.warning(f"Extraction of {len(jobs)} jobs failed, scheduling retry: {e}")
+            failed = set(
+                await self.repository.retry_extraction_jobs(
+                    [job.id for job in jobs],
+                    str(e),
+                    settings.EXTRACTION_MAX_ATTEMPTS,
+                    settings.EXTRACTION_RETRY_BASE_DELAY,
+                )
+            )
+            self.jobs_failed += len(failed)
+            for job in jobs:
+                if job.id in failed:
+                    logger.error(f"Extraction job {job.id} gave up after retries: {e}")
+                    self._resolve(job.message_id, 0)
+            return
+
+        if rows:
+            logger.info(f"Learned {len(rows)} new facts from {len(windows)} conversation windows")
+            try:
+                await ai_service.fact_retriever.sync()
+            except Exception as e:
+                logger.warning(f"Could not embed new facts: {e}")
+        self.jobs_completed += len(jobs) + len(covered)
+        self.windows_extracted += len(windows)
+        self.facts_extracted += len(rows)
+        self._completions.append((time.monotonic(), len(jobs) + len(covered)))
+        for job in jobs:
+            self._resolve(job.message_id, facts_by_job[job.id])
+        for message_id in covered:
+            self._resolve(message_id, 0)
+
+    def _resolve(self, message_id: int, facts_count: int):
+        future = self._waiters.pop(message_id, None)
+        if future and not future.done():
+            future.set_result(facts_count)
+
+    def _trim_completions(self):
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW_SECONDS
+        while self._completions and self._completions[0][0] < cutoff:
+            self._completions.popleft()
+
+
+extraction_queue = ExtractionQueue()
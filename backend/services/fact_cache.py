@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.database import Fact
+from backend.repository import repository as default_repository
+from backend.settings import settings
+
+
+class FactSetCache:
+    """
+    LRU cache of assembled fact lists keyed by (kind, chat_id, sender_id).
+
+    Facts only change when extraction saves new ones, consolidation rewrites
+    them or message edits/deletions retract them, yet every reply re-ran the
+    tier queries. Each entry is tagged with the repository's fact version for
+    its scope; a lookup is a dict access plus a version comparison, and any
+    fact write to the chat or sender makes the entry stale. The version is read
+    before loading, so rows loaded concurrently with a write are re-read on the
+    next lookup instead of being served under the newer version. The lock keeps
+    the LRU consistent when callers on other threads share the cache.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or default_repository
+        self._entries: "OrderedDict[Tuple[str, int, Optional[int]], Tuple[Any, List[Fact]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    async def get_or_load(
+        self,
+        kind: str,
+        chat_id: int,
+        sender_id: Optional[int],
+        loader: Callable[[], Awaitable[List[Fact]]],
+    ) -> List[Fact]:
+        """Cached facts for the scope, or the result of `loader()` if stale or missing."""
+        if not settings.FACT_CACHE_ENABLED:
+            return await loader()
+
+        key = (kind, chat_id, sender_id)
+        version = self.repository.fact_version(chat_id, sender_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        facts = await loader()
+        with self._lock:
+            self._entries[key] = (version, list(facts))
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.FACT_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return facts
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.FACT_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evicted": self.evicted,
+        }
+
+
+fact_cache = FactSetCache()
@@ -0,0 +1,185 @@
+import bisect
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.settings import settings
+
+# Rough per-record cost besides the strings (object, slots, datetime, list slot)
+RECORD_OVERHEAD_BYTES = 160
+
+
+@dataclass(slots=True)
+class RecentMessage:
+    """Compact copy of a stored message, enough to render conversation history."""
+
+    telegram_message_id: int
+    sender_id: Optional[int]
+    sender_name: Optional[str]
+    text: Optional[str]
+    date: datetime
+    is_outgoing: bool = False
+
+    @classmethod
+    def from_row(cls, row: Any) -> "RecentMessage":
+        """From a Message or a message dict as produced by _create_message_data."""
+        get = row.get if isinstance(row, dict) else lambda key: getattr(row, key, None)
+        date = get("date")
+        if not isinstance(date, datetime):
+            date = datetime.now(timezone.utc)
+        elif date.tzinfo is None:
+            # SQLite hands back naive UTC datetimes, Telethon aware ones
+            date = date.replace(tzinfo=timezone.utc)
+        return cls(
+            telegram_message_id=get("telegram_message_id"),
+            sender_id=get("sender_id"),
+            sender_name=get("sender_name"),
+            text=get("text"),
+            date=date,
+            is_outgoing=bool(get("is_outgoing")),
+        )
+
+    @property
+    def sort_key(self):
+        return (self.date, self.telegram_message_id or 0)
+
+    @property
+    def size(self) -> int:
+        return RECORD_OVERHEAD_BYTES + sys.getsizeof(self.text) + sys.getsizeof(self.sender_name)
+
+
+@dataclass
+class _ChatBuffer:
+    messages: List[RecentMessage] = field(default_factory=list)
+    # False until loaded from the DB; events seen before that are kept and merged
+    warm: bool = False
+    size: int = 0
+
+
+class ChatHistoryBuffer:
+    """
+    Bounded in-memory ring buffer of each chat's most recent messages.
+
+    The NewMessage, edit and delete handlers keep it current, so building a
+    reply's context normally needs no history query. A chat is loaded from the
+    DB the first time its history is read (a miss); until then, live events are
+    buffered and merged into the loaded rows. Each chat keeps the newest
+    HISTORY_BUFFER_MESSAGES_PER_CHAT messages, and whole chats are evicted least
+    recently used first beyond HISTORY_BUFFER_MAX_CHATS or HISTORY_BUFFER_MAX_BYTES.
+    """
+
+    def __init__(self):
+        self._chats: "OrderedDict[int, _ChatBuffer]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_chats = 0
+
+    @property
+    def capacity(self) -> int:
+        return settings.HISTORY_BUFFER_MESSAGES_PER_CHAT
+
+    def get(self, chat_id: int, limit: int) -> Optional[List[RecentMessage]]:
+        """The newest `limit` messages, oldest first; None if the chat must be loaded."""
+        buffer = self._chats.get(chat_id)
+        if buffer is None or not buffer.warm or limit > self.capacity:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._chats.move_to_end(chat_id)
+        return buffer.messages[-limit:] if limit else []
+
+    def warm(self, chat_id: int, rows: Iterable[Any]) -> List[RecentMessage]:
+        """Loads DB rows for a chat (merged with events already seen) and returns them."""
+        buffer = self._touch(chat_id)
+        for row in rows:
+            self._insert(buffer, RecentMessage.from_row(row))
+        buffer.warm = True
+        self._trim(buffer)
+        self._evict()
+        return list(buffer.messages)
+
+    def append(self, chat_id: int, row: Any):
+        """Records a new message from the event path."""
+        buffer = self._touch(chat_id)
+        self._insert(buffer, RecentMessage.from_row(row))
+        self._trim(buffer)
+        self._evict()
+
+    def edit(self, chat_id: int, telegram_message_id: int, text: Optional[str]):
+        buffer = self._chats.get(chat_id)
+        for message in buffer.messages if buffer else []:
+            if message.telegram_message_id == telegram_message_id:
+                self._resize(buffer, -message.size)
+                message.text = text
+                self._resize(buffer, message.size)
+
+    def delete(self, chat_id: Optional[int], telegram_message_ids: List[int]):
+        """Drops deleted messages; chat_id None (private chats) searches every chat."""
+        ids = set(telegram_message_ids)
+        chats = [chat_id] if chat_id is not None else list(self._chats)
+        for cid in chats:
+            buffer = self._chats.get(cid)
+            if buffer is None:
+                continue
+            kept = [m for m in buffer.messages if m.telegram_message_id not in ids]
+            if len(kept) != len(buffer.messages):
+                self._resize(buffer, sum(m.size for m in kept) - buffer.size)
+                buffer.messages = kept
+                # Older messages that scrolled out may now belong to the window again
+                buffer.warm = False
+
+    def clear(self):
+        self._chats.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "chats": len(self._chats),
+            "messages": sum(len(b.messages) for b in self._chats.values()),
+            "approx_bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evicted_chats": self.evicted_chats,
+        }
+
+    def _touch(self, chat_id: int) -> _ChatBuffer:
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            buffer = self._chats[chat_id] = _ChatBuffer()
+        self._chats.move_to_end(chat_id)
+        return buffer
+
+    def _insert(self, buffer: _ChatBuffer, message: RecentMessage):
+        if message.telegram_message_id is not None and any(
+            m.telegram_message_id == message.telegram_message_id for m in buffer.messages
+        ):
+            return
+        bisect.insort(buffer.messages, message, key=lambda m: m.sort_key)
+        self._resize(buffer, message.size)
+
+    def _trim(self, buffer: _ChatBuffer):
+        overflow = len(buffer.messages) - self.capacity
+        if overflow > 0:
+            self._resize(buffer, -sum(m.size for m in buffer.messages[:overflow]))
+            del buffer.messages[:overflow]
+
+    def _resize(self, buffer: _ChatBuffer, delta: int):
+        buffer.size += delta
+        self.size += delta
+
+    def _evict(self):
+        while len(self._chats) > 1 and (
+            len(self._chats) > settings.HISTORY_BUFFER_MAX_CHATS
+            or self.size > settings.HISTORY_BUFFER_MAX_BYTES
+        ):
+            _, buffer = self._chats.popitem(last=False)
+            self.size -= buffer.size
+            self.evicted_chats += 1
+
+
+history_buffer = ChatHistoryBuffer()
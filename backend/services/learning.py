@@ -1,14 +1,16 @@
 import asyncio
 import logging
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
 from telethon import events
-from telethon.errors import FloodWaitError
-from sqlmodel import Session, select, func
 from backend.client import client
-from backend.database import engine, Message, Fact
-from backend.services.ai import ai_service
+from backend.repository import repository
+from backend.services.extraction_queue import extraction_queue
+from backend.services.history_buffer import history_buffer
+from backend.services.persistence import message_writer
+from backend.services.prefilter import HeuristicPreFilter
+from backend.services.telegram_scheduler import telegram_scheduler
 from backend.settings import settings
 from backend.utils import get_sender_name
 
@@ -32,6 +34,11 @@ class LearningService:
     def __init__(self):
         self.client = client
         self._me = None
+        self.prefilter = HeuristicPreFilter()
+        # chat_id -> {"status", "messages", "facts"} for the current/last global backfill
+        self.ingest_progress: Dict[int, Dict[str, Any]] = {}
+        # (chat_id, telegram message ID) -> debounced edit of one of our own messages
+        self._pending_edits: Dict[Tuple[int, int], asyncio.Task] = {}
 
     async def _get_me(self):
         """Lazy load 'me' user."""
@@ -60,9 +67,9 @@ class LearningService:
         try:
             min_id = 0
             if not force_rescan:
-                min_id = self._get_last_synced_id(chat_id)
+                min_id = await self._get_last_synced_id(chat_id)
 
-            entity = await self.client.get_entity(chat_id)
+            entity = await telegram_scheduler.call("get_entity", self.client.get_entity, chat_id)
 
             messages = await self._fetch_history_messages(entity, limit, min_id)
             count = await self._process_messages_ingestion(chat_id, messages)
@@ -91,71 +98,72 @@ class LearningService:
 
     async def ingest_all_history(self, limit_dialogs: int = 10, msgs_limit: int = 30) -> str:
         """
-        Iterates over the most recent dialogs and ingests history for each.
+        Ingests history for the most recent dialogs, INGEST_CONCURRENCY at a time.
+        Telegram calls share the scheduler's RPC budget, so a FloodWait on one
+        dialog only pauses that method class instead of the whole backfill.
         """
         try:
-            dialogs = await self.client.get_dialogs(limit=limit_dialogs)
-            total_learned = 0
-            chats_processed = 0
-
-            for dialog in dialogs:
-                if dialog.is_channel:
-                    continue  # Skip channels to focus on conversations
-
-                # Ingest history for this chat
-                result = await self.ingest_history(dialog.id, limit=msgs_limit, force_rescan=False)
-                total_learned += result.facts_count
-                chats_processed += 1
-
-                if chats_processed % 5 == 0:
+            dialogs = await telegram_scheduler.call(
+                "get_dialogs", self.client.get_dialogs, limit=limit_dialogs
+            )
+            # Skip channels to focus on conversations
+            chats = [dialog for dialog in dialogs if not dialog.is_channel]
+            self.ingest_progress = {
+                dialog.id: {"status": "pending", "messages": 0, "facts": 0} for dialog in chats
+            }
+            semaphore = asyncio.Semaphore(max(1, settings.INGEST_CONCURRENCY))
+
+            async def ingest_dialog(dialog) -> int:
+                async with semaphore:
+                    progress = self.ingest_progress[dialog.id]
+                    progress["status"] = "running"
+                    result = await self.ingest_history(
+                        dialog.id, limit=msgs_limit, force_rescan=False
+                    )
+                    progress.update(
+                        status="error" if result.message.startswith("Error") else "done",
+                        messages=result.messages_count,
+                        facts=result.facts_count,
+                    )
+                    done = sum(
+                        p["status"] in ("done", "error") for p in self.ingest_progress.values()
+                    )
                     logger.info(
-                        f"Global Ingestion: Processed {chats_processed}/{len(dialogs)} chats so far..."
+                        f"Global Ingestion: {done}/{len(chats)} chats done "
+                        f"(chat {dialog.id}: {result.messages_count} messages, "
+                        f"{result.facts_count} facts)."
                     )
+                    return result.facts_count
 
-                # Sleep to avoid hitting rate limits too hard
-                await asyncio.sleep(2)
+            results = await asyncio.gather(*[ingest_dialog(dialog) for dialog in chats])
+            total_learned = sum(results)
 
-            return f"Processed {chats_processed} chats. Total new facts learned: {total_learned}."
+            return f"Processed {len(chats)} chats. Total new facts learned: {total_learned}."
         except Exception as e:
             logger.error(f"Error in global ingestion: {e}")
             return f"Error: {str(e)}"
 
     async def _fetch_history_messages(self, entity: Any, limit: int, min_id: int) -> List[Any]:
         """
-        Fetches messages strictly newer than min_id with retry logic for FloodWaitError.
-        Returns a list of Telethon Message objects.
+        Fetches messages strictly newer than min_id through the RPC scheduler,
+        which absorbs FloodWaitErrors. Returns a list of Telethon Message objects.
         """
-        attempts = 0
-        max_attempts = 3
-        while attempts < max_attempts:
-            try:
-                # Telethon get_messages returns an iterator-like object, need to list() it
-                messages = await self.client.get_messages(entity, limit=limit, min_id=min_id)
-                return list(messages)
-            except FloodWaitError as e:
-                attempts += 1
-                wait_time = e.seconds + 1
-                logger.warning(
-                    f"FloodWaitError: Sleeping for {wait_time} seconds (Attempt {attempts}/{max_attempts})."
-                )
-                await asyncio.sleep(wait_time)
-            except Exception as e:
-                logger.error(f"Error fetching messages: {e}")
-                break
-        return []
+        try:
+            # Telethon get_messages returns an iterator-like object, need to list() it
+            messages = await telegram_scheduler.call(
+                "get_messages", self.client.get_messages, entity, limit=limit, min_id=min_id
+            )
+            return list(messages)
+        except Exception as e:
+            logger.error(f"Error fetching messages: {e}")
+            return []
 
-    def _get_last_synced_id(self, chat_id: int) -> int:
+    async def _get_last_synced_id(self, chat_id: int) -> int:
         """Gets the last synced telegram_message_id for a chat from the DB."""
-        with Session(engine) as session:
-            statement = select(func.max(Message.telegram_message_id)).where(
-                Message.chat_id == chat_id
-            )
-            result = session.exec(statement).first()
-            if result is not None:
-                logger.info(
-                    f"Found existing history for chat {chat_id}. Resuming from ID {result}."
-                )
-                return result
+        result = await repository.get_last_synced_id(chat_id)
+        if result is not None:
+            logger.info(f"Found existing history for chat {chat_id}. Resuming from ID {result}.")
+            return result
         return 0
 
     def _create_message_data(self, msg: Any, chat_id: int) -> Dict[str, Any]:
@@ -175,20 +183,20 @@ class LearningService:
         }
 
     async def _process_messages_ingestion(self, chat_id: int, messages_list: List[Any]) -> int:
-        """Saves messages to DB and returns count of new messages."""
-        count = 0
+        """Saves messages to DB in a single bulk insert and returns count of new messages."""
+        rows = []
         # Process oldest first for logical order in DB
         for msg in reversed(messages_list):
             if not msg.message:
                 logger.debug(f"Skipping empty message ID {msg.id} in chat {chat_id}")
                 continue
+            rows.append(self._create_message_data(msg, chat_id))
 
-            msg_data = self._create_message_data(msg, chat_id)
-
-            db_id = await asyncio.to_thread(self._save_message_to_db, msg_data)
-            if db_id:
-                count += 1
-        return count
+        try:
+            return await repository.save_messages(rows)
+        except Exception as e:
+            logger.error(f"DB Error bulk saving messages: {e}")
+            return 0
 
     def _filter_relevant_messages(self, messages_list: List[Any]) -> List[Any]:
         """Filters messages relevant for learning (text length, not reports)."""
@@ -198,48 +206,167 @@ class LearningService:
             if m.message
             and len(m.message) >= settings.MIN_MESSAGE_LENGTH_FOR_LEARNING
             and not m.message.startswith(REPORT_PREFIXES)
+            and self._passes_prefilter(m.message)
+        ]
+
+    def _passes_prefilter(self, text: str) -> bool:
+        """Runs the local pre-filter (if enabled) so low-value messages skip extraction."""
+        if not settings.PREFILTER_ENABLED or self.prefilter is None:
+            return True
+        return self.prefilter.should_extract(text)
+
+    async def evaluate_prefilter(
+        self, chat_id: Optional[int] = None, limit: int = 5000
+    ) -> Dict[str, Any]:
+        """
+        Offline eval: reports what the pre-filter would drop from the stored
+        messages (optionally one chat, newest `limit`), without affecting stats.
+        """
+        texts = await repository.get_message_texts(chat_id=chat_id, limit=limit)
+        candidates = [
+            t
+            for t in texts
+            if len(t) >= settings.MIN_MESSAGE_LENGTH_FOR_LEARNING
+            and not t.startswith(REPORT_PREFIXES)
+        ]
+        return self.prefilter.evaluate_corpus(candidates)
+
+    async def _build_extraction_jobs(
+        self, chat_id: int, relevant_msgs: List[Any]
+    ) -> List[Dict[str, Any]]:
+        """Extraction jobs for stored messages that have not been learned from yet."""
+        if not relevant_msgs:
+            return []
+
+        # Facts are attributed to the DB message ID, like in the live path
+        db_ids = await repository.get_message_ids(chat_id, [m.id for m in relevant_msgs])
+        already_learned = await repository.message_ids_with_facts(list(db_ids.values()))
+
+        return [
+            {"message_id": db_ids[m.id], "chat_id": chat_id, "sender_id": m.sender_id}
+            for m in relevant_msgs
+            if m.id in db_ids and db_ids[m.id] not in already_learned
         ]
 
     async def _process_learning_batch(self, chat_id: int, relevant_msgs: List[Any]) -> int:
-        """Processes learning (fact extraction) in batches. Returns total facts found."""
-        batch_size = settings.LEARNING_BATCH_SIZE
-        total_batches = (len(relevant_msgs) + batch_size - 1) // batch_size
-        total_facts = 0
-
-        for i in range(0, len(relevant_msgs), batch_size):
-            batch_num = (i // batch_size) + 1
-            logger.info(
-                f"Processing learning batch {batch_num}/{total_batches} for chat {chat_id}..."
-            )
+        """
+        Queues fact extraction for the given messages on the durable extraction
+        queue and waits for the workers to finish them.
+        Returns total facts found.
+        """
+        jobs = await self._build_extraction_jobs(chat_id, relevant_msgs)
+        if jobs:
+            logger.info(f"Queued {len(jobs)} messages for fact extraction in chat {chat_id}...")
+        return await extraction_queue.enqueue_and_wait(jobs)
 
-            batch = relevant_msgs[i : i + batch_size]
-            tasks = []
-            for m in batch:
-                tasks.append(self._analyze_and_extract_safe(m.message, m.id, chat_id, m.sender_id))
+    async def backfill_history(self, chat_id: int, limit: Optional[int] = None) -> LearningResult:
+        """
+        Streams a chat's history in BACKFILL_CHUNK_SIZE chunks with constant memory.
+        Each chunk is saved and the chat's checkpoint (oldest/newest message ID
+        covered) updated before the next chunk is fetched, so a restart resumes
+        where the last run stopped. Messages newer than the checkpoint are caught
+        up first, then older history is paged backwards until `limit` messages
+        have been read (None = the whole chat). Extraction is queued, not awaited.
+        """
+        logger.info(f"Starting streaming backfill for chat {chat_id}, limit={limit}...")
+        try:
+            entity = await telegram_scheduler.call("get_entity", self.client.get_entity, chat_id)
+            checkpoint = await repository.get_backfill_checkpoint(chat_id)
+            oldest_id = checkpoint.oldest_id if checkpoint else None
+            newest_id = checkpoint.newest_id if checkpoint else None
+            reached_start = checkpoint.reached_start if checkpoint else False
+            remaining = limit
+            saved = queued = 0
+
+            async def store(chunk: List[Any]):
+                nonlocal saved, queued, remaining
+                # _process_messages_ingestion expects newest first, like get_messages
+                newest_first = sorted(chunk, key=lambda m: m.id, reverse=True)
+                saved += await self._process_messages_ingestion(chat_id, newest_first)
+                jobs = await self._build_extraction_jobs(
+                    chat_id, self._filter_relevant_messages(chunk)
+                )
+                queued += await extraction_queue.enqueue(jobs)
+                if remaining is not None:
+                    remaining -= len(chunk)
+
+            # 1. Catch up on messages newer than the checkpoint, oldest first
+            while newest_id is not None and (remaining is None or remaining > 0):
+                size = self._backfill_chunk_size(remaining)
+                chunk = await self._fetch_history_chunk(
+                    entity, limit=size, min_id=newest_id, reverse=True
+                )
+                if not chunk:
+                    break
+                await store(chunk)
+                newest_id = max(m.id for m in chunk)
+                await repository.save_backfill_checkpoint(
+                    chat_id, oldest_id, newest_id, reached_start
+                )
+                if len(chunk) < size:
+                    break
+
+            # 2. Page backwards from the oldest message covered so far
+            while not reached_start and (remaining is None or remaining > 0):
+                size = self._backfill_chunk_size(remaining)
+                chunk = await self._fetch_history_chunk(
+                    entity, limit=size, offset_id=oldest_id or 0
+                )
+                reached_start = len(chunk) < size
+                if chunk:
+                    await store(chunk)
+                    oldest_id = min(m.id for m in chunk)
+                    newest_id = newest_id or max(m.id for m in chunk)
+                if oldest_id is not None:
+                    await repository.save_backfill_checkpoint(
+                        chat_id, oldest_id, newest_id, reached_start
+                    )
+                logger.info(
+                    f"Backfill chat {chat_id}: {saved} new messages so far, "
+                    f"checkpoint at message {oldest_id}."
+                )
 
-            # Run batch and wait a bit
-            results = await asyncio.gather(*tasks)
-            total_facts += sum(results)
-            await asyncio.sleep(settings.LEARNING_DELAY)
+            msg = f"Backfilled {saved} new messages ({queued} queued for learning)."
+            if reached_start:
+                msg += " Reached the start of the chat."
+            elif oldest_id is not None:
+                msg += f" Resume point: message {oldest_id}."
+            logger.info(f"Chat {chat_id}: {msg}")
+            return LearningResult(messages_count=saved, facts_count=0, message=msg)
+        except Exception as e:
+            logger.error(f"Error in streaming backfill: {e}")
+            return LearningResult(messages_count=0, facts_count=0, message=f"Error: {str(e)}")
+
+    @staticmethod
+    def _backfill_chunk_size(remaining: Optional[int]) -> int:
+        if remaining is None:
+            return settings.BACKFILL_CHUNK_SIZE
+        return min(settings.BACKFILL_CHUNK_SIZE, remaining)
 
-        return total_facts
+    async def _fetch_history_chunk(self, entity: Any, **kwargs) -> List[Any]:
+        """Reads one chunk with iter_messages through the RPC scheduler."""
+
+        async def collect():
+            return [m async for m in self.client.iter_messages(entity, **kwargs)]
+
+        return await telegram_scheduler.call("get_messages", collect)
 
     async def start_listening(self):
-        """Registers event handlers for incoming messages."""
+        """Registers event handlers for new, edited and deleted messages."""
         logger.info("Starting LearningService event listener...")
         self.client.add_event_handler(self.handle_message_learning, events.NewMessage)
+        self.client.add_event_handler(self.handle_message_edited, events.MessageEdited)
+        self.client.add_event_handler(self.handle_message_deleted, events.MessageDeleted)
+        await extraction_queue.start()
 
         if settings.AUTO_LEARN_ON_STARTUP:
             asyncio.create_task(self._background_backfill_task())
 
-    def _check_if_learning_needed(self) -> bool:
+    async def _check_if_learning_needed(self) -> bool:
         """Checks if the database has very few facts, indicating need for backfill."""
         try:
-            with Session(engine) as session:
-                # Check if we have less than 10 facts
-                statement = select(func.count(Fact.id))
-                count = session.exec(statement).one()
-                return count < 10
+            # Check if we have less than 10 facts
+            return await repository.count_facts() < 10
         except Exception as e:
             logger.error(f"Error checking knowledge base size: {e}")
             return False
@@ -248,8 +375,7 @@ class LearningService:
         """Background task to backfill history if needed."""
         logger.info("Auto-learning: Checking if backfill is needed...")
         try:
-            # Run check in thread to avoid blocking
-            needed = await asyncio.to_thread(self._check_if_learning_needed)
+            needed = await self._check_if_learning_needed()
             if needed:
                 logger.info("Auto-learning: Backfill needed. Starting in 10 seconds...")
                 # Give time for connection to stabilize
@@ -263,128 +389,126 @@ class LearningService:
             logger.error(f"Auto-learning failed: {e}", exc_info=True)
 
     async def _save_message_to_db(self, msg_data: Dict[str, Any]) -> Optional[int]:
-        """Runs synchronous DB save in a thread. Returns DB ID if saved, None if error/duplicate."""
+        """
+        Queues a message on the write-behind writer and waits for its batch to commit.
+        Returns DB ID if saved (or duplicate), None on error.
+        """
         try:
-            with Session(engine) as session:
-                # Check for duplicate
-                existing = session.exec(
-                    select(Message).where(
-                        Message.telegram_message_id == msg_data["telegram_message_id"],
-                        Message.chat_id == msg_data["chat_id"],
-                    )
-                ).first()
-                if existing:
-                    return existing.id
-
-                msg = Message(**msg_data)
-                session.add(msg)
-                session.commit()
-                session.refresh(msg)
-                return msg.id
+            return await message_writer.save(msg_data)
         except Exception as e:
             logger.error(f"DB Error saving message: {e}")
             return None
 
-    async def _save_facts_to_db(
-        self,
-        facts: List[Dict[str, Any]],
-        source_msg_id: int,
-        chat_id: int,
-        sender_id: Optional[int] = None,
-    ):
-        """Runs synchronous DB save of facts in a thread."""
-        try:
-            with Session(engine) as session:
-                for fact_data in facts:
-                    fact = Fact(
-                        chat_id=chat_id,
-                        sender_id=sender_id,
-                        entity_name=fact_data["entity"],
-                        value=fact_data["value"],
-                        category=fact_data.get("category", "general"),
-                        source_message_id=source_msg_id,
-                    )
-                    session.add(fact)
-                session.commit()
-        except Exception as e:
-            logger.error(f"DB Error saving facts: {e}")
-
     async def handle_message_learning(self, event: events.NewMessage.Event):
         """
         Intercepts new messages (incoming and outgoing), saves them to DB,
-        and triggers AI analysis for fact extraction.
+        and queues the message for fact extraction.
         """
         try:
             chat_id = event.chat_id
-            text = event.message.message
-            is_outgoing = event.message.out
-
             msg_data = self._create_message_data(event.message, chat_id)
-            sender_id = msg_data.get("sender_id")
-
-            # 1. Save to Database (Non-blocking)
-            db_message_id = await asyncio.to_thread(self._save_message_to_db, msg_data)
-
-            # 2. Asynchronously extract facts (Learning)
-            if text and len(text) >= settings.MIN_MESSAGE_LENGTH_FOR_LEARNING and db_message_id:
-                # Avoid learning from our own generated reports
-                if text.startswith(REPORT_PREFIXES):
-                    return
-
-                # If we are a bot (Bot API), never learn from our own outgoing messages (replies).
-                # If we are a Userbot (me.bot=False), we DO learn from our outgoing messages
-                # because they represent the user's voice/facts.
-                me = await self._get_me()
-                if me and me.bot and is_outgoing:
-                    return
-
-                asyncio.create_task(
-                    self._analyze_and_extract(text, db_message_id, chat_id, sender_id)
+
+            # 1. Save to Database (and the in-memory history used for replies)
+            db_message_id = await self._save_message_to_db(msg_data)
+            history_buffer.append(chat_id, msg_data)
+
+            # 2. Queue fact extraction (Learning)
+            if db_message_id and await self._should_learn(event.message):
+                await self._queue_live_extraction(
+                    db_message_id, chat_id, msg_data.get("sender_id")
                 )
 
         except Exception as e:
             logger.error(f"Error in handle_message_learning: {e}")
 
-    def _check_facts_exist(self, source_msg_id: int) -> bool:
-        """Checks if facts already exist for a given source message ID."""
-        with Session(engine) as session:
-            statement = select(Fact).where(Fact.source_message_id == source_msg_id)
-            result = session.exec(statement).first()
-            return result is not None
-
-    async def _analyze_and_extract(
-        self, text: str, source_msg_id: int, chat_id: int, sender_id: Optional[int] = None
-    ) -> int:
-        """Extracts facts using AI service and saves them. Returns number of facts found."""
+    async def handle_message_edited(self, event: events.MessageEdited.Event):
+        """
+        Updates the stored text of an edited message. Only when the normalized text
+        actually changed are the old facts retracted and the message queued again.
+        Our own messages are edited many times while a reply streams, so their
+        edits are debounced: only the text still shown after
+        LEARNING_OWN_EDIT_DEBOUNCE_SECONDS without further edits is stored.
+        """
         try:
-            # Check if facts already exist for this message to avoid duplicates
-            existing_facts = await asyncio.to_thread(self._check_facts_exist, source_msg_id)
-            if existing_facts:
-                return 0
-
-            facts = await ai_service.extract_facts(text)
-            if facts:
-                await asyncio.to_thread(
-                    self._save_facts_to_db, facts, source_msg_id, chat_id, sender_id
-                )
-                logger.info(f"Learned {len(facts)} new facts from message {source_msg_id}")
-                return len(facts)
-            return 0
+            msg_data = self._create_message_data(event.message, event.chat_id)
+            history_buffer.edit(event.chat_id, msg_data["telegram_message_id"], msg_data["text"])
+            if not event.message.out or settings.LEARNING_OWN_EDIT_DEBOUNCE_SECONDS <= 0:
+                await self._apply_edit(event.chat_id, event.message, msg_data)
+                return
+
+            key = (event.chat_id, msg_data["telegram_message_id"])
+            previous = self._pending_edits.get(key)
+            if previous:
+                previous.cancel()
+            self._pending_edits[key] = asyncio.create_task(
+                self._apply_edit_later(key, event.message, msg_data)
+            )
         except Exception as e:
-            logger.error(f"Error in fact extraction: {e}")
-            return 0
+            logger.error(f"Error in handle_message_edited: {e}")
 
-    async def _analyze_and_extract_safe(
-        self, text: str, source_msg_id: int, chat_id: int, sender_id: Optional[int] = None
-    ) -> int:
-        """Wrapper for extraction that catches all exceptions. Returns 0 on error."""
+    async def _apply_edit_later(
+        self, key: Tuple[int, int], message: Any, msg_data: Dict[str, Any]
+    ):
+        await asyncio.sleep(settings.LEARNING_OWN_EDIT_DEBOUNCE_SECONDS)
+        # Unregister first: a newer edit arriving now must not cancel this write
+        self._pending_edits.pop(key, None)
         try:
-            return await self._analyze_and_extract(text, source_msg_id, chat_id, sender_id)
+            await self._apply_edit(key[0], message, msg_data)
         except Exception as e:
-            logger.error(
-                f"Failed to process message {source_msg_id} for learning: {e}", exc_info=True
-            )
-            return 0
+            logger.error(f"Error applying debounced edit: {e}")
+
+    async def _apply_edit(self, chat_id: int, message: Any, msg_data: Dict[str, Any]):
+        db_message_id = await message_writer.edit(msg_data)
+        if db_message_id and await self._should_learn(message):
+            await self._queue_live_extraction(db_message_id, chat_id, msg_data.get("sender_id"))
+
+    async def handle_message_deleted(self, event: events.MessageDeleted.Event):
+        """Deletes stored messages and retracts the facts learned only from them."""
+        try:
+            retracted = await message_writer.delete(event.chat_id, event.deleted_ids)
+            history_buffer.delete(event.chat_id, event.deleted_ids)
+            if retracted:
+                logger.info(
+                    f"Retracted {retracted} facts after {len(event.deleted_ids)} deleted "
+                    f"messages in chat {event.chat_id}."
+                )
+        except Exception as e:
+            logger.error(f"Error in handle_message_deleted: {e}")
+
+    async def _should_learn(self, message: Any) -> bool:
+        """Whether a live (new or edited) message is worth fact extraction."""
+        text = message.message
+        if not text or len(text) < settings.MIN_MESSAGE_LENGTH_FOR_LEARNING:
+            return False
+
+        # Avoid learning from our own generated reports
+        if text.startswith(REPORT_PREFIXES):
+            return False
+
+        # If we are a bot (Bot API), never learn from our own outgoing messages (replies).
+        # If we are a Userbot (me.bot=False), we DO learn from our outgoing messages
+        # because they represent the user's voice/facts.
+        me = await self._get_me()
+        if me and me.bot and message.out:
+            return False
+
+        return self._passes_prefilter(text)
+
+    async def _queue_live_extraction(
+        self, db_message_id: int, chat_id: int, sender_id: Optional[int]
+    ):
+        # Let the conversation settle so replies land in the same window
+        settle = timedelta(seconds=settings.LEARNING_WINDOW_SETTLE_SECONDS)
+        await extraction_queue.enqueue(
+            [
+                {
+                    "message_id": db_message_id,
+                    "chat_id": chat_id,
+                    "sender_id": sender_id,
+                    "next_attempt_at": datetime.now(timezone.utc) + settle,
+                }
+            ]
+        )
 
 
 learning_service = LearningService()
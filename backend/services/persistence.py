@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from backend.repository import repository as default_repository
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingMessage:
+    row: Dict[str, Any]
+    future: asyncio.Future
+    kind: str = "save"  # "save", "edit" or "delete"
+
+
+class MessageWriter:
+    """
+    Single-writer, write-behind queue for incoming message rows, edits and deletions.
+
+    Callers enqueue rows and get back a future resolving to the row's DB ID.
+    A background task flushes accumulated rows in one transaction once
+    PERSISTENCE_FLUSH_SIZE rows are pending or PERSISTENCE_FLUSH_INTERVAL_MS
+    has passed since the first pending row, so a burst of events costs one
+    commit instead of one per message. Edits and deletions queued in the same
+    window are applied after the new rows, one transaction per kind, so a mass
+    deletion in a group is a handful of statements rather than one per message.
+    """
+
+    def __init__(
+        self,
+        repository=None,
+        flush_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+    ):
+        self.repository = repository or default_repository
+        self.flush_size = flush_size or settings.PERSISTENCE_FLUSH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.PERSISTENCE_FLUSH_INTERVAL_MS) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flush_count = 0
+        self.rows_written = 0
+        self.failed_rows = 0
+        self.rows_edited = 0
+        self.rows_deleted = 0
+        self.facts_retracted = 0
+
+    def start(self):
+        """Starts the background flush task (idempotent)."""
+        if self._task and not self._task.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued and stops the background task."""
+        if not self._task:
+            return
+        self._stopping = True
+        await self._queue.put(None)  # Wake the writer if it is idle
+        await self._task
+        self._task = None
+
+    def enqueue(self, row: Dict[str, Any]) -> asyncio.Future:
+        """Queues a message row. Returns a future resolving to its DB ID (None on error)."""
+        return self._enqueue(row, "save")
+
+    def _enqueue(self, row: Dict[str, Any], kind: str) -> asyncio.Future:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingMessage(row, future, kind))
+        return future
+
+    async def save(self, row: Dict[str, Any]) -> Optional[int]:
+        """Queues a message row and waits until it is persisted."""
+        return await self.enqueue(row)
+
+    async def edit(self, row: Dict[str, Any]) -> Optional[int]:
+        """
+        Queues a text edit ({chat_id, telegram_message_id, text}) and waits for it.
+        Returns the DB ID if the stored text actually changed, None otherwise.
+        """
+        return await self._enqueue(row, "edit")
+
+    async def delete(self, chat_id: Optional[int], telegram_message_ids: List[int]) -> int:
+        """Queues deletion of messages and waits for it. Returns facts retracted."""
+        return await self._enqueue(
+            {"chat_id": chat_id, "telegram_message_ids": list(telegram_message_ids)}, "delete"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._queue.qsize() if self._queue else 0,
+            "flush_count": self.flush_count,
+            "rows_written": self.rows_written,
+            "failed_rows": self.failed_rows,
+            "rows_edited": self.rows_edited,
+            "rows_deleted": self.rows_deleted,
+            "facts_retracted": self.facts_retracted,
+            "avg_batch_size": (
+                round(self.rows_written / self.flush_count, 2) if self.flush_count else 0
+            ),
+        }
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            batch: List[_PendingMessage] = [first] if first is not None else []
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.flush_size:
+                if self._stopping:
+                    # Drain without waiting
+                    if self._queue.empty():
+                        break
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is not None:
+                    batch.append(item)
+
+            if batch:
+                await self._flush(batch)
+
+            if self._stopping and self._queue.empty():
+                return
+
+    async def _flush(self, batch: List[_PendingMessage]):
+        saves = [p for p in batch if p.kind == "save"]
+        edits = [p for p in batch if p.kind == "edit"]
+        deletions = [p for p in batch if p.kind == "delete"]
+        if saves:
+            await self._flush_saves(saves)
+        if edits:
+            await self._flush_edits(edits)
+        if deletions:
+            await self._flush_deletions(deletions)
+
+    async def _flush_saves(self, batch: List[_PendingMessage]):
+        try:
+            ids = await self.repository.save_messages_returning_ids([p.row for p in batch])
+        except Exception as e:
+            logger.error(f"DB Error flushing {len(batch)} queued messages: {e}")
+            self.failed_rows += len(batch)
+            self._resolve_all(batch, None)
+            return
+
+        self.flush_count += 1
+        self.rows_written += len(batch)
+        for pending in batch:
+            key = (pending.row["chat_id"], pending.row["telegram_message_id"])
+            if not pending.future.done():
+                pending.future.set_result(ids.get(key))
+
+    async def _flush_edits(self, batch: List[_PendingMessage]):
+        try:
+            changed = await self.repository.update_message_texts([p.row for p in batch])
+        except Exception as e:
+            logger.error(f"DB Error applying {len(batch)} queued edits: {e}")
+            self.failed_rows += len(batch)
+            self._resolve_all(batch, None)
+            return
+
+        self.rows_edited += len(changed)
+        for pending in batch:
+            key = (pending.row["chat_id"], pending.row["telegram_message_id"])
+            if not pending.future.done():
+                pending.future.set_result(changed.get(key))
+
+    async def _flush_deletions(self, batch: List[_PendingMessage]):
+        # All deletions of a chat queued in this window share one transaction
+        by_chat: Dict[Optional[int], List[_PendingMessage]] = {}
+        for pending in batch:
+            by_chat.setdefault(pending.row["chat_id"], []).append(pending)
+
+        for chat_id, pendings in by_chat.items():
+            message_ids = [i for p in pendings for i in p.row["telegram_message_ids"]]
+            try:
+                deleted, retracted = await self.repository.delete_messages(chat_id, message_ids)
+            except Exception as e:
+                logger.error(f"DB Error deleting {len(message_ids)} messages: {e}")
+                self._resolve_all(pendings, 0)
+                continue
+            self.rows_deleted += deleted
+            self.facts_retracted += retracted
+            # Retractions are reported once per chat, on the first caller
+            self._resolve_all(pendings[:1], retracted)
+            self._resolve_all(pendings[1:], 0)
+
+    @staticmethod
+    def _resolve_all(batch: List[_PendingMessage], result: Any):
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+
+message_writer = MessageWriter()
@@ -0,0 +1,173 @@
+import logging
+import re
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"[^\W\d_]+|\d+", re.UNICODE)
+CODE_SYMBOLS = set("{}[]()<>=;:/\\|$#*_`")
+LOG_PATTERNS = re.compile(
+    r"Traceback \(most recent call last\)|^\s+at [\w.$]+\(|Exception:|Error:|"
+    r"^\s*File \".*\", line \d+|^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}|\b(INFO|DEBUG|WARN|ERROR)\b",
+    re.MULTILINE,
+)
+FIRST_PERSON = {
+    # Portuguese
+    "eu", "meu", "minha", "meus", "minhas", "me", "mim", "comigo",
+    "nós", "nos", "nosso", "nossa", "nossos", "nossas", "gente",
+    # English
+    "i", "my", "mine", "myself", "we", "our", "ours",
+}  # fmt: skip
+STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "é", "que", "em", "no", "na",
+    "nos", "nas", "um", "uma", "pra", "pro", "para", "por", "com", "se", "não", "nao", "mas",
+    "ou", "ai", "aí", "lá", "ta", "tá", "to", "tô", "vc", "voce", "você", "isso", "esse",
+    "essa", "ele", "ela", "the", "and", "to", "of", "is", "it", "in", "on", "you",
+    # Chat fillers
+    "ok", "blz", "beleza", "entao", "então", "sim", "bom", "tipo", "né", "mano", "kkk", "rs",
+}  # fmt: skip
+
+
+@dataclass
+class PreFilterResult:
+    score: float
+    passed: bool
+    reason: Optional[str]  # Why the message was skipped (None if it passed)
+    features: Dict[str, float]
+
+
+class HeuristicPreFilter:
+    """
+    CPU-only scorer that keeps messages unlikely to contain facts away from the LLM.
+
+    Each message gets cheap features (lexical density, first-person markers,
+    entity-like tokens, code/log detection, repetition ratio) combined into a
+    score in [0, 1]; only messages at or above PREFILTER_THRESHOLD go to
+    extraction. Any object with the same `evaluate(text)` method can replace it
+    on LearningService.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = settings.PREFILTER_THRESHOLD if threshold is None else threshold
+        self.seen = 0
+        self.skipped = 0
+        self.skipped_by_reason: Dict[str, int] = {}
+
+    def should_extract(self, text: str) -> bool:
+        """Scores a message and records the decision in the skip stats."""
+        result = self.evaluate(text)
+        self.seen += 1
+        if not result.passed:
+            self.skipped += 1
+            self.skipped_by_reason[result.reason] = (
+                self.skipped_by_reason.get(result.reason, 0) + 1
+            )
+        return result.passed
+
+    def evaluate(self, text: str) -> PreFilterResult:
+        """Scores a message without touching the stats."""
+        features = self.features(text)
+
+        if features["url_only"]:
+            return PreFilterResult(0.0, False, "url_only", features)
+        if features["repetition"] >= 0.6:
+            return PreFilterResult(0.0, False, "repetitive", features)
+
+        score = (
+            0.4 * features["lexical_density"]
+            + 0.25 * features["first_person"]
+            + 0.2 * features["entity_ratio"]
+            + 0.15 * (1 - features["repetition"])
+        )
+        if features["code_like"]:
+            score *= 0.25
+        score = round(score, 3)
+
+        if score >= self.threshold:
+            return PreFilterResult(score, True, None, features)
+        reason = "code_or_log" if features["code_like"] else "low_score"
+        return PreFilterResult(score, False, reason, features)
+
+    @staticmethod
+    def features(text: str) -> Dict[str, float]:
+        text = text or ""
+        prose = URL_PATTERN.sub(" ", text)
+        words = WORD_PATTERN.findall(prose)
+        lowered = [w.lower() for w in words]
+
+        content = [w for w in lowered if len(w) >= 3 and w not in STOPWORDS and not w.isdigit()]
+        lexical_density = len(set(content)) / len(words) if words else 0.0
+
+        # Capitalized words past the first one, and numbers (ages, dates, prices)
+        entities = [w for w in words[1:] if w[:1].isupper() or w.isdigit()]
+        entity_ratio = min(1.0, 3 * len(entities) / len(words)) if words else 0.0
+
+        non_space = [c for c in text if not c.isspace()]
+        symbol_ratio = (
+            sum(c in CODE_SYMBOLS for c in non_space) / len(non_space) if non_space else 0
+        )
+        code_like = bool(LOG_PATTERNS.search(text)) or symbol_ratio > 0.15
+
+        return {
+            "lexical_density": round(lexical_density, 3),
+            "first_person": 1.0 if FIRST_PERSON.intersection(lowered) else 0.0,
+            "entity_ratio": round(entity_ratio, 3),
+            "code_like": 1.0 if code_like else 0.0,
+            "repetition": round(HeuristicPreFilter._repetition(prose, lowered), 3),
+            "url_only": 1.0 if URL_PATTERN.search(text) and len(content) < 2 else 0.0,
+        }
+
+    @staticmethod
+    def _repetition(text: str, words: List[str]) -> float:
+        """Share of the message that is repeated characters ("kkkkk") or repeated words."""
+        chars = [c for c in text.lower() if not c.isspace()]
+        char_repetition = 0.0
+        if chars:
+            # Fraction of characters taken by the two most frequent ones (covers "kkkk", "haha")
+            counts: Dict[str, int] = {}
+            for c in chars:
+                counts[c] = counts.get(c, 0) + 1
+            top_two = sum(sorted(counts.values(), reverse=True)[:2])
+            char_repetition = top_two / len(chars) if len(chars) >= 6 else 0.0
+        word_repetition = 1 - len(set(words)) / len(words) if len(words) >= 4 else 0.0
+        return max(char_repetition if char_repetition > 0.7 else 0.0, word_repetition)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "seen": self.seen,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.seen, 3) if self.seen else 0,
+            "skipped_by_reason": dict(self.skipped_by_reason),
+        }
+
+    def evaluate_corpus(self, texts: Iterable[str], samples: int = 10) -> Dict[str, Any]:
+        """
+        Offline eval: reports what the filter would drop from `texts` without
+        changing the live stats. Includes a few examples per skip reason.
+        """
+        total = dropped = 0
+        by_reason: Dict[str, int] = {}
+        examples: Dict[str, List[Dict[str, Any]]] = {}
+        for text in texts:
+            total += 1
+            result = self.evaluate(text)
+            if result.passed:
+                continue
+            dropped += 1
+            by_reason[result.reason] = by_reason.get(result.reason, 0) + 1
+            bucket = examples.setdefault(result.reason, [])
+            if len(bucket) < samples:
+                bucket.append({"text": text[:200], **asdict(result)})
+        return {
+            "threshold": self.threshold,
+            "total": total,
+            "would_skip": dropped,
+            "skip_rate": round(dropped / total, 3) if total else 0,
+            "skipped_by_reason": by_reason,
+            "examples": examples,
+        }
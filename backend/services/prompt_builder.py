@@ -0,0 +1,147 @@
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from backend.prompts import CONVERSATION_SYSTEM_PROMPT
+from backend.settings import settings
+from backend.utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = " […] "
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Keeps the start and end of `text` within `max_tokens`, cutting the middle."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # estimate_tokens is ~4 characters per token
+    keep = max(0, max_tokens * 4 - len(TRUNCATION_MARKER) - 4)
+    head = keep - keep // 3
+    tail = keep - head
+    return text[:head].rstrip() + TRUNCATION_MARKER + (text[-tail:].lstrip() if tail else "")
+
+
+@dataclass
+class PromptReport:
+    """Estimated tokens per section of one reply prompt, plus what had to give way."""
+
+    system: int = 0
+    facts: int = 0
+    history: int = 0
+    message: int = 0
+    facts_dropped: int = 0
+    history_dropped: int = 0
+    truncated: int = 0  # Lines or messages cut in the middle
+
+    @property
+    def total(self) -> int:
+        return self.system + self.facts + self.history + self.message
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    report: PromptReport = field(default_factory=PromptReport)
+
+
+class ConversationPromptBuilder:
+    """
+    Assembles CONVERSATION_SYSTEM_PROMPT within per-section token budgets.
+
+    A single pasted log in the history used to inflate a reply prompt to tens
+    of thousands of tokens. Every history line, fact and the current message
+    is cut in the middle beyond its own cap; facts are then kept in priority
+    order and history from the newest line back until their section budget is
+    spent, so the lowest-priority facts and oldest lines are dropped first.
+    The input size per reply is therefore bounded by the sum of the budgets.
+    Token counts use the local estimator and are reported on every call.
+    """
+
+    def __init__(self, template: str = CONVERSATION_SYSTEM_PROMPT):
+        self.template = template
+        self.system_tokens = estimate_tokens(
+            template.format(facts_text="", history_text="", user_message="")
+        )
+        if self.system_tokens > settings.PROMPT_SYSTEM_TOKEN_BUDGET:
+            logger.warning(
+                f"Conversation system prompt ({self.system_tokens} tokens) exceeds its "
+                f"budget of {settings.PROMPT_SYSTEM_TOKEN_BUDGET}."
+            )
+        self.calls = 0
+        self.max_total = 0
+        self.last_report: Optional[PromptReport] = None
+
+    def build(
+        self, fact_lines: List[str], history_lines: List[str], user_message: str
+    ) -> BuiltPrompt:
+        """
+        `fact_lines` are ordered by priority (most important first) and
+        `history_lines` chronologically (oldest first).
+        """
+        report = PromptReport(system=self.system_tokens)
+        line_cap = settings.PROMPT_LINE_MAX_TOKENS
+
+        facts = self._fit(
+            [self._cap(line, line_cap, report) for line in fact_lines],
+            settings.PROMPT_FACTS_TOKEN_BUDGET,
+        )
+        report.facts_dropped = len(fact_lines) - len(facts)
+
+        capped_history = [self._cap(line, line_cap, report) for line in history_lines]
+        history = list(
+            reversed(self._fit(capped_history[::-1], settings.PROMPT_HISTORY_TOKEN_BUDGET))
+        )
+        report.history_dropped = len(history_lines) - len(history)
+
+        message = self._cap(user_message, settings.PROMPT_MESSAGE_TOKEN_BUDGET, report)
+
+        facts_text = "\n".join(facts)
+        history_text = "\n".join(history)
+        report.facts = estimate_tokens(facts_text)
+        report.history = estimate_tokens(history_text)
+        report.message = estimate_tokens(message)
+        text = self.template.format(
+            facts_text=facts_text, history_text=history_text, user_message=message
+        )
+
+        self.calls += 1
+        self.max_total = max(self.max_total, report.total)
+        self.last_report = report
+        logger.info(
+            f"Reply prompt tokens: system={report.system} facts={report.facts} "
+            f"history={report.history} message={report.message} total={report.total} "
+            f"(dropped {report.facts_dropped} facts, {report.history_dropped} history lines; "
+            f"truncated {report.truncated})"
+        )
+        return BuiltPrompt(text, report)
+
+    @staticmethod
+    def _cap(text: str, max_tokens: int, report: PromptReport) -> str:
+        capped = truncate_middle(text, max_tokens)
+        if capped is not text:
+            report.truncated += 1
+        return capped
+
+    @staticmethod
+    def _fit(lines: List[str], budget: int) -> List[str]:
+        """Longest prefix of `lines` whose tokens (one newline each) fit in `budget`."""
+        kept: List[str] = []
+        used = 0
+        for line in lines:
+            used += estimate_tokens(line + "\n")
+            if used > budget:
+                break
+            kept.append(line)
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "max_input_tokens": self.max_total,
+            "input_token_bound": self.system_tokens
+            + settings.PROMPT_FACTS_TOKEN_BUDGET
+            + settings.PROMPT_HISTORY_TOKEN_BUDGET
+            + settings.PROMPT_MESSAGE_TOKEN_BUDGET,
+            "last_report": asdict(self.last_report) if self.last_report else None,
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower value goes first."""
+
+    CONVERSATION = 0
+    EXTRACTION = 1
+    REPORT = 2
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for HTTP 429 / RESOURCE_EXHAUSTED responses from the Gemini API."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or message.startswith("429")
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self._updated_at = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return self.rate_per_minute
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_minute / 60)
+
+    def seconds_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they already are)."""
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing * 60 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        # May go negative when actual usage exceeds the estimate (debt is repaid by refill)
+        self.tokens -= amount
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared limiter for every Gemini call.
+
+    Two token buckets cap requests per minute and tokens per minute. Both limits
+    follow AIMD: each 429 / RESOURCE_EXHAUSTED multiplies them by
+    AI_RATE_DECREASE_FACTOR (down to AI_RATE_MIN_FACTOR of the configured
+    limits), and each successful call adds one request per minute back.
+    Waiters are served strictly by priority, so conversation replies are never
+    stuck behind a queue of extraction or report calls.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.max_rpm = requests_per_minute or settings.AI_RATE_LIMIT_RPM
+        self.max_tpm = tokens_per_minute or settings.AI_RATE_LIMIT_TPM
+        self.factor = 1.0
+        self.requests = TokenBucket(self.max_rpm)
+        self.tokens = TokenBucket(self.max_tpm)
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.rate_limited = 0
+        self._wait_totals: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._wait_max: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._wait_counts: Dict[Priority, int] = {p: 0 for p in Priority}
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.EXTRACTION):
+        """Waits until a request carrying ~`tokens` tokens may be sent."""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(
+            int(priority), next(self._seq), tokens, loop.create_future(), time.monotonic()
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        priority = Priority(priority)
+        self._wait_totals[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+        self._wait_counts[priority] += 1
+
+    def on_success(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        """Additive increase; also settles the token estimate against real usage."""
+        if actual_tokens is not None:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+        if self.factor < 1.0:
+            self._set_factor(self.factor + 1 / self.max_rpm)
+
+    def on_rate_limited(self):
+        """Multiplicative decrease after a 429 / RESOURCE_EXHAUSTED response."""
+        self.rate_limited += 1
+        self._set_factor(self.factor * settings.AI_RATE_DECREASE_FACTOR)
+        # Whatever is left in the buckets was evidently not really available
+        self.requests.tokens = min(self.requests.tokens, 0)
+        logger.warning(
+            f"Gemini rate limit hit. Backing off to {self.requests.rate_per_minute:.1f} RPM / "
+            f"{self.tokens.rate_per_minute:.0f} TPM."
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            "rpm_limit": round(self.requests.rate_per_minute, 2),
+            "tpm_limit": round(self.tokens.rate_per_minute),
+            "rate_factor": round(self.factor, 3),
+            "requests_available": round(self.requests.tokens, 2),
+            "tokens_available": round(self.tokens.tokens),
+            "granted": self.granted,
+            "rate_limited": self.rate_limited,
+            "queued": {
+                p.name.lower(): sum(1 for w in self._waiters if w.priority == p) for p in Priority
+            },
+            "avg_wait_ms": {
+                p.name.lower(): (
+                    round(self._wait_totals[p] / self._wait_counts[p] * 1000, 1)
+                    if self._wait_counts[p]
+                    else 0
+                )
+                for p in Priority
+            },
+            "max_wait_ms": {p.name.lower(): round(self._wait_max[p] * 1000, 1) for p in Priority},
+        }
+
+    def _set_factor(self, factor: float):
+        self.factor = min(1.0, max(settings.AI_RATE_MIN_FACTOR, factor))
+        self.requests.refill()
+        self.tokens.refill()
+        self.requests.rate_per_minute = self.max_rpm * self.factor
+        self.tokens.rate_per_minute = self.max_tpm * self.factor
+        self.requests.tokens = min(self.requests.tokens, self.requests.capacity)
+        self.tokens.tokens = min(self.tokens.tokens, self.tokens.capacity)
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher and not self._dispatcher.done():
+            if self._dispatcher.get_loop() is loop:
+                return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Grants the head of the priority queue as soon as both buckets allow it."""
+        while self._waiters:
+            self._wakeup.clear()
+            head = self._waiters[0]
+            if head.future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+
+            self.requests.refill()
+            self.tokens.refill()
+            delay = max(self.requests.seconds_until(1), self.tokens.seconds_until(head.tokens))
+            if delay <= 0:
+                heapq.heappop(self._waiters)
+                self.requests.consume(1)
+                self.tokens.consume(min(head.tokens, self.tokens.capacity))
+                self.granted += 1
+                head.future.set_result(None)
+                continue
+
+            # A new, more urgent waiter or an AIMD change re-evaluates the head early
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, List
+
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyPriority(IntEnum):
+    """Lower value goes first."""
+
+    PRIVATE = 0
+    GROUP = 1
+
+    @classmethod
+    def for_chat(cls, chat_id: int) -> "ReplyPriority":
+        # Telethon's marked ids are positive for users and negative for groups/channels
+        return cls.PRIVATE if chat_id > 0 else cls.GROUP
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class ReplyAdmissionController:
+    """
+    Bounds how many replies are generated at once.
+
+    At most REPLY_MAX_CONCURRENT replies run in total and REPLY_MAX_PER_CHAT
+    per chat; everything else waits in a queue served private chats first,
+    then in arrival order, skipping chats already at their limit. The queue
+    holds at most REPLY_QUEUE_MAX requests: beyond that the lowest-priority,
+    newest one is shed. A request still queued after REPLY_QUEUE_MAX_WAIT
+    seconds is shed as stale, since a late answer to a raid is worse than none.
+    A shed request gets False from `acquire` and must not call `release`.
+    """
+
+    def __init__(self):
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._active: Counter = Counter()  # chat_id -> running replies
+        self.admitted = 0
+        self.shed_stale = 0
+        self.shed_overflow = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_count = 0
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    async def acquire(self, chat_id: int) -> bool:
+        """Waits for a reply slot; False if the request was shed instead."""
+        if not self._waiters and self._has_room(chat_id):
+            self._grant(chat_id)
+            return True
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(
+            int(ReplyPriority.for_chat(chat_id)),
+            next(self._seq),
+            chat_id,
+            loop.create_future(),
+            time.monotonic(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        if len(self._waiters) > settings.REPLY_QUEUE_MAX:
+            self._shed_overflow()
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), settings.REPLY_QUEUE_MAX_WAIT)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                waiter.future.set_result(False)
+                self.shed_stale += 1
+                logger.warning(
+                    f"Shed stale reply for chat {chat_id} after "
+                    f"{settings.REPLY_QUEUE_MAX_WAIT}s in the queue."
+                )
+        except asyncio.CancelledError:
+            if waiter.future.done() and waiter.future.result():
+                self.release(chat_id)  # Granted just as the caller gave up
+            elif not waiter.future.done():
+                waiter.future.set_result(False)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._wait_count += 1
+        return waiter.future.result()
+
+    def release(self, chat_id: int):
+        self._active[chat_id] -= 1
+        if self._active[chat_id] <= 0:
+            del self._active[chat_id]
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        pending = [w for w in self._waiters if not w.future.done()]
+        return {
+            "active": self.active,
+            "active_chats": len(self._active),
+            "admitted": self.admitted,
+            "queued": {
+                p.name.lower(): sum(1 for w in pending if w.priority == p) for p in ReplyPriority
+            },
+            "shed_stale": self.shed_stale,
+            "shed_overflow": self.shed_overflow,
+            "avg_queue_wait_ms": (
+                round(self._wait_total / self._wait_count * 1000, 1) if self._wait_count else 0
+            ),
+            "max_queue_wait_ms": round(self._wait_max * 1000, 1),
+        }
+
+    def _has_room(self, chat_id: int) -> bool:
+        return (
+            self.active < settings.REPLY_MAX_CONCURRENT
+            and self._active[chat_id] < settings.REPLY_MAX_PER_CHAT
+        )
+
+    def _grant(self, chat_id: int):
+        self._active[chat_id] += 1
+        self.admitted += 1
+
+    def _dispatch(self):
+        """Grants queued requests, best priority first, while slots are free."""
+        self._waiters = [w for w in self._waiters if not w.future.done()]
+        heapq.heapify(self._waiters)
+        skipped: List[_Waiter] = []
+        while self._waiters and self.active < settings.REPLY_MAX_CONCURRENT:
+            waiter = heapq.heappop(self._waiters)
+            if self._has_room(waiter.chat_id):
+                self._grant(waiter.chat_id)
+                waiter.future.set_result(True)
+            else:
+                skipped.append(waiter)  # Its chat is busy; later chats may still run
+        for waiter in skipped:
+            heapq.heappush(self._waiters, waiter)
+
+    def _shed_overflow(self):
+        worst = max(w for w in self._waiters if not w.future.done())
+        self._waiters.remove(worst)
+        heapq.heapify(self._waiters)
+        worst.future.set_result(False)
+        self.shed_overflow += 1
+        logger.warning(f"Reply queue full; shed a request for chat {worst.chat_id}.")
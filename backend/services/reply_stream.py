@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+REACTION_TAG = re.compile(r"\s*\[REACTION:\s*(.+?)\]")  # With the space before it
+TAG_OPENING = "[REACTION:"
+# Punctuation followed by whitespace, or a line break, ends a sentence
+SENTENCE_END = re.compile(r"[.!?…](\s|$)|\n")
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_reaction(text: str):
+    """
+    (emoji or None, text without reaction tags). The first tag is the reaction
+    wherever it appears; any others are dropped (a message takes one reaction).
+    """
+    match = REACTION_TAG.search(text)
+    if not match:
+        return None, text
+    return match.group(1).strip(), REACTION_TAG.sub("", text).strip()
+
+
+class ProgressiveReply:
+    """
+    Delivers a streamed reply to one chat as it is generated.
+
+    The first message is sent as soon as a complete sentence is available;
+    later text is added by editing it at most once per
+    CONVERSATION_STREAM_EDIT_INTERVAL seconds (Telegram throttles frequent
+    edits), and text beyond Telegram's message size continues in a new
+    message. The first [REACTION: <emoji>] tag, wherever it appears, is handed
+    to `on_reaction` as soon as it is complete; tags (and a tag still being
+    generated) are never shown. Nothing is sent before
+    the monotonic time `not_before` (the simulated reading delay).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        chat_id: int,
+        reply_to: Optional[int] = None,
+        on_reaction: Optional[Callable[[str], Awaitable[None]]] = None,
+        not_before: Optional[float] = None,
+        on_first_send: Optional[Callable[[], None]] = None,
+    ):
+        self.client = client
+        self.chat_id = chat_id
+        self.reply_to = reply_to
+        self.on_reaction = on_reaction
+        self.on_first_send = on_first_send
+        self._raw = ""
+        self._reacted = False
+        self._messages: List[Any] = []  # Sent Telegram messages, in order
+        self._sent: List[str] = []  # Text currently shown in each of them
+        self._last_edit = 0.0
+        self.started = time.monotonic()
+        self.not_before = not_before or self.started
+        self.first_ready_after: Optional[float] = None  # First sentence generated
+        self.first_sent_after: Optional[float] = None
+        self.edits = 0
+
+    @property
+    def text(self) -> str:
+        """Reply text received so far, without reaction tags or an unfinished one."""
+        text = REACTION_TAG.sub("", self._raw)
+        start = text.rfind("[")
+        if start != -1 and "]" not in text[start:]:
+            tail = text[start:]
+            if TAG_OPENING.startswith(tail) or tail.startswith(TAG_OPENING):
+                text = text[:start]
+        return text.strip()
+
+    async def feed(self, chunk: str):
+        self._raw += chunk
+        await self._check_reaction()
+        text = self.text
+        if not self._messages:
+            if text and SENTENCE_END.search(text):
+                self._mark_ready()
+                if time.monotonic() >= self.not_before:
+                    await self._sync(text)
+        elif time.monotonic() - self._last_edit >= settings.CONVERSATION_STREAM_EDIT_INTERVAL:
+            await self._sync(text)
+
+    async def finish(self) -> str:
+        """Flushes the remaining text and returns the full reply."""
+        await self._check_reaction()
+        text = self.text
+        if not self._messages and text:
+            self._mark_ready()
+            await asyncio.sleep(max(0.0, self.not_before - time.monotonic()))
+        elif self._messages and text != "".join(self._sent):
+            wait = settings.CONVERSATION_STREAM_EDIT_INTERVAL - (
+                time.monotonic() - self._last_edit
+            )
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self._sync(text)
+        return text
+
+    def _mark_ready(self):
+        if self.first_ready_after is None:
+            self.first_ready_after = time.monotonic() - self.started
+
+    async def _check_reaction(self):
+        """Sends the first complete reaction tag, once."""
+        if self._reacted:
+            return
+        emoji, _ = split_reaction(self._raw)
+        if emoji:
+            self._reacted = True
+            await self._react(emoji)
+
+    async def _react(self, emoji: str):
+        if self.on_reaction:
+            try:
+                await self.on_reaction(emoji)
+            except Exception as e:
+                logger.error(f"Failed to send reaction: {e}")
+
+    async def _sync(self, text: str):
+        """Makes the sent messages show `text`, editing the last one or appending new ones."""
+        parts = [
+            text[i : i + TELEGRAM_MESSAGE_LIMIT]
+            for i in range(0, len(text), TELEGRAM_MESSAGE_LIMIT)
+        ]
+        for index, part in enumerate(parts):
+            if index < len(self._sent):
+                if self._sent[index] != part:
+                    await self.client.edit_message(self.chat_id, self._messages[index], part)
+                    self._sent[index] = part
+                    self.edits += 1
+                continue
+            if not self._messages and self.on_first_send:
+                self.on_first_send()
+            reply_to = self.reply_to if not self._messages else None
+            message = await self.client.send_message(self.chat_id, part, reply_to=reply_to)
+            self._messages.append(message)
+            self._sent.append(part)
+            if self.first_sent_after is None:
+                self.first_sent_after = time.monotonic() - self.started
+        self._last_edit = time.monotonic()
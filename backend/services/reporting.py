@@ -3,8 +3,8 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional, Union, Tuple
 
-from sqlmodel import Session, select
-from backend.database import engine, Message
+from backend.database import Message
+from backend.repository import repository
 from backend.services.ai import ai_service
 from backend.client import client
 from backend.settings import settings
@@ -38,7 +38,7 @@ class ReportingService:
         logger.info(f"Generating daily report ({report_scope})...")
 
         # 1. Fetch messages
-        messages = await asyncio.to_thread(self._fetch_messages_for_report, chat_id)
+        messages = await self._fetch_messages_for_report(chat_id)
         if not messages:
             logger.warning("No messages found for today's report.")
             return "Sem mensagens para relatar."
@@ -61,19 +61,11 @@ class ReportingService:
 
         return report_text
 
-    def _fetch_messages_for_report(self, chat_id: Optional[int] = None) -> List[Message]:
-        """Fetches messages in a thread from the last 24 hours (UTC)."""
+    async def _fetch_messages_for_report(self, chat_id: Optional[int] = None) -> List[Message]:
+        """Fetches messages from the last 24 hours (UTC)."""
         cutoff = datetime.now(timezone.utc) - timedelta(days=1)
-        with Session(engine) as session:
-            statement = select(Message).where(Message.date >= cutoff)
-            if chat_id:
-                statement = statement.where(Message.chat_id == chat_id)
-
-            # Limit to prevent memory issues with massive history
-            statement = statement.order_by(Message.date.desc()).limit(5000)
-
-            messages = session.exec(statement).all()
-            return list(messages)
+        # Limit to prevent memory issues with massive history
+        return await repository.messages_since(cutoff, chat_id=chat_id, limit=5000)
 
     async def _prepare_data_for_ai(self, messages: List[Message]) -> Dict[str, List[Message]]:
         """Groups messages by chat and resolves chat titles."""
@@ -0,0 +1,50 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from backend.repository import repository
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSearchService:
+    """
+    Searches stored history and learned facts through the local FTS5 index.
+    Never hits Telegram, so it is immune to flood limits.
+    """
+
+    def __init__(self):
+        self.repository = repository
+
+    async def search(
+        self,
+        query: str,
+        chat_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 20,
+        include_facts: bool = True,
+    ) -> Dict[str, Any]:
+        """Returns ranked message matches (with snippets) and, optionally, fact matches."""
+        started = time.perf_counter()
+        messages = await self.repository.search_messages(
+            query, chat_id=chat_id, sender_id=sender_id, since=since, until=until, limit=limit
+        )
+        facts = []
+        if include_facts:
+            facts = await self.repository.search_facts(
+                query, chat_id=chat_id, sender_id=sender_id, limit=limit
+            )
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.debug(f"Local search '{query}' took {elapsed_ms}ms")
+        return {
+            "query": query,
+            "messages": messages,
+            "facts": facts,
+            "elapsed_ms": elapsed_ms,
+        }
+
+
+local_search_service = LocalSearchService()
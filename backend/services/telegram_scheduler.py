@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telethon.errors import FloodWaitError
+
+from backend.client import flood_sleep_disabled
+from backend.services.rate_limiter import TokenBucket
+from backend.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Clock for FloodWait pauses (module-level so tests can drive it)
+monotonic = time.monotonic
+sleep = asyncio.sleep
+
+
+class TelegramRpcScheduler:
+    """
+    Shares a Telegram RPC budget between concurrent callers.
+
+    Every call spends one token from a TELEGRAM_RPC_PER_MINUTE bucket. A
+    FloodWaitError pauses only the method class that triggered it (e.g.
+    "get_messages") for the server-specified time, then the call is retried;
+    other method classes keep running in the meantime. Telethon's own
+    flood sleep is disabled for these calls (see SchedulerAwareClient), so
+    short waits are paused here too instead of blocking inside the call.
+    """
+
+    def __init__(self, rpc_per_minute: Optional[int] = None):
+        self.bucket = TokenBucket(rpc_per_minute or settings.TELEGRAM_RPC_PER_MINUTE)
+        self._lock = None
+        self._paused_until: Dict[str, float] = {}
+        self.calls = 0
+        self.flood_waits: Dict[str, int] = {}
+
+    async def call(self, method_class: str, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Runs `func(*args, **kwargs)` within the RPC budget, absorbing FloodWaits."""
+        while True:
+            await self._wait_for_pause(method_class)
+            await self._acquire()
+            token = flood_sleep_disabled.set(True)
+            try:
+                self.calls += 1
+                return await func(*args, **kwargs)
+            except FloodWaitError as e:
+                if e.seconds > settings.TELEGRAM_FLOOD_MAX_WAIT:
+                    logger.error(
+                        f"FloodWait of {e.seconds}s on {method_class} exceeds "
+                        f"TELEGRAM_FLOOD_MAX_WAIT. Giving up."
+                    )
+                    raise
+                self.flood_waits[method_class] = self.flood_waits.get(method_class, 0) + 1
+                resume_at = monotonic() + e.seconds + 1
+                self._paused_until[method_class] = max(
+                    self._paused_until.get(method_class, 0), resume_at
+                )
+                logger.warning(f"FloodWaitError: pausing {method_class} for {e.seconds + 1}s.")
+            finally:
+                flood_sleep_disabled.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        self.bucket.refill()
+        now = monotonic()
+        return {
+            "rpc_per_minute": self.bucket.rate_per_minute,
+            "rpc_available": round(self.bucket.tokens, 2),
+            "calls": self.calls,
+            "flood_waits": dict(self.flood_waits),
+            "paused": {
+                method: round(until - now, 1)
+                for method, until in self._paused_until.items()
+                if until > now
+            },
+        }
+
+    async def _wait_for_pause(self, method_class: str):
+        while True:
+            remaining = self._paused_until.get(method_class, 0) - monotonic()
+            if remaining <= 0:
+                return
+            await sleep(remaining)
+
+    async def _acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self.bucket.refill()
+            delay = self.bucket.seconds_until(1)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                self.bucket.refill()
+            self.bucket.consume(1)
+
+
+telegram_scheduler = TelegramRpcScheduler()
@@ -0,0 +1,114 @@
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from backend.database import Message
+from backend.settings import settings
+from backend.utils import normalize_text
+
+CONTEXT_MARKER = "(contexto)"
+
+
+@dataclass
+class ConversationWindow:
+    """
+    Consecutive messages of one chat extracted together in a single prompt item.
+    Messages in `context_ids` were already extracted elsewhere: they are shown to
+    the LLM as context only and never credited with new facts.
+    """
+
+    chat_id: int
+    messages: List[Message] = field(default_factory=list)
+    context_ids: Set[int] = field(default_factory=set)
+
+    @property
+    def message_ids(self) -> List[int]:
+        return [m.id for m in self.messages]
+
+    @property
+    def extractable(self) -> List[Message]:
+        return [m for m in self.messages if m.id not in self.context_ids]
+
+    def transcript(self) -> str:
+        """
+        Numbered lines ("1. Alice: ...") the LLM cites back in a fact's "lines";
+        context-only lines are marked ("1. (contexto) Alice: ...").
+        """
+        return "\n".join(
+            f"{i}. {self._marker(m)}{m.sender_name or m.sender_id or 'Desconhecido'}: {m.text}"
+            for i, m in enumerate(self.messages, 1)
+        )
+
+    def content(self) -> str:
+        """
+        The normalized message texts alone, without names or numbering. The
+        extraction cache keys on this, so the same conversation forwarded or
+        replayed by other people is a hit; line positions are still preserved.
+        """
+        return json.dumps(
+            [self._marker(m) + normalize_text(m.text) for m in self.messages], ensure_ascii=False
+        )
+
+    def messages_for_lines(self, lines: List[int]) -> List[Message]:
+        """Messages cited by 1-based line numbers; invalid lines are ignored."""
+        return [self.messages[n - 1] for n in dict.fromkeys(lines) if 1 <= n <= len(self.messages)]
+
+    def _marker(self, message: Message) -> str:
+        return f"{CONTEXT_MARKER} " if message.id in self.context_ids else ""
+
+
+def build_windows(
+    chat_id: int,
+    messages: List[Message],
+    max_gap_seconds: Optional[float] = None,
+    max_messages: Optional[int] = None,
+    max_turns: Optional[int] = None,
+) -> List[ConversationWindow]:
+    """
+    Splits chronologically ordered messages into conversation windows. A new
+    window starts after a silence longer than the max gap, once a window holds
+    max_messages, or when another speaker change would exceed max_turns.
+    """
+    max_gap = timedelta(seconds=max_gap_seconds or settings.LEARNING_WINDOW_MAX_GAP_SECONDS)
+    max_messages = max_messages or settings.LEARNING_WINDOW_MAX_MESSAGES
+    max_turns = max_turns or settings.LEARNING_WINDOW_MAX_TURNS
+
+    windows: List[ConversationWindow] = []
+    current: Optional[ConversationWindow] = None
+    turns = 0
+    for message in messages:
+        if not message.text:
+            continue
+        if current is not None:
+            previous = current.messages[-1]
+            new_turn = message.sender_id != previous.sender_id
+            if (
+                message.date - previous.date > max_gap
+                or len(current.messages) >= max_messages
+                or (new_turn and turns + 1 >= max_turns)
+            ):
+                current = None
+            elif new_turn:
+                turns += 1
+        if current is None:
+            current = ConversationWindow(chat_id)
+            windows.append(current)
+            turns = 0
+        current.messages.append(message)
+    return windows
+
+
+def merge_time_ranges(
+    dates: List[datetime], padding_seconds: float
+) -> List[Tuple[datetime, datetime]]:
+    """Merges [date - padding, date + padding] ranges that overlap."""
+    padding = timedelta(seconds=padding_seconds)
+    ranges: List[Tuple[datetime, datetime]] = []
+    for date in sorted(dates):
+        start, end = date - padding, date + padding
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
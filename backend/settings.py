@@ -13,11 +13,56 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: Optional[str] = None
     AI_MODEL_NAME: str = "gemini-1.5-flash"
     AI_CONTEXT_FACT_LIMIT: int = 50
+    FACT_TIER_CORE_LIMIT: int = 10  # Newest core identity facts always in context
+    FACT_TIER_WORK_LIMIT: int = 20  # Newest work facts, after the core tier
+
+    # Fact-set cache (assembled context facts per chat/sender, invalidated on fact writes)
+    FACT_CACHE_ENABLED: bool = True
+    FACT_CACHE_MAX_ENTRIES: int = 1000
+
+    # Semantic fact retrieval (local embeddings, blended into the context tiers)
+    SEMANTIC_RETRIEVAL_ENABLED: bool = True
+    SEMANTIC_FACT_TOP_K: int = 10  # Context slots reserved for facts similar to the message
+    SEMANTIC_MIN_SCORE: float = 0.15  # Cosine similarity below this is not "relevant"
+    EMBEDDING_DIM: int = 512
+    EMBEDDING_STORE_PATH: Optional[str] = None  # File prefix; defaults next to database.db
+    ANN_MIN_ROWS: int = 50_000  # Stored facts that trigger training the IVF index
+    ANN_NPROBE: int = 16  # IVF cells scanned per query; widened until a scope has k hits
+
+    # Gemini rate limiting (shared by replies, extraction and reports)
+    AI_RATE_LIMIT_RPM: int = 15
+    AI_RATE_LIMIT_TPM: int = 1_000_000
+    AI_RATE_DECREASE_FACTOR: float = 0.5  # Multiplier applied on 429 / RESOURCE_EXHAUSTED
+    AI_RATE_MIN_FACTOR: float = 0.1  # Floor, as a fraction of the configured limits
+    AI_RATE_OUTPUT_TOKEN_ESTIMATE: int = 500  # Added to the prompt estimate per call
 
     # Conversation
     CONVERSATION_MIN_DELAY: float = 1.0
     CONVERSATION_MAX_DELAY: float = 4.0
     CONVERSATION_TYPING_SPEED: float = 0.05
+    CONVERSATION_STREAMING_ENABLED: bool = True  # Send the reply progressively while generated
+    CONVERSATION_STREAM_EDIT_INTERVAL: float = 1.5  # Min seconds between edits of a message
+    CONVERSATION_DEBOUNCE_SECONDS: float = 2.0  # Quiet time that ends a burst; 0 disables
+    CONVERSATION_DEBOUNCE_MAX_WAIT: float = 8.0  # Longest a burst waits before its reply
+
+    # Reply admission (concurrency limits and load shedding for replies)
+    REPLY_MAX_CONCURRENT: int = 8  # Replies generated at once, across all chats
+    REPLY_MAX_PER_CHAT: int = 1
+    REPLY_QUEUE_MAX: int = 50  # Waiting replies; beyond this the least urgent is shed
+    REPLY_QUEUE_MAX_WAIT: float = 20.0  # Seconds in the queue before a reply is shed as stale
+    REPLY_SHED_REACTION: str = "👀"  # Sent to a shed message instead of a reply
+
+    # Reply prompt budgets (estimated tokens per section of the conversation prompt)
+    PROMPT_SYSTEM_TOKEN_BUDGET: int = 1500  # Instructions; only checked, never truncated
+    PROMPT_FACTS_TOKEN_BUDGET: int = 1500
+    PROMPT_HISTORY_TOKEN_BUDGET: int = 3000
+    PROMPT_MESSAGE_TOKEN_BUDGET: int = 1000
+    PROMPT_LINE_MAX_TOKENS: int = 250  # Longer history lines and facts are cut in the middle
+
+    # Recent-message buffer (in-memory chat history for reply context)
+    HISTORY_BUFFER_MESSAGES_PER_CHAT: int = 20
+    HISTORY_BUFFER_MAX_CHATS: int = 500  # Least recently used chats are evicted beyond this
+    HISTORY_BUFFER_MAX_BYTES: int = 8 * 1024 * 1024  # Approximate memory cap
 
     # Reporting
     REPORT_CHANNEL_ID: Optional[Union[int, str]] = None
@@ -26,11 +71,58 @@ class Settings(BaseSettings):
     REPORT_CONTEXT_LIMIT: int = 2000
 
     # Learning
-    LEARNING_BATCH_SIZE: int = 5
+    LEARNING_BATCH_TOKEN_BUDGET: int = 3000  # Estimated message tokens per batched LLM call
+    LEARNING_BATCH_MAX_MESSAGES: int = 40
     LEARNING_DELAY: float = 1.0
     MIN_MESSAGE_LENGTH_FOR_LEARNING: int = 10
     LEARNING_HISTORY_LIMIT: int = 50
     AUTO_LEARN_ON_STARTUP: bool = True
+    PREFILTER_ENABLED: bool = True  # Cheap local scoring before paying for extraction
+    PREFILTER_THRESHOLD: float = 0.4
+
+    # Conversation windows (neighbouring messages are extracted together)
+    LEARNING_WINDOW_MAX_GAP_SECONDS: int = 300  # Silence that closes a window
+    LEARNING_WINDOW_MAX_MESSAGES: int = 20
+    LEARNING_WINDOW_MAX_TURNS: int = 8  # Speaker turns per window
+    LEARNING_WINDOW_SETTLE_SECONDS: int = 60  # Live messages wait for replies before extraction
+    LEARNING_OWN_EDIT_DEBOUNCE_SECONDS: float = 5.0  # Own edits (streamed replies); 0 disables
+
+    # Fact consolidation (periodic merge of duplicate facts)
+    FACT_CONSOLIDATION_ENABLED: bool = True
+    FACT_CONSOLIDATION_INTERVAL_MINUTES: int = 60
+    FACT_SIMILARITY_THRESHOLD: float = 0.75  # Token overlap (Jaccard) for "same fact"
+    FACT_CONSOLIDATION_SCOPES_PER_PAGE: int = 200  # Senders/chats loaded and planned together
+
+    # History ingestion (Telegram RPC scheduling)
+    INGEST_CONCURRENCY: int = 4  # Dialogs ingested in parallel by a global backfill
+    TELEGRAM_RPC_PER_MINUTE: int = 120
+    TELEGRAM_FLOOD_MAX_WAIT: int = 300  # FloodWaits longer than this (seconds) are errors
+    BACKFILL_CHUNK_SIZE: int = 200  # Messages fetched and persisted per streaming chunk
+    LEARN_COMMAND_MAX_LIMIT: int = 500  # /aprender above this switches to streaming backfill
+
+    # Extraction job queue (durable, shared by live messages and backfill)
+    EXTRACTION_WORKERS: int = 2
+    EXTRACTION_MAX_ATTEMPTS: int = 5
+    EXTRACTION_RETRY_BASE_DELAY: float = 5.0  # Seconds, doubled per failed attempt
+    EXTRACTION_POLL_INTERVAL: float = 5.0
+
+    # Extraction cache (normalized text hash + prompt/model version)
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 50000
+
+    # Persistence (write-behind queue for incoming messages)
+    PERSISTENCE_FLUSH_SIZE: int = 100
+    PERSISTENCE_FLUSH_INTERVAL_MS: int = 50
+
+    # Database (SQLite storage profile)
+    DB_JOURNAL_MODE: str = "WAL"
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_MMAP_SIZE: int = 268435456  # 256 MiB
+    DB_CACHE_SIZE_KB: int = 65536  # 64 MiB page cache per connection
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"  # Ignore extra env vars
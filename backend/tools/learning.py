@@ -1,3 +1,5 @@
+from backend.services.ai import ai_service
+from backend.services.consolidation import fact_consolidation_service
 from backend.services.learning import learning_service
 
 
@@ -8,3 +10,37 @@ async def learn_from_chat(chat_id: int, limit: int = 100) -> str:
     """
     result_msg = await learning_service.ingest_history(chat_id, limit)
     return f"Result for chat {chat_id}: {result_msg}"
+
+
+async def backfill_chat_history(chat_id: int, limit: int = 0) -> str:
+    """
+    Streams a chat's full history (or the last `limit` messages, 0 = all) into the
+    database in checkpointed chunks and queues it for learning. Safe to call again:
+    it resumes from the last checkpoint and catches up on newer messages first.
+    """
+    result = await learning_service.backfill_history(chat_id, limit or None)
+    return f"Result for chat {chat_id}: {result.message}"
+
+
+async def consolidate_facts(chat_id: int = 0) -> str:
+    """
+    Merges duplicate learned facts (all chats, or only `chat_id`) into one row per
+    fact with a mention count, and marks values replaced by newer ones as superseded.
+    """
+    report = await fact_consolidation_service.consolidate(chat_id or None)
+    return (
+        f"Consolidated {report.facts_scanned} facts into {report.clusters} entities: "
+        f"{report.rows_reclaimed} duplicate rows removed, {report.superseded} values superseded."
+    )
+
+
+async def rebuild_fact_index() -> str:
+    """
+    Re-embeds every learned fact for semantic retrieval, dropping deleted ones,
+    and retrains the approximate nearest-neighbour index for large fact sets.
+    """
+    report = await ai_service.fact_retriever.rebuild()
+    return (
+        f"Rebuilt fact embeddings for {report['facts']} facts "
+        f"({report['index_lists']} index lists) in {report['seconds']}s."
+    )
@@ -1,6 +1,9 @@
+from datetime import datetime
+from typing import Optional
 from telethon import functions
 from backend.client import client
-from backend.utils import log_and_format_error, format_entity
+from backend.services.search import local_search_service
+from backend.utils import log_and_format_error, format_entity, json_serializer
 import json
 
 
@@ -18,3 +21,27 @@ async def resolve_username(username: str) -> str:
         return str(result)
     except Exception as e:
         return log_and_format_error("resolve_username", e, username=username)
+
+
+async def search_local_history(
+    query: str,
+    chat_id: Optional[int] = None,
+    sender_id: Optional[int] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    limit: int = 20,
+) -> str:
+    """
+    Full-text search over locally stored messages and learned facts.
+    Answers from the local index without calling Telegram.
+    Dates are ISO 8601 (e.g. 2024-05-01 or 2024-05-01T18:00:00+00:00).
+    """
+    try:
+        since = datetime.fromisoformat(from_date) if from_date else None
+        until = datetime.fromisoformat(to_date) if to_date else None
+        result = await local_search_service.search(
+            query, chat_id=chat_id, sender_id=sender_id, since=since, until=until, limit=limit
+        )
+        return json.dumps(result, indent=2, default=json_serializer, ensure_ascii=False)
+    except Exception as e:
+        return log_and_format_error("search_local_history", e, query=query, chat_id=chat_id)
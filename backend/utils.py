@@ -178,6 +178,24 @@ def get_sender_name(message) -> str:
         return "Unknown"
 
 
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Cheap local token estimate (~4 characters per token for Latin text).
+    Good enough for budgeting prompts without calling the tokenizer API.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Case- and whitespace-insensitive form of a message (cache keys, edit detection)."""
+    return WHITESPACE_PATTERN.sub(" ", (text or "").strip().lower())
+
+
 def async_retry(max_attempts: int = 3, delay: float = 1.0):
     """
     Decorator to retry async functions with exponential backoff.
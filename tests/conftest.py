@@ -0,0 +1,66 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from backend.database import create_fts_tables
+from backend.repository import Repository
+from backend.services.fact_cache import fact_cache
+from backend.services.history_buffer import history_buffer
+from backend.settings import settings
+
+
+@pytest_asyncio.fixture
+async def repo():
+    """Repository backed by a fresh in-memory SQLite database."""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+        await connection.run_sync(create_fts_tables)
+    yield Repository(engine)
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def disable_extraction_cache():
+    """Keeps tests that mock the LLM from being served by a persistent cache."""
+    with patch.object(settings, "EXTRACTION_CACHE_ENABLED", False):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_semantic_retrieval():
+    """Keeps context tests from embedding facts into the on-disk vector store."""
+    with patch.object(settings, "SEMANTIC_RETRIEVAL_ENABLED", False):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_history_buffer():
+    """Keeps chat history warmed by one test from serving another."""
+    history_buffer.clear()
+    yield
+    history_buffer.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_fact_cache():
+    """Keeps fact lists cached by one test (often mocked) from serving another."""
+    fact_cache.clear()
+    yield
+    fact_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def disable_reply_streaming():
+    """Reply tests mock generate_natural_response; streaming tests opt back in."""
+    with patch.object(settings, "CONVERSATION_STREAMING_ENABLED", False):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_reply_debounce():
+    """Handler tests expect one immediate reply per message."""
+    with patch.object(settings, "CONVERSATION_DEBOUNCE_SECONDS", 0):
+        yield
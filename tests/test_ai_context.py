@@ -1,90 +1,101 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from datetime import datetime, timedelta, timezone
 
-# Add backend to path if needed, or rely on python -m pytest
+from backend.database import Fact, Message
 from backend.services.ai import AIService
 
 
-class MockFact:
-    def __init__(self, id, category, created_at):
-        self.id = id
-        self.category = category
-        self.created_at = created_at
-        self.entity = "Ent"
-        self.value = "Val"
-        self.chat_id = 1
-        self.sender_id = 1
+def create_fact(category, days_ago, chat_id=1, sender_id=1):
+    return Fact(
+        chat_id=chat_id,
+        sender_id=sender_id,
+        entity_name="Ent",
+        value="Val",
+        category=category,
+        created_at=datetime.now(timezone.utc) - timedelta(days=days_ago),
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_facts_for_context_prioritization(repo):
+    facts = (
+        # 5 Personal (Tier 1) - Old (10 days ago)
+        [create_fact("pessoal", 10) for _ in range(5)]
+        # 30 Tech (Tier 2) - Medium (5 days ago)
+        + [create_fact("tech", 5) for _ in range(30)]
+        # 30 General (Tier 3) - New (1 day ago)
+        + [create_fact("general", 1) for _ in range(30)]
+    )
+    async with repo.session() as session:
+        session.add_all(facts)
+        await session.commit()
+
+    facts = await repo.get_facts_for_context(chat_id=1, sender_id=1, limit=50)
 
+    assert len(facts) == 50
 
-@pytest.fixture
-def mock_session_cls():
-    with patch("backend.services.ai.Session") as mock:
-        yield mock
-
-
-@pytest.fixture
-def mock_engine():
-    with patch("backend.services.ai.engine") as mock:
-        yield mock
-
-
-def create_fact(id, category, days_ago):
-    return MockFact(id=id, category=category, created_at=datetime.now() - timedelta(days=days_ago))
-
-
-def test_get_context_prioritization(mock_session_cls, mock_engine):
-    # Setup Service
-    service = AIService()
-
-    # Setup mock facts
-    # 5 Personal (Tier 1) - Old (10 days ago)
-    personal_facts = [create_fact(i, "pessoal", 10) for i in range(1, 6)]
-    # 30 Tech (Tier 2) - Medium (5 days ago)
-    tech_facts = [create_fact(i, "tech", 5) for i in range(6, 36)]
-    # 30 General (Tier 3) - New (1 day ago)
-    general_facts = [create_fact(i, "general", 1) for i in range(36, 66)]
+    # Verify Composition: 5 pessoal + 20 tech (tier cap) + 25 general (fill)
+    assert sum(1 for f in facts if f.category == "pessoal") == 5
+    assert sum(1 for f in facts if f.category == "tech") == 20
+    assert sum(1 for f in facts if f.category == "general") == 25
 
-    # Mock DB Session
-    mock_db_session = MagicMock()
-    mock_session_cls.return_value.__enter__.return_value = mock_db_session
+    # Verify Sorting (Newest First)
+    assert facts[0].category == "general"
+    assert facts[-1].category == "pessoal"
 
-    # Prepare Result objects for each call
-    res_history = MagicMock()
-    res_history.all.return_value = []
 
-    res_tier1 = MagicMock()
-    res_tier1.all.return_value = personal_facts  # Returns 5
+@pytest.mark.asyncio
+async def test_get_facts_for_context_tier_sizes_from_settings(repo):
+    facts = (
+        [create_fact("pessoal", 10 + i) for i in range(4)]
+        + [create_fact("trabalho", 5) for _ in range(3)]
+        + [create_fact("general", 1) for _ in range(5)]
+    )
+    async with repo.session() as session:
+        session.add_all(facts)
+        await session.commit()
 
-    res_tier2 = MagicMock()
-    # The DB query would limit to 20, so we simulate that
-    res_tier2.all.return_value = tech_facts[:20]
+    with (
+        patch("backend.repository.settings.FACT_TIER_CORE_LIMIT", 2),
+        patch("backend.repository.settings.FACT_TIER_WORK_LIMIT", 1),
+    ):
+        facts = await repo.get_facts_for_context(chat_id=1, sender_id=1, limit=6)
 
-    res_tier3 = MagicMock()
-    # Logic: 50 - 5 (pessoal) - 20 (tech) = 25 slots left.
-    # The DB query would limit to 25.
-    res_tier3.all.return_value = general_facts[:25]
+    # 2 newest core + 1 work, then the 3 newest of everything else
+    assert [f.category for f in facts] == ["general"] * 3 + ["trabalho", "pessoal", "pessoal"]
+    # The core tier keeps its newest facts (10 and 11 days old)
+    cutoff = datetime.now() - timedelta(days=11.5)
+    assert all(f.created_at > cutoff for f in facts)
 
-    mock_db_session.exec.side_effect = [res_history, res_tier1, res_tier2, res_tier3]
 
-    # Act
-    history, facts = service._get_context(chat_id=1, sender_id=1)
+@pytest.mark.asyncio
+async def test_get_facts_for_context_sender_scope(repo):
+    async with repo.session() as session:
+        session.add(create_fact("pessoal", 1, chat_id=2, sender_id=7))
+        session.add(create_fact("pessoal", 1, chat_id=3, sender_id=8))
+        await session.commit()
 
-    # Assert
-    assert len(facts) == 50
+    facts = await repo.get_facts_for_context(chat_id=1, sender_id=7)
+    assert len(facts) == 1
+    assert facts[0].sender_id == 7
 
-    # Verify Composition
-    pessoal_count = sum(1 for f in facts if f.category == "pessoal")
-    tech_count = sum(1 for f in facts if f.category == "tech")
-    general_count = sum(1 for f in facts if f.category == "general")
+    assert await repo.get_facts_for_context(chat_id=1) == []
 
-    assert pessoal_count == 5
-    assert tech_count == 20
-    assert general_count == 25
 
-    # Verify Sorting (Newest First)
-    # General (1 day ago) should be first
-    # Tech (5 days ago)
-    # Personal (10 days ago)
-    assert facts[0].category == "general"
-    assert facts[-1].category == "pessoal"
+@pytest.mark.asyncio
+async def test_ai_service_get_context_uses_repository():
+    service = AIService()
+    with patch("backend.services.ai.repository") as mock_repo:
+        mock_repo.get_recent_history = AsyncMock(
+            return_value=[Message(telegram_message_id=5, chat_id=1, text="m", date=datetime.now())]
+        )
+        mock_repo.get_facts_for_context = AsyncMock(return_value=["f"])
+
+        history, facts = await service._get_context(chat_id=1, sender_id=2)
+        # Second reply in the same chat is served from the history buffer
+        await service._get_context(chat_id=1, sender_id=2)
+
+    assert [m.text for m in history] == ["m"]
+    assert facts == ["f"]
+    mock_repo.get_recent_history.assert_awaited_once_with(1, limit=20)
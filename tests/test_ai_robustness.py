@@ -20,8 +20,8 @@ async def test_extract_facts_with_markdown_blocks():
     Here is the JSON you requested:
     ```json
     [
-        {"entity": "Project", "value": "Apollo", "category": "work"},
-        {"entity": "Hobby", "value": "Guitar", "category": "personal"}
+        {"source": "1", "entity": "Project", "value": "Apollo", "category": "work"},
+        {"source": "1", "entity": "Hobby", "value": "Guitar", "category": "personal"}
     ]
     ```
     Hope this helps!
@@ -32,7 +32,7 @@ async def test_extract_facts_with_markdown_blocks():
     )
     service.client = mock_client
 
-    facts = await service.extract_facts("Text doesn't matter here due to mock")
+    facts = (await service.extract_facts_batch({"1": "Text doesn't matter here"}))["1"]
 
     assert len(facts) == 2
     assert facts[0]["value"] == "Apollo"
@@ -48,7 +48,7 @@ async def test_extract_facts_with_generic_markdown_blocks():
     markdown_response = """
     ```
     [
-        {"entity": "City", "value": "Rio", "category": "location"}
+        {"source": "1", "entity": "City", "value": "Rio", "category": "location"}
     ]
     ```
     """
@@ -58,7 +58,7 @@ async def test_extract_facts_with_generic_markdown_blocks():
     )
     service.client = mock_client
 
-    facts = await service.extract_facts("Text doesn't matter")
+    facts = (await service.extract_facts_batch({"1": "Text doesn't matter"}))["1"]
 
     assert len(facts) == 1
     assert facts[0]["value"] == "Rio"
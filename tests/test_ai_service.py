@@ -32,11 +32,12 @@ async def test_extract_facts_json_success(ai_service):
     # Mock response
     mock_response = MagicMock()
     mock_response.text = (
-        '[{"entity": "Pizza", "value": "Likes pepperoni", "category": "preference"}]'
+        '[{"source": "1", "entity": "Pizza", "value": "Likes pepperoni", '
+        '"category": "preference"}]'
     )
     ai_service.client.aio.models.generate_content.return_value = mock_response
 
-    facts = await ai_service.extract_facts("I love pepperoni pizza.")
+    facts = (await ai_service.extract_facts_batch({"1": "I love pepperoni pizza."}))["1"]
 
     assert len(facts) == 1
     assert facts[0]["entity"] == "Pizza"
@@ -55,11 +56,11 @@ async def test_extract_facts_json_cleanup(ai_service):
     # Mock response with markdown code blocks (even with JSON mode it can happen sometimes)
     mock_response = MagicMock()
     mock_response.text = (
-        '```json\n[{"entity": "Code", "value": "Python", "category": "tech"}]\n```'
+        '```json\n[{"source": "1", "entity": "Code", "value": "Python", "category": "tech"}]\n```'
     )
     ai_service.client.aio.models.generate_content.return_value = mock_response
 
-    facts = await ai_service.extract_facts("I code in Python.")
+    facts = (await ai_service.extract_facts_batch({"1": "I code in Python."}))["1"]
 
     assert len(facts) == 1
     assert facts[0]["entity"] == "Code"
@@ -71,8 +72,8 @@ async def test_extract_facts_empty(ai_service):
     mock_response.text = "[]"
     ai_service.client.aio.models.generate_content.return_value = mock_response
 
-    facts = await ai_service.extract_facts("Nothing here.")
-    assert facts == []
+    facts = await ai_service.extract_facts_batch({"1": "Nothing here."})
+    assert facts == {}
 
 
 @pytest.mark.asyncio
@@ -104,9 +105,74 @@ async def test_summarize_conversations_empty(ai_service):
 async def test_extract_facts_validation_failure(ai_service):
     # Mock response with valid JSON but missing required fields
     mock_response = MagicMock()
-    mock_response.text = '[{"entity": "Pizza", "category": "preference"}]'  # Missing 'value'
+    mock_response.text = (
+        '[{"source": "1", "entity": "Pizza", "category": "preference"}]'  # Missing 'value'
+    )
     ai_service.client.aio.models.generate_content.return_value = mock_response
 
-    facts = await ai_service.extract_facts("I love pizza.")
+    facts = await ai_service.extract_facts_batch({"1": "I love pizza."})
+
+    assert facts == {}  # Should be filtered out because validation failed
+
+
+def test_pack_by_token_budget():
+    items = [("a", "x" * 40), ("b", "x" * 40), ("c", "x" * 400), ("d", "x" * 4)]
+    # ~11 tokens each for a/b, ~101 for c
+    batches = AIService.pack_by_token_budget(items, token_budget=30, max_items=10)
+    assert [[k for k, _ in b] for b in batches] == [["a", "b"], ["c"], ["d"]]
+
+    batches = AIService.pack_by_token_budget(items, token_budget=10_000, max_items=3)
+    assert [len(b) for b in batches] == [3, 1]
+
+
+@pytest.mark.asyncio
+async def test_extract_facts_batch_groups_by_source():
+    service = AIService()
+    mock_client = MagicMock()
+    mock_response = MagicMock(text="""[
+            {"source": "11", "entity": "Java", "value": "Odeia Java", "category": "tech"},
+            {"source": 12, "entity": "Sexta", "value": "Deploy na sexta"},
+            {"source": "99", "entity": "Ghost", "value": "Unknown key"},
+            {"entity": "NoSource", "value": "Missing key"}
+        ]""")
+    mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
+    service.client = mock_client
+
+    result = await service.extract_facts_batch({"11": "Odeio Java", "12": "Deploy na sexta"})
+
+    assert set(result) == {"11", "12"}
+    assert result["11"][0]["entity"] == "Java"
+    assert result["12"][0]["category"] == "general"
+    assert "source" not in result["11"][0]
+
+    # One call for the whole batch, both messages in the prompt
+    mock_client.aio.models.generate_content.assert_awaited_once()
+    prompt = mock_client.aio.models.generate_content.call_args.kwargs["contents"]
+    assert "Odeio Java" in prompt and "Deploy na sexta" in prompt
 
-    assert len(facts) == 0  # Should be filtered out because validation failed
+
+@pytest.mark.asyncio
+async def test_stream_natural_response_yields_chunks():
+    service = AIService()
+    service.client = MagicMock()
+
+    async def stream():
+        for text in ["Oi, ", "tudo bem?"]:
+            yield MagicMock(text=text, usage_metadata=None)
+
+    service.client.aio.models.generate_content_stream = AsyncMock(return_value=stream())
+    with patch.object(service, "_get_context", AsyncMock(return_value=([], []))):
+        chunks = [c async for c in service.stream_natural_response(1, "oi")]
+
+    assert chunks == ["Oi, ", "tudo bem?"]
+
+
+@pytest.mark.asyncio
+async def test_stream_natural_response_error_before_first_chunk():
+    service = AIService()
+    service.client = MagicMock()
+    service.client.aio.models.generate_content_stream = AsyncMock(side_effect=Exception("boom"))
+    with patch.object(service, "_get_context", AsyncMock(return_value=([], []))):
+        chunks = [c async for c in service.stream_natural_response(1, "oi")]
+
+    assert len(chunks) == 1 and "timeout" in chunks[0]
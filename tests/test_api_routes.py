@@ -24,6 +24,49 @@ def test_health_check():
         assert response.json()["connected"] is True
 
 
+def test_get_stats():
+    with (
+        patch("backend.database.get_db_stats", return_value={"lock_contention_count": 2}),
+        patch(
+            "backend.services.extraction_queue.extraction_queue.queue_depth",
+            new=AsyncMock(return_value={"pending": 3}),
+        ),
+    ):
+        response = client.get("/stats")
+        assert response.status_code == 200
+        assert response.json()["database"]["lock_contention_count"] == 2
+        assert response.json()["extraction"]["queue_depth"] == {"pending": 3}
+        assert "rpm_limit" in response.json()["ai_rate_limiter"]
+
+
+def test_get_stats_isolates_failing_section():
+    with patch(
+        "backend.services.persistence.message_writer.stats", side_effect=RuntimeError("boom")
+    ):
+        response = client.get("/stats")
+        assert response.status_code == 200
+        assert response.json()["persistence"] == {"error": "boom"}
+        assert "rpm_limit" in response.json()["ai_rate_limiter"]
+
+
+def test_prefilter_eval():
+    with patch("backend.services.learning.learning_service.evaluate_prefilter") as mock_eval:
+        mock_eval.return_value = {"total": 10, "would_skip": 4}
+        response = client.get("/prefilter/eval", params={"chat_id": 5, "limit": 100})
+        assert response.status_code == 200
+        assert response.json()["would_skip"] == 4
+        mock_eval.assert_awaited_once_with(chat_id=5, limit=100)
+
+
+def test_search_local():
+    with patch("backend.api.routes.local_search_service") as mock_service:
+        mock_service.search = AsyncMock(return_value={"query": "x", "messages": [], "facts": []})
+        response = client.get("/search", params={"query": "x", "chat_id": 5})
+        assert response.status_code == 200
+        assert response.json()["query"] == "x"
+        assert mock_service.search.call_args.kwargs["chat_id"] == 5
+
+
 def test_get_me(mock_telegram_service):
     mock_telegram_service.get_me = AsyncMock(return_value={"id": 123})
     response = client.get("/me")
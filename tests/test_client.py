@@ -1,7 +1,9 @@
 import pytest
 from unittest.mock import patch
 
-from backend.client import get_client, MockClient
+from telethon.sessions import StringSession
+
+from backend.client import SchedulerAwareClient, flood_sleep_disabled, get_client, MockClient
 
 
 def test_get_client_mock():
@@ -23,7 +25,7 @@ def test_get_client_string_session():
         mock_settings.TELEGRAM_SESSION_STRING = "session"
 
         with patch("backend.client.StringSession") as mock_ss:
-            with patch("backend.client.TelegramClient") as mock_tc:
+            with patch("backend.client.SchedulerAwareClient") as mock_tc:
                 get_client()
                 mock_tc.assert_called_once()
                 # Check if StringSession was used
@@ -39,7 +41,7 @@ def test_get_client_file_session():
         mock_settings.TELEGRAM_SESSION_STRING = None
         mock_settings.TELEGRAM_SESSION_NAME = "session_file"
 
-        with patch("backend.client.TelegramClient") as mock_tc:
+        with patch("backend.client.SchedulerAwareClient") as mock_tc:
             get_client()
             mock_tc.assert_called_once()
             args, _ = mock_tc.call_args
@@ -59,3 +61,16 @@ async def test_mock_client_methods():
     res = await c.get_entity("test")
     assert res is None
     await c.run_until_disconnected()
+
+
+def test_flood_sleep_threshold_is_zero_only_in_scheduled_calls():
+    c = SchedulerAwareClient(StringSession(), 123, "abc")
+    assert c.flood_sleep_threshold == 60  # Telethon's default for replies and tools
+
+    token = flood_sleep_disabled.set(True)
+    try:
+        assert c.flood_sleep_threshold == 0
+    finally:
+        flood_sleep_disabled.reset(token)
+    c.flood_sleep_threshold = 10
+    assert c.flood_sleep_threshold == 10
@@ -31,6 +31,21 @@ async def test_handle_commands_aprender(service):
         assert service.client.send_message.call_count == 2  # Starting + Done
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("command, limit", [("/aprender tudo", None), ("/aprender 5000", 5000)])
+async def test_handle_commands_aprender_streaming_backfill(service, command, limit):
+    with patch("backend.services.command.learning_service") as mock_learn:
+        result_obj = MagicMock()
+        result_obj.message = "Backfilled 5000 new messages"
+        mock_learn.backfill_history = AsyncMock(return_value=result_obj)
+        mock_learn.ingest_history = AsyncMock()
+
+        assert await service.handle_command(123, command) is True
+
+        mock_learn.backfill_history.assert_awaited_once_with(123, limit)
+        mock_learn.ingest_history.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_handle_commands_relatorio(service):
     with patch("backend.services.command.reporting_service") as mock_report:
@@ -45,8 +60,8 @@ async def test_handle_commands_relatorio(service):
 
 @pytest.mark.asyncio
 async def test_handle_commands_fatos_empty(service):
-    with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-        mock_thread.return_value = []
+    with patch("backend.services.command.repository") as mock_repo:
+        mock_repo.get_recent_facts = AsyncMock(return_value=[])
 
         result = await service.handle_command(123, "/fatos")
 
@@ -64,8 +79,8 @@ async def test_handle_commands_fatos_found(service):
         Fact(entity_name="Bob", value="Pizza", category="preference"),
     ]
 
-    with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-        mock_thread.return_value = facts
+    with patch("backend.services.command.repository") as mock_repo:
+        mock_repo.get_recent_facts = AsyncMock(return_value=facts)
 
         result = await service.handle_command(123, "/fatos")
 
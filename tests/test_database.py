@@ -1,5 +1,14 @@
+import sqlite3
 from unittest.mock import MagicMock, patch
-from backend.database import get_session, create_db_and_tables
+from sqlalchemy.exc import OperationalError
+from backend.database import (
+    get_session,
+    create_db_and_tables,
+    apply_sqlite_pragmas,
+    is_database_locked_error,
+    lock_contention,
+    get_db_stats,
+)
 
 
 def test_get_session():
@@ -16,3 +25,37 @@ def test_create_db_and_tables():
     with patch("backend.database.SQLModel.metadata.create_all") as mock_create:
         create_db_and_tables()
         mock_create.assert_called_once()
+
+
+def test_apply_sqlite_pragmas(tmp_path):
+    connection = sqlite3.connect(tmp_path / "test.db")
+    with patch("backend.database.settings") as mock_settings:
+        mock_settings.DB_JOURNAL_MODE = "WAL"
+        mock_settings.DB_SYNCHRONOUS = "NORMAL"
+        mock_settings.DB_BUSY_TIMEOUT_MS = 1234
+        mock_settings.DB_MMAP_SIZE = 1048576
+        mock_settings.DB_CACHE_SIZE_KB = 2048
+        apply_sqlite_pragmas(connection)
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    assert connection.execute("PRAGMA cache_size").fetchone()[0] == -2048
+    connection.close()
+
+
+def test_is_database_locked_error():
+    locked = sqlite3.OperationalError("database is locked")
+    assert is_database_locked_error(locked)
+    assert is_database_locked_error(OperationalError("INSERT", {}, locked))
+    assert not is_database_locked_error(sqlite3.OperationalError("no such table"))
+    assert not is_database_locked_error(ValueError("database is locked"))
+
+
+def test_lock_contention_counter_in_stats():
+    lock_contention.reset()
+    lock_contention.increment()
+    stats = get_db_stats()
+    assert stats["lock_contention_count"] == 1
+    assert "pool_size" in stats
+    lock_contention.reset()
@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select, text
+from backend.database import (
+    Message,
+    SQLITE_MAX_VARIABLES,
+    bulk_insert_messages,
+    message_insert_statements,
+    _migrate_message_indexes,
+    create_fts_tables,
+)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture():
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def make_row(telegram_message_id, chat_id=1, text="hello"):
+    return {
+        "telegram_message_id": telegram_message_id,
+        "chat_id": chat_id,
+        "sender_id": 10,
+        "sender_name": "Alice",
+        "text": text,
+        "date": datetime.now(timezone.utc),
+        "is_outgoing": False,
+    }
+
+
+def test_message_indexes_created(engine):
+    with engine.connect() as connection:
+        rows = connection.execute(text("PRAGMA index_list(message)")).all()
+    indexes = {row.name: row.unique for row in rows}
+    assert indexes["ix_message_chat_telegram_id"] == 1
+    assert "ix_message_chat_date" in indexes
+    assert "ix_message_date" in indexes
+
+
+def test_fact_tier_indexes_created(engine):
+    with engine.connect() as connection:
+        indexes = {row.name for row in connection.execute(text("PRAGMA index_list(fact)"))}
+    assert {"ix_fact_chat_category_created", "ix_fact_sender_category_created"} <= indexes
+
+
+def test_bulk_insert_ignores_duplicates(engine):
+    with Session(engine) as session:
+        inserted = bulk_insert_messages(session, [make_row(1), make_row(2)])
+        session.commit()
+        assert inserted == 2
+
+        # Same chat/message ids are skipped, same message id in another chat is kept
+        inserted = bulk_insert_messages(
+            session, [make_row(1, text="changed"), make_row(2), make_row(1, chat_id=2)]
+        )
+        session.commit()
+        assert inserted == 1
+
+        messages = session.exec(select(Message).order_by(Message.id)).all()
+        assert len(messages) == 3
+        assert messages[0].text == "hello"
+
+
+def test_bulk_insert_chunks_large_batches(engine):
+    rows = [make_row(i) for i in range(1200)]
+    for statement in message_insert_statements(rows):
+        assert len(statement.compile().params) <= SQLITE_MAX_VARIABLES
+    with Session(engine) as session:
+        assert bulk_insert_messages(session, rows) == 1200
+        session.commit()
+
+
+def test_migrate_message_indexes_deduplicates(engine):
+    with engine.connect() as connection:
+        connection.execute(text("DROP INDEX ix_message_chat_telegram_id"))
+        for _ in range(2):
+            connection.execute(
+                text(
+                    "INSERT INTO message (telegram_message_id, chat_id, text, is_outgoing, date) "
+                    "VALUES (5, 1, 'dup', 0, '2024-01-01')"
+                )
+            )
+        # Facts, links and jobs of both copies must survive on the kept row
+        connection.execute(
+            text(
+                "INSERT INTO fact (id, chat_id, entity_name, value, category, "
+                "source_message_id, created_at, mention_count) "
+                "VALUES (1, 1, 'Cidade', 'Recife', 'general', 2, '2024-01-01', 1)"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO fact_source (fact_id, message_id) VALUES (1, 1), (1, 2)")
+        )
+        connection.execute(
+            text(
+                "INSERT INTO extraction_job (message_id, chat_id, status, attempts, "
+                "facts_count, next_attempt_at, created_at, updated_at) VALUES "
+                "(2, 1, 'done', 1, 1, '2024-01-01', '2024-01-01', '2024-01-01')"
+            )
+        )
+        connection.commit()
+
+        _migrate_message_indexes(connection)
+
+        count = connection.execute(text("SELECT COUNT(*) FROM message")).scalar()
+        names = [row.name for row in connection.execute(text("PRAGMA index_list(message)"))]
+        source = connection.execute(text("SELECT source_message_id FROM fact")).scalar()
+        links = connection.execute(text("SELECT fact_id, message_id FROM fact_source")).all()
+        jobs = connection.execute(text("SELECT message_id FROM extraction_job")).all()
+    assert count == 1
+    assert "ix_message_chat_telegram_id" in names
+    assert source == 1
+    assert [tuple(link) for link in links] == [(1, 1)]
+    assert [tuple(job) for job in jobs] == [(1,)]
+
+
+def test_create_fts_tables_indexes_existing_rows(engine):
+    with Session(engine) as session:
+        bulk_insert_messages(session, [make_row(1, text="deploy na sexta")])
+        session.commit()
+
+    with engine.begin() as connection:
+        create_fts_tables(connection)
+        # Idempotent
+        create_fts_tables(connection)
+
+    with Session(engine) as session:
+        bulk_insert_messages(session, [make_row(2, text="sexta tem deploy de novo")])
+        session.commit()
+
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text("SELECT rowid FROM message_fts WHERE message_fts MATCH 'sexta' ORDER BY rowid")
+        ).all()
+    assert [row.rowid for row in rows] == [1, 2]
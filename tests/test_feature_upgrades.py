@@ -131,8 +131,9 @@ async def test_ai_service_extract_facts_robustness():
     ai = AIService()
     ai.client = MagicMock()
 
-    # Test None
-    assert await ai.extract_facts(None) == []
+    # Nothing to extract from
+    assert await ai.extract_facts_batch({}) == {}
 
-    # Test Short
-    assert await ai.extract_facts("Hi") == []
+    # No client configured
+    ai.client = None
+    assert await ai.extract_facts_batch({"1": "Hi"}) == {}
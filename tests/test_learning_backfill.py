@@ -1,5 +1,6 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
 from backend.services.learning import LearningService
 
 
@@ -52,3 +53,68 @@ async def test_ingest_history_no_force_rescan():
                 # Verify get_messages called with min_id=999 (the mocked return value)
                 mock_client.get_messages.assert_called_with("mock_entity", limit=50, min_id=999)
                 mock_get_last_id.assert_called_once_with(123)
+
+
+def make_history(ids):
+    messages = []
+    for i in ids:
+        m = MagicMock()
+        m.id = i
+        m.message = f"Mensagem numero {i} com texto suficiente"
+        m.sender_id = 7
+        m.out = False
+        m.date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        m.sender = None
+        messages.append(m)
+    return messages
+
+
+class FakeHistoryClient:
+    """Mimics client.iter_messages paging over an in-memory chat."""
+
+    def __init__(self, ids):
+        self.messages = make_history(ids)
+        self.get_entity = AsyncMock(return_value="entity")
+        self.calls = 0
+
+    async def iter_messages(self, entity, limit, offset_id=0, min_id=0, reverse=False):
+        self.calls += 1
+        if reverse:
+            selected = [m for m in self.messages if m.id > min_id]
+        else:
+            newest_first = sorted(self.messages, key=lambda m: m.id, reverse=True)
+            selected = [m for m in newest_first if not offset_id or m.id < offset_id]
+        for m in selected[:limit]:
+            yield m
+
+
+@pytest.mark.asyncio
+async def test_streaming_backfill_checkpoints_and_resumes(repo):
+    service = LearningService()
+    service.client = FakeHistoryClient(range(1, 451))
+
+    with (
+        patch("backend.services.learning.repository", repo),
+        patch("backend.services.learning.extraction_queue") as mock_queue,
+        patch("backend.services.learning.settings.BACKFILL_CHUNK_SIZE", 100),
+    ):
+        mock_queue.enqueue = AsyncMock(side_effect=lambda jobs: len(jobs))
+
+        # First run stops after 250 messages, as if interrupted
+        result = await service.backfill_history(123, limit=250)
+        assert result.messages_count == 250
+        checkpoint = await repo.get_backfill_checkpoint(123)
+        assert (checkpoint.oldest_id, checkpoint.newest_id) == (201, 450)
+        assert not checkpoint.reached_start
+
+        # New messages arrive; the next run catches up, then finishes the old history
+        service.client.messages += make_history(range(451, 461))
+        result = await service.backfill_history(123)
+        assert result.messages_count == 210
+        assert "Reached the start" in result.message
+
+    checkpoint = await repo.get_backfill_checkpoint(123)
+    assert (checkpoint.oldest_id, checkpoint.newest_id) == (1, 460)
+    assert checkpoint.reached_start
+    assert len(await repo.get_message_ids(123, list(range(1, 461)))) == 460
+    assert mock_queue.enqueue.await_count == 6  # One per non-empty chunk
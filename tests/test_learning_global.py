@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from backend.services.learning import LearningService, LearningResult
@@ -66,3 +67,36 @@ async def test_ingest_all_history():
         # Total chats = 2
         assert "Processed 2 chats" in result
         assert "Total new facts learned: 5" in result
+
+
+@pytest.mark.asyncio
+async def test_ingest_all_history_runs_dialogs_concurrently():
+    dialogs = []
+    for chat_id in (1, 2, 3):
+        dialog = MagicMock()
+        dialog.id = chat_id
+        dialog.is_channel = False
+        dialogs.append(dialog)
+
+    service = LearningService()
+    service.client = AsyncMock()
+    service.client.get_dialogs = AsyncMock(return_value=dialogs)
+
+    running = 0
+    max_running = 0
+
+    async def fake_ingest(chat_id, limit, force_rescan):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return LearningResult(messages_count=chat_id, facts_count=1, message="ok")
+
+    with patch.object(service, "ingest_history", side_effect=fake_ingest):
+        with patch("backend.services.learning.settings.INGEST_CONCURRENCY", 2):
+            result = await service.ingest_all_history(limit_dialogs=3)
+
+    assert max_running == 2
+    assert "Total new facts learned: 3" in result
+    assert service.ingest_progress[3] == {"status": "done", "messages": 3, "facts": 1}
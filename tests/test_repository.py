@@ -0,0 +1,253 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+
+def make_row(telegram_message_id, chat_id=1, minutes_ago=0, text="hello"):
+    return {
+        "telegram_message_id": telegram_message_id,
+        "chat_id": chat_id,
+        "sender_id": 10,
+        "sender_name": "Alice",
+        "text": text,
+        "date": datetime.now(timezone.utc) - timedelta(minutes=minutes_ago),
+        "is_outgoing": False,
+    }
+
+
+@pytest.mark.asyncio
+async def test_save_messages_and_last_synced_id(repo):
+    assert await repo.get_last_synced_id(1) is None
+
+    inserted = await repo.save_messages([make_row(1), make_row(5), make_row(3)])
+    assert inserted == 3
+    # Duplicates are ignored
+    assert await repo.save_messages([make_row(5), make_row(6)]) == 1
+    assert await repo.save_messages([]) == 0
+
+    assert await repo.get_last_synced_id(1) == 6
+
+
+@pytest.mark.asyncio
+async def test_save_message_returns_existing_id(repo):
+    first_id = await repo.save_message(make_row(42))
+    assert first_id is not None
+    assert await repo.save_message(make_row(42, text="again")) == first_id
+
+
+@pytest.mark.asyncio
+async def test_get_recent_history_is_chronological(repo):
+    await repo.save_messages([make_row(i, minutes_ago=10 - i) for i in range(10)])
+    await repo.save_messages([make_row(99, chat_id=2)])
+
+    history = await repo.get_recent_history(1, limit=3)
+    assert [m.telegram_message_id for m in history] == [7, 8, 9]
+
+
+@pytest.mark.asyncio
+async def test_messages_since(repo):
+    await repo.save_messages(
+        [make_row(1, minutes_ago=60 * 48), make_row(2, minutes_ago=5), make_row(3, chat_id=2)]
+    )
+    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
+
+    messages = await repo.messages_since(cutoff)
+    assert {m.telegram_message_id for m in messages} == {2, 3}
+
+    messages = await repo.messages_since(cutoff, chat_id=2)
+    assert [m.telegram_message_id for m in messages] == [3]
+
+
+@pytest.mark.asyncio
+async def test_save_facts_and_lookup(repo):
+    facts = [
+        {"entity_name": "Python", "value": "Likes Python", "category": "tech"},
+        {"entity_name": "Name", "value": "Alice"},
+    ]
+    rows = [{**f, "chat_id": 1, "sender_id": 10, "source_message_id": 7} for f in facts]
+    assert await repo.save_fact_rows(rows) == 2
+    assert await repo.message_ids_with_facts([7, 8]) == {7}
+    assert await repo.count_facts() == 2
+
+    recent = await repo.get_recent_facts(chat_id=99, sender_id=10)
+    assert {f.category for f in recent} == {"tech", "general"}
+
+
+@pytest.mark.asyncio
+async def test_save_messages_returning_ids(repo):
+    existing_id = await repo.save_message(make_row(1))
+
+    ids = await repo.save_messages_returning_ids(
+        [make_row(1), make_row(2), make_row(2, chat_id=3)]
+    )
+
+    assert ids[(1, 1)] == existing_id
+    assert len(set(ids.values())) == 3
+    assert await repo.save_messages_returning_ids([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_search_messages_fts(repo):
+    await repo.save_messages(
+        [
+            make_row(1, text="Reunião de planejamento amanhã"),
+            make_row(2, text="Eu programo em Python todo dia"),
+            make_row(3, chat_id=2, text="reuniao cancelada"),
+        ]
+    )
+
+    # Accent-insensitive, ranked, with snippets
+    results = await repo.search_messages("reuniao")
+    assert {r["telegram_message_id"] for r in results} == {1, 3}
+    assert any("[Reunião]" in r["snippet"] for r in results)
+
+    # Chat filter and prefix match on the last term
+    results = await repo.search_messages("pyth", chat_id=1)
+    assert [r["telegram_message_id"] for r in results] == [2]
+
+    # Date filter
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    assert await repo.search_messages("reuniao", since=future) == []
+
+    # FTS syntax in user input is neutralized
+    assert await repo.search_messages('"") OR *') == []
+
+
+@pytest.mark.asyncio
+async def test_search_facts_fts(repo):
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 1,
+                "sender_id": 10,
+                "source_message_id": 1,
+                "entity_name": "Linguagem",
+                "value": "Prefere Python",
+                "category": "tech",
+            },
+            {"chat_id": 2, "source_message_id": 2, "entity_name": "Comida", "value": "Pizza"},
+        ]
+    )
+
+    results = await repo.search_facts("python")
+    assert [r["entity"] for r in results] == ["Linguagem"]
+    assert await repo.search_facts("python", chat_id=2) == []
+    assert len(await repo.search_facts("pizza", chat_id=5, sender_id=None)) == 0
+
+
+@pytest.mark.asyncio
+async def test_message_ids_and_fact_lookup(repo):
+    ids = await repo.save_messages_returning_ids([make_row(1), make_row(2)])
+    mapping = await repo.get_message_ids(1, [1, 2, 3])
+    assert mapping == {1: ids[(1, 1)], 2: ids[(1, 2)]}
+
+    saved = await repo.save_fact_rows(
+        [{"chat_id": 1, "entity_name": "E", "value": "V", "source_message_id": mapping[2]}]
+    )
+    assert saved == 1
+    assert await repo.message_ids_with_facts(list(mapping.values())) == {mapping[2]}
+
+    # Other messages of the window the fact came from count as learned too
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 1,
+                "entity_name": "E2",
+                "value": "V2",
+                "source_message_id": mapping[2],
+                "source_message_ids": [mapping[1], mapping[2]],
+            }
+        ]
+    )
+    assert await repo.message_ids_with_facts(list(mapping.values())) == set(mapping.values())
+
+
+@pytest.mark.asyncio
+async def test_extraction_job_lifecycle(repo):
+    ids = await repo.save_messages_returning_ids([make_row(1), make_row(2)])
+    jobs = [{"message_id": db_id, "chat_id": 1, "sender_id": 10} for db_id in ids.values()]
+
+    assert await repo.enqueue_extraction_jobs(jobs) == 2
+    assert await repo.enqueue_extraction_jobs(jobs) == 0  # Already queued
+
+    claimed = await repo.claim_extraction_jobs(limit=10)
+    assert len(claimed) == 2
+    assert await repo.claim_extraction_jobs(limit=10) == []
+
+    first, second = claimed
+    fact = {"chat_id": 1, "entity_name": "E", "value": "V", "source_message_id": first.message_id}
+    await repo.complete_extraction_jobs({first.id: 1}, [fact])
+    assert await repo.message_ids_with_facts([first.message_id]) == {first.message_id}
+
+    # One attempt left before giving up
+    assert await repo.retry_extraction_jobs([second.id], "boom", 2, 0.0) == []
+    assert len(await repo.claim_extraction_jobs(limit=10)) == 1
+    assert await repo.retry_extraction_jobs([second.id], "boom", 2, 0.0) == [second.id]
+
+    assert await repo.count_extraction_jobs_by_status() == {"done": 1, "failed": 1}
+    statuses = await repo.get_extraction_job_statuses([first.message_id])
+    assert statuses == {first.message_id: "done"}
+
+
+@pytest.mark.asyncio
+async def test_reset_running_extraction_jobs(repo):
+    ids = await repo.save_messages_returning_ids([make_row(1)])
+    await repo.enqueue_extraction_jobs(
+        [{"message_id": ids[(1, 1)], "chat_id": 1, "sender_id": 10}]
+    )
+    await repo.claim_extraction_jobs(limit=1)
+
+    assert await repo.reset_running_extraction_jobs() == 1
+    assert await repo.count_extraction_jobs_by_status() == {"pending": 1}
+
+
+@pytest.mark.asyncio
+async def test_deleting_messages_retracts_their_facts(repo):
+    ids = await repo.save_messages_returning_ids([make_row(i) for i in (1, 2, 3)])
+    first, second, third = ids[(1, 1)], ids[(1, 2)], ids[(1, 3)]
+    await repo.save_fact_rows(
+        [
+            # Learned from a window of two messages
+            {
+                "chat_id": 1,
+                "entity_name": "Cidade",
+                "value": "Recife",
+                "source_message_id": second,
+                "source_message_ids": [first, second],
+            },
+            {"chat_id": 1, "entity_name": "Cidade", "value": "Lisboa", "source_message_id": third},
+        ]
+    )
+    recife, lisboa = await repo.get_facts_for_consolidation(chat_id=1)
+    await repo.apply_fact_consolidation([], {recife.id: lisboa.id})
+    await repo.enqueue_extraction_jobs([{"message_id": third, "chat_id": 1, "sender_id": 10}])
+
+    # Private chat deletions carry no chat ID
+    assert await repo.delete_messages(None, [2, 3]) == (2, 1)
+
+    [fact] = await repo.get_recent_facts(chat_id=1)
+    assert fact.value == "Recife"
+    assert fact.superseded_by is None  # The value that replaced it is gone
+    assert fact.source_message_id == first
+    assert await repo.get_fact_source_ids([fact.id]) == {fact.id: {first}}
+    assert await repo.count_extraction_jobs_by_status() == {}
+
+
+@pytest.mark.asyncio
+async def test_update_message_texts_only_reports_real_changes(repo):
+    ids = await repo.save_messages_returning_ids([make_row(1), make_row(2)])
+    await repo.enqueue_extraction_jobs(
+        [{"message_id": db_id, "chat_id": 1, "sender_id": 10} for db_id in ids.values()]
+    )
+
+    changed = await repo.update_message_texts(
+        [
+            {"chat_id": 1, "telegram_message_id": 1, "text": "Agora moro em Lisboa"},
+            {"chat_id": 1, "telegram_message_id": 2, "text": "  HELLO "},
+            {"chat_id": 1, "telegram_message_id": 99, "text": "never stored"},
+        ]
+    )
+
+    assert changed == {(1, 1): ids[(1, 1)]}
+    # The edited message can be queued again; the unchanged one keeps its job
+    assert await repo.get_extraction_job_statuses(list(ids.values())) == {ids[(1, 2)]: "pending"}
+    assert [r["id"] for r in await repo.search_messages("Lisboa")] == [ids[(1, 1)]]
@@ -86,3 +86,27 @@ async def test_main_exception(mock_client):
             await server._main()
 
         mock_logger.error.assert_called()
+
+
+@pytest.mark.asyncio
+async def test_main_drains_queues_on_cancellation(
+    mock_client, mock_learning_service, mock_reporting_service, mock_scheduler, mock_mcp
+):
+    mock_client.start = AsyncMock()
+    mock_learning_service.start_listening = AsyncMock()
+    mock_mcp.run_stdio_async = AsyncMock(side_effect=asyncio.CancelledError)
+    with (
+        patch("backend.server.create_db_and_tables"),
+        patch("backend.server.extraction_queue") as mock_queue,
+        patch("backend.server.message_writer") as mock_writer,
+        patch("backend.server.dispose_engines", new_callable=AsyncMock) as mock_dispose,
+    ):
+        mock_queue.stop = AsyncMock()
+        mock_writer.stop = AsyncMock(side_effect=RuntimeError("disk full"))
+        with pytest.raises(asyncio.CancelledError):
+            await server._main()
+
+    mock_queue.stop.assert_awaited_once()
+    mock_writer.stop.assert_awaited_once()
+    # A failing step does not skip the rest
+    mock_dispose.assert_awaited_once()
@@ -11,7 +11,9 @@ async def test_ai_service_extract_facts():
     mock_client = MagicMock()
     mock_response = MagicMock()
     # Return a clean JSON list
-    mock_response.text = '[{"entity": "Test", "value": "Value", "category": "test"}]'
+    mock_response.text = (
+        '[{"source": "1", "entity": "Test", "value": "Value", "category": "test"}]'
+    )
 
     # Mock the async chain: client.aio.models.generate_content
     mock_generate = AsyncMock(return_value=mock_response)
@@ -22,7 +24,9 @@ async def test_ai_service_extract_facts():
     ai_service.client = mock_client
 
     try:
-        facts = await ai_service.extract_facts("Some text longer than 10 chars")
+        facts = (await ai_service.extract_facts_batch({"1": "Some text longer than 10 chars"}))[
+            "1"
+        ]
         assert len(facts) == 1
         assert facts[0]["entity"] == "Test"
     finally:
@@ -34,7 +38,9 @@ async def test_ai_service_extract_facts_with_markdown():
     # Mock the client with markdown code blocks
     mock_client = MagicMock()
     mock_response = MagicMock()
-    mock_response.text = '```json\n[{"entity": "Test", "value": "Value", "category": "test"}]\n```'
+    mock_response.text = (
+        '```json\n[{"source": "1", "entity": "Test", "value": "Value", "category": "test"}]\n```'
+    )
 
     mock_generate = AsyncMock(return_value=mock_response)
     mock_client.aio.models.generate_content = mock_generate
@@ -43,7 +49,9 @@ async def test_ai_service_extract_facts_with_markdown():
     ai_service.client = mock_client
 
     try:
-        facts = await ai_service.extract_facts("Some text longer than 10 chars")
+        facts = (await ai_service.extract_facts_batch({"1": "Some text longer than 10 chars"}))[
+            "1"
+        ]
         assert len(facts) == 1
         assert facts[0]["entity"] == "Test"
     finally:
@@ -56,7 +64,7 @@ async def test_reporting_service_generate_daily_report():
     with (
         patch("backend.services.reporting.settings") as mock_settings,
         patch("backend.services.reporting.client", new_callable=AsyncMock) as mock_client,
-        patch("backend.services.reporting.Session") as mock_session_cls,
+        patch("backend.services.reporting.repository") as mock_repo,
         patch(
             "backend.services.ai.ai_service.summarize_conversations", new_callable=AsyncMock
         ) as mock_summarize,
@@ -65,10 +73,6 @@ async def test_reporting_service_generate_daily_report():
         mock_settings.REPORT_CHANNEL_ID = 123456
         mock_settings.REPORT_CONTEXT_LIMIT = 2000
 
-        # Mock fetch messages
-        mock_session = MagicMock()
-        mock_session_cls.return_value.__enter__.return_value = mock_session
-
         # Create fake messages
         mock_msg = MagicMock()
         mock_msg.chat_id = 1
@@ -76,7 +80,7 @@ async def test_reporting_service_generate_daily_report():
         mock_msg.sender_name = "Sender"
         mock_msg.text = "Hello"
 
-        mock_session.exec.return_value.all.return_value = [mock_msg]
+        mock_repo.messages_since = AsyncMock(return_value=[mock_msg])
 
         # Mock AI summary
         mock_summarize.return_value = "Daily Summary Content"
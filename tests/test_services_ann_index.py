@@ -0,0 +1,74 @@
+import numpy as np
+
+from backend.services.ann_index import IVFFlatIndex, benchmark, brute_force_top_k
+
+
+def unit_vectors(n, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_matches_brute_force_when_probing_every_list():
+    vectors = unit_vectors(2000)
+    index = IVFFlatIndex.build(vectors, n_lists=16)
+    query = vectors[7]
+
+    hits = index.search(vectors, query, k=5, nprobe=16)
+
+    assert [row for row, _ in hits] == brute_force_top_k(vectors, query, 5).tolist()
+    assert hits[0][0] == 7
+
+
+def test_incremental_inserts_and_tombstones():
+    vectors = unit_vectors(600)
+    index = IVFFlatIndex.build(vectors[:500], n_lists=16)
+    index.add(np.arange(500, 600), vectors[500:])
+    assert index.search(vectors, vectors[550], k=1, nprobe=16)[0][0] == 550
+
+    index.remove([550])
+    assert 550 not in [row for row, _ in index.search(vectors, vectors[550], k=5, nprobe=16)]
+    assert index.stats()["indexed_rows"] == 600
+
+
+def test_masked_search_widens_the_probe_for_sparse_subsets():
+    vectors = unit_vectors(4000)
+    index = IVFFlatIndex.build(vectors, n_lists=32)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::400] = True  # One "chat" owning 10 rows scattered over the cells
+    query = vectors[1]
+
+    assert len(index.search(vectors, query, k=5, nprobe=1, mask=mask)) < 5
+    hits = index.search_until(vectors, query, k=5, nprobe=1, mask=mask)
+
+    assert len(hits) == 5
+    assert all(mask[row] for row, _ in hits)
+    subset = np.flatnonzero(mask)
+    assert hits[0][0] == subset[brute_force_top_k(vectors[subset], query, 1)][0]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = unit_vectors(500)
+    index = IVFFlatIndex.build(vectors, n_lists=16)
+    index.remove([3])
+    path = str(tmp_path / "facts.ivf.npz")
+    index.save(path)
+
+    loaded = IVFFlatIndex.load(path)
+
+    assert loaded.n_lists == 16
+    assert loaded.indexed_rows == 500
+    assert loaded.search(vectors, vectors[10], k=3, nprobe=16) == index.search(
+        vectors, vectors[10], k=3, nprobe=16
+    )
+    assert 3 not in [row for row, _ in loaded.search(vectors, vectors[3], k=5, nprobe=16)]
+    assert IVFFlatIndex.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_benchmark_reports_recall_against_brute_force():
+    results = benchmark(n_rows=5000, dim=16, queries=10, nprobes=(1, 70))
+    assert results[0]["method"] == "brute_force"
+    assert results[2]["recall"] == 1.0  # Probing every list is exact
+    scoped = [r for r in results if r["method"] == "ivf_scoped"]
+    assert [r["nprobe"] for r in scoped] == [1, 70]
+    assert scoped[-1]["recall"] == 1.0
+    assert results[1]["latency_ms"] >= 0
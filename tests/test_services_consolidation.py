@@ -0,0 +1,125 @@
+import pytest
+from datetime import datetime, timedelta
+
+from backend.services.consolidation import FactConsolidationService, normalize_key
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def fact_row(entity, value, minutes, source, chat_id=1, sender_id=10):
+    return {
+        "chat_id": chat_id,
+        "sender_id": sender_id,
+        "entity_name": entity,
+        "value": value,
+        "category": "preference",
+        "source_message_id": source,
+        "created_at": START + timedelta(minutes=minutes),
+    }
+
+
+def test_normalize_key():
+    assert normalize_key("  Linguagem Favorita! ") == "linguagem favorita"
+    assert normalize_key("Café_com-leite") == "cafe com leite"
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_merged_into_newest_row(repo):
+    await repo.save_fact_rows(
+        [
+            fact_row("Linguagem favorita", "Prefere Python", 0, source=1),
+            fact_row("linguagem  favorita", "prefere python!", 5, source=2),
+            fact_row("Linguagem favorita", "Prefere Python", 10, source=3),
+            fact_row("Cidade", "Mora em Recife", 1, source=4),
+        ]
+    )
+    service = FactConsolidationService(repository=repo)
+
+    report = await service.consolidate()
+
+    assert report.facts_scanned == 4
+    assert report.clusters == 2
+    assert report.rows_reclaimed == 2
+    assert report.superseded == 0
+    facts = await repo.get_recent_facts(chat_id=1, sender_id=10)
+    assert len(facts) == 2
+    merged = next(f for f in facts if f.entity_name == "Linguagem favorita")
+    assert merged.mention_count == 3
+    assert merged.source_message_id == 3
+    assert merged.first_seen_at == START
+    assert await repo.get_fact_source_ids([merged.id]) == {merged.id: {1, 2, 3}}
+
+    # Already consolidated: nothing left to do
+    again = await service.consolidate()
+    assert again.rows_reclaimed == 0
+    assert again.superseded == 0
+    assert service.stats()["rows_reclaimed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_contradicted_values_are_superseded(repo):
+    await repo.save_fact_rows(
+        [
+            fact_row("Cidade", "Mora em Recife", 0, source=1),
+            fact_row("Cidade", "Mora em Lisboa", 10, source=2),
+            fact_row("Cidade", "Mora em Recife", 0, source=3, chat_id=2, sender_id=20),
+        ]
+    )
+
+    report = await FactConsolidationService(repository=repo).consolidate()
+
+    assert report.superseded == 1
+    [current] = await repo.get_recent_facts(chat_id=1, sender_id=10)
+    assert current.value == "Mora em Lisboa"
+    [old] = [f for f in await repo.get_facts_for_consolidation(chat_id=1) if f.id != current.id]
+    assert old.superseded_by == current.id
+    # Another sender's facts are clustered separately
+    other = await repo.get_facts_for_context(chat_id=2, sender_id=20)
+    assert [f.value for f in other] == ["Mora em Recife"]
+
+
+@pytest.mark.asyncio
+async def test_multi_valued_facts_coexist_unless_contradicted(repo):
+    await repo.save_fact_rows(
+        [
+            fact_row("Comida", "Gosta de pizza", 0, source=1),
+            fact_row("Comida", "Gosta de sushi", 5, source=2),
+            fact_row("Pets", "Tem um gato", 6, source=3),
+            fact_row("Pets", "Tem um cachorro", 7, source=4),
+            fact_row("Comida", "Não gosta de pizza", 10, source=5),
+        ]
+    )
+
+    report = await FactConsolidationService(repository=repo).consolidate()
+
+    assert report.rows_reclaimed == 0  # "Não gosta" is a contradiction, not a duplicate
+    assert report.superseded == 1
+    current = await repo.get_recent_facts(chat_id=1, sender_id=10)
+    assert sorted(f.value for f in current) == [
+        "Gosta de sushi",
+        "Não gosta de pizza",
+        "Tem um cachorro",
+        "Tem um gato",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_scheduled_runs_only_revisit_changed_scopes(repo):
+    await repo.save_fact_rows(
+        [
+            fact_row("Cidade", "Mora em Recife", 0, source=1),
+            fact_row("Cidade", "Mora em Recife", 1, source=2, chat_id=2, sender_id=20),
+        ]
+    )
+    service = FactConsolidationService(repository=repo)
+    await service.run_scheduled()
+    assert service.last_report.scopes == 2
+
+    await repo.save_fact_rows([fact_row("Cidade", "Mora em Lisboa", 10, source=3)])
+    await service.run_scheduled()
+
+    assert service.last_report.scopes == 1
+    assert service.last_report.facts_scanned == 2
+    assert service.last_report.superseded == 1
+    await service.run_scheduled()
+    assert service.last_report.facts_scanned == 0
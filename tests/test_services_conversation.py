@@ -1,6 +1,8 @@
+import asyncio
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from backend.services.conversation import ConversationService
+from backend.settings import settings
 from telethon.tl.types import User
 
 
@@ -92,3 +94,109 @@ async def test_generate_and_send_reply(service):
             chat_id, user_message, "TestUser", None
         )
         service.client.send_message.assert_called_once_with(chat_id, "Hello there", reply_to=None)
+
+
+@pytest.mark.asyncio
+async def test_reply_delay_overlaps_generation(service):
+    async def slow_generation(*args):
+        await real_sleep(0.05)
+        return "Hello there"
+
+    real_sleep = asyncio.sleep
+    service.client.action.return_value = AsyncMock()
+    service.client.send_message = AsyncMock()
+    with (
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch.object(ConversationService, "_reading_delay", return_value=0.5),
+        patch.object(ConversationService, "_typing_delay", return_value=0.3),
+        patch("backend.services.conversation.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        mock_ai.generate_natural_response = slow_generation
+        await service._generate_and_send_reply(123, "Hi", "TestUser")
+
+    # Only the part of the 0.8s target not spent generating is slept
+    [slept] = [call.args[0] for call in mock_sleep.await_args_list]
+    assert 0.6 < slept < 0.76
+    timing = service.stats()["last"]
+    assert timing["target_seconds"] == 0.8
+    assert timing["generation_seconds"] >= 0.05
+    assert timing["slack_seconds"] == pytest.approx(0.8 - timing["generation_seconds"])
+
+
+@pytest.mark.asyncio
+async def test_streamed_reply_waits_for_reading_delay(service):
+    async def chunks(*args):
+        yield "Pronto. "
+        yield "Feito."
+
+    service.client.action.return_value = AsyncMock()
+    service.client.send_message = AsyncMock()
+    service.client.edit_message = AsyncMock()
+    with (
+        patch.object(settings, "CONVERSATION_STREAMING_ENABLED", True),
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch.object(ConversationService, "_reading_delay", return_value=30),
+        patch("backend.services.reply_stream.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        mock_ai.stream_natural_response = chunks
+        await service._generate_and_send_reply(123, "Hi", "TestUser")
+
+    # The whole stream arrived during the reading delay: one message, sent after it
+    service.client.send_message.assert_awaited_once_with(123, "Pronto. Feito.", reply_to=None)
+    assert mock_sleep.await_args.args[0] > 29
+    assert service.stats()["late_replies"] == 0
+
+
+@pytest.mark.asyncio
+async def test_burst_is_answered_once(service):
+    service.client.action.return_value = AsyncMock()
+    service.client.send_message = AsyncMock()
+    with (
+        patch.object(settings, "CONVERSATION_DEBOUNCE_SECONDS", 0.05),
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch.object(ConversationService, "_reading_delay", return_value=0),
+        patch.object(ConversationService, "_typing_delay", return_value=0),
+    ):
+        mock_ai.generate_natural_response = AsyncMock(return_value="Oi!")
+        for msg_id, text in enumerate(["oi", "tudo bem?", "saudades"], start=1):
+            service._schedule_reply(123, text, "TestUser", 456, msg_id)
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*[turn.task for turn in service._turns.values()])
+
+    mock_ai.generate_natural_response.assert_awaited_once_with(
+        123, "oi\ntudo bem?\nsaudades", "TestUser", 456
+    )
+    service.client.send_message.assert_awaited_once_with(123, "Oi!", reply_to=3)
+    stats = service.stats()
+    assert stats["coalesced_messages"] == 2
+    assert stats["pending_turns"] == 0
+
+
+@pytest.mark.asyncio
+async def test_new_message_restarts_inflight_generation(service):
+    started = asyncio.Event()
+    prompts = []
+
+    async def generation(chat_id, text, *args):
+        prompts.append(text)
+        started.set()
+        await asyncio.sleep(0.2 if len(prompts) == 1 else 0)
+        return f"re: {text}"
+
+    service.client.action.return_value = AsyncMock()
+    service.client.send_message = AsyncMock()
+    with (
+        patch.object(settings, "CONVERSATION_DEBOUNCE_SECONDS", 0.01),
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch.object(ConversationService, "_reading_delay", return_value=0),
+        patch.object(ConversationService, "_typing_delay", return_value=0),
+    ):
+        mock_ai.generate_natural_response = generation
+        service._schedule_reply(123, "oi", "TestUser", 456, 1)
+        await started.wait()
+        service._schedule_reply(123, "cadê você?", "TestUser", 456, 2)
+        await service._turns[(123, 456)].task
+
+    assert prompts == ["oi", "oi\ncadê você?"]
+    service.client.send_message.assert_awaited_once_with(123, "re: oi\ncadê você?", reply_to=2)
+    assert service.stats()["cancelled_generations"] == 1
@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import AIService
+from backend.services.embeddings import EmbeddingStore, HashingEmbedder, SemanticFactRetriever
+from backend.settings import settings
+
+
+@pytest.fixture
+def semantic_enabled():
+    with patch.object(settings, "SEMANTIC_RETRIEVAL_ENABLED", True):
+        yield
+
+
+def test_hashing_embedder_is_normalized_and_similarity_aware():
+    embedder = HashingEmbedder(dim=256)
+    vectors = embedder.embed(
+        ["Projeto: bug no React em produção", "o bug do react voltou", "Gosta de café", ""]
+    )
+
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0, atol=1e-5)
+    assert not vectors[3].any()
+    assert vectors[1] @ vectors[0] > vectors[1] @ vectors[2]
+
+
+def test_store_persists_and_grows(tmp_path):
+    embedder = HashingEmbedder(dim=32)
+    path = str(tmp_path / "facts")
+    store = EmbeddingStore(path, embedder.dim, embedder.signature)
+    ids = list(range(1, 1501))  # Past the initial capacity
+    store.add(ids, embedder.embed([f"fact number {i}" for i in ids]))
+
+    reopened = EmbeddingStore(path, embedder.dim, embedder.signature)
+    assert len(reopened) == 1500
+    query = embedder.embed(["fact number 42"])[0]
+    [(best, score)] = reopened.top_k(query, 1, candidate_ids=[42, 43, 9999])
+    assert best == 42
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+    # A different embedder invalidates the stored vectors
+    assert len(EmbeddingStore(path, embedder.dim, "other-embedder")) == 0
+
+
+@pytest.mark.asyncio
+async def test_search_syncs_missing_facts_in_background_and_ranks(
+    repo, tmp_path, semantic_enabled
+):
+    await repo.save_fact_rows(
+        [
+            {**fact, "chat_id": 1, "sender_id": 10, "source_message_id": 1}
+            for fact in [
+                {"entity_name": "Trabalho", "value": "Corrigindo um bug no React do checkout"},
+                {"entity_name": "Bebida", "value": "Prefere café sem açúcar"},
+                {"entity_name": "Pet", "value": "Tem um gato chamado Miau"},
+            ]
+        ]
+    )
+    retriever = SemanticFactRetriever(repository=repo, path=str(tmp_path / "facts"))
+
+    # Nothing embedded yet: the search itself stays cheap and starts a sync
+    assert await retriever.search(1, 10, "e aquele bug do react?", k=2) == []
+    await retriever._sync_task
+    assert retriever.stats()["facts_embedded"] == 3
+    assert retriever.store.max_fact_id == 3
+
+    facts = await retriever.search(1, 10, "e aquele bug do react?", k=2)
+    assert facts[0].entity_name == "Trabalho"
+    await retriever.search(1, 10, "gato", k=1)
+    assert retriever._sync_task.done()
+    assert retriever.stats()["facts_embedded"] == 3  # Already stored
+
+
+@pytest.mark.asyncio
+async def test_get_context_blends_semantic_hits_first():
+    service = AIService()
+    tiered = [MagicMock(id=i) for i in range(1, 5)]
+    relevant = [MagicMock(id=3), MagicMock(id=9)]
+    service.fact_retriever = MagicMock()
+    service.fact_retriever.search = AsyncMock(return_value=relevant)
+
+    with (
+        patch("backend.services.ai.repository") as mock_repo,
+        patch("backend.services.ai.settings") as mock_settings,
+    ):
+        mock_settings.AI_CONTEXT_FACT_LIMIT = 4
+        mock_repo.get_recent_history = AsyncMock(return_value=[])
+        mock_repo.get_facts_for_context = AsyncMock(return_value=tiered)
+        _, facts = await service._get_context(1, 10, query="react bug")
+
+    assert [f.id for f in facts] == [3, 9, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_sync_rebuild_and_ann_search(repo, tmp_path, semantic_enabled):
+    facts = [
+        {"entity_name": "Trabalho", "value": "Corrigindo um bug no React do checkout"},
+        {"entity_name": "Bebida", "value": "Prefere café sem açúcar"},
+        {"entity_name": "Pet", "value": "Tem um gato chamado Miau"},
+        {"entity_name": "Cidade", "value": "Mora em Recife"},
+    ]
+    await repo.save_fact_rows(
+        [{**fact, "chat_id": 1, "sender_id": 10, "source_message_id": 1} for fact in facts]
+    )
+    retriever = SemanticFactRetriever(repository=repo, path=str(tmp_path / "facts"))
+
+    with patch.object(settings, "ANN_MIN_ROWS", 3), patch.object(settings, "ANN_NPROBE", 1):
+        # Crossing ANN_MIN_ROWS trains and persists the index in the background
+        assert await retriever.sync() == 4
+        await retriever._rebuild_task
+        assert (tmp_path / "facts.ivf.npz").exists()
+        assert await retriever.sync() == 0
+
+        [fact] = await retriever.search(1, 10, "bug react", k=1)
+        assert fact.entity_name == "Trabalho"
+        assert retriever.stats()["ann_searches"] == 1
+
+        # A new retriever picks up the persisted vectors and index
+        reopened = SemanticFactRetriever(repository=repo, path=str(tmp_path / "facts"))
+        assert reopened.index.stats()["indexed_rows"] == 4
+        report = await reopened.rebuild()
+        assert report["facts"] == 4
+
+
+@pytest.mark.asyncio
+async def test_scope_is_cached_and_deleted_facts_are_never_returned(
+    repo, tmp_path, semantic_enabled
+):
+    ids = await repo.save_messages_returning_ids(
+        [
+            {
+                "telegram_message_id": 7,
+                "chat_id": 1,
+                "sender_id": 10,
+                "sender_name": "Ana",
+                "text": "Tenho um gato chamado Miau",
+                "date": datetime.now(timezone.utc),
+                "is_outgoing": False,
+            }
+        ]
+    )
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 1,
+                "sender_id": 10,
+                "source_message_id": ids[(1, 7)],
+                "entity_name": "Pet",
+                "value": "Tem um gato chamado Miau",
+            }
+        ]
+    )
+    retriever = SemanticFactRetriever(repository=repo, path=str(tmp_path / "facts"))
+    await retriever.sync()
+    [fact] = await retriever.search(1, 10, "gato")
+
+    # Unchanged scope: served from the fact cache without touching the database
+    with patch.object(repo, "get_current_facts", AsyncMock(side_effect=AssertionError)):
+        assert [f.id for f in await retriever.search(1, 10, "gato")] == [fact.id]
+
+    await repo.delete_messages(1, [7])
+    assert await retriever.search(1, 10, "gato") == []
@@ -1,4 +1,3 @@
-import asyncio
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from backend.services.learning import LearningService
@@ -31,37 +30,26 @@ async def test_learning_service_ingest_history_batch_processing():
     service.client = mock_client
 
     # Mock internal methods
-    with patch.object(service, "_save_message_to_db", return_value=1):
-        with patch.object(service, "_analyze_and_extract", new_callable=AsyncMock) as mock_analyze:
-            # Mock DB check for last synced ID to avoid SQL error
-            service._get_last_synced_id = MagicMock(return_value=0)
+    with patch("backend.services.learning.repository") as mock_repo:
+        mock_repo.save_messages = AsyncMock(side_effect=lambda rows: len(rows))
+        # Mock DB check for last synced ID
+        mock_repo.get_last_synced_id = AsyncMock(return_value=None)
+        mock_repo.get_message_ids = AsyncMock(return_value={i: 100 + i for i in range(10)})
+        # Message 0 was already learned from
+        mock_repo.message_ids_with_facts = AsyncMock(return_value={100})
 
-            # Use MagicMock with a Future return value for asyncio.to_thread
-            # to avoid AsyncMock warning complexities.
-            with patch("asyncio.to_thread") as mock_to_thread:
-                f = asyncio.Future()
-                f.set_result(1)
-                mock_to_thread.return_value = f
+        with patch("backend.services.learning.extraction_queue") as mock_queue:
+            mock_queue.enqueue_and_wait = AsyncMock(return_value=1)
+            result_msg = await service.ingest_history(chat_id=123, limit=10)
 
-                # Handling side_effect if called multiple times or with different args?
-                # The test calls it 10 times. A single future might be reused if not careful,
-                # but awaiting a completed future multiple times is allowed.
-                # Ideally, side_effect should return a NEW future each time.
+            assert "Ingested 10 new messages" in result_msg.message
+            assert "Learned 1 new facts" in result_msg.message
 
-                def to_thread_side_effect(func, *args, **kwargs):
-                    f = asyncio.Future()
-                    f.set_result(1)
-                    return f
-
-                mock_to_thread.side_effect = to_thread_side_effect
-
-                # We also need to patch asyncio.sleep to avoid waiting
-                with patch("asyncio.sleep", new_callable=AsyncMock):
-                    result_msg = await service.ingest_history(chat_id=123, limit=10)
-
-                    assert "Ingested 10 new messages" in result_msg.message
-                    # Check if analyze was called for all 10 messages
-                    assert mock_analyze.call_count == 10
+            # The 9 pending messages are queued as extraction jobs in one call
+            mock_queue.enqueue_and_wait.assert_awaited_once()
+            jobs = mock_queue.enqueue_and_wait.call_args.args[0]
+            assert {job["message_id"] for job in jobs} == {100 + i for i in range(1, 10)}
+            assert all(job["chat_id"] == 123 and job["sender_id"] == 123 for job in jobs)
 
 
 # --- Reporting Service Tests ---
@@ -91,9 +79,8 @@ async def test_reporting_service_grouping_logic():
     messages = [msg1, msg2, msg3]
 
     # Mock fetch_messages
-    with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-        # First call is fetch_messages, returns our list
-        mock_thread.return_value = messages
+    with patch("backend.services.reporting.repository") as mock_repo:
+        mock_repo.messages_since = AsyncMock(return_value=messages)
 
         # Mock client.get_entity to return titles
         entity1 = MagicMock()
@@ -0,0 +1,133 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import AIService
+from backend.services.extraction_cache import ExtractionCache, normalize_text
+from backend.services.extraction_queue import ExtractionQueue
+from backend.settings import settings
+
+
+@pytest.fixture
+def cache_enabled():
+    with patch.object(settings, "EXTRACTION_CACHE_ENABLED", True):
+        yield
+
+
+@pytest.fixture
+def service(repo, cache_enabled):
+    with patch("backend.services.ai.genai.Client"):
+        service = AIService()
+    service.client = MagicMock()
+    service.client.aio.models.generate_content = AsyncMock()
+    service.extraction_cache = ExtractionCache(repository=repo)
+    return service
+
+
+def llm_returns(service, facts):
+    response = MagicMock()
+    response.text = json.dumps(facts)
+    service.client.aio.models.generate_content.return_value = response
+
+
+async def claim(repo, message_id, chat_id, sender_id):
+    await repo.enqueue_extraction_jobs(
+        [{"message_id": message_id, "chat_id": chat_id, "sender_id": sender_id}]
+    )
+    return await repo.claim_extraction_jobs(limit=1)
+
+
+def test_normalize_text():
+    assert normalize_text("  Eu  ODEIO\nJava ") == normalize_text("eu odeio java")
+
+
+@pytest.mark.asyncio
+async def test_batch_hits_skip_the_llm(service):
+    fact = {"entity": "Java", "value": "Odeia", "category": "preference", "lines": [1]}
+    llm_returns(service, [{**fact, "source": "1"}])
+    await service.extract_facts_batch({"1": "Eu odeio Java", "2": "Bom dia pessoal"})
+
+    # Same texts forwarded elsewhere: served from cache, no LLM call
+    service.client.aio.models.generate_content.reset_mock()
+    result = await service.extract_facts_batch({"a": "eu  odeio JAVA", "b": "Bom dia pessoal"})
+
+    service.client.aio.models.generate_content.assert_not_awaited()
+    assert result == {"a": [fact]}
+    stats = service.extraction_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_only_misses_are_sent_to_the_llm(service):
+    llm_returns(service, [])
+    await service.extract_facts_batch({"1": "Bom dia pessoal"})
+
+    llm_returns(service, [{"entity": "Cidade", "value": "Lisboa", "source": "2"}])
+    result = await service.extract_facts_batch({"1": "Bom dia pessoal", "2": "Moro em Lisboa"})
+
+    prompt = service.client.aio.models.generate_content.call_args.kwargs["contents"]
+    assert "Moro em Lisboa" in prompt
+    assert "Bom dia pessoal" not in prompt
+    assert list(result) == ["2"]
+
+
+@pytest.mark.asyncio
+async def test_unparseable_responses_are_not_cached(service):
+    response = MagicMock()
+    response.text = "not json"
+    service.client.aio.models.generate_content.return_value = response
+
+    with pytest.raises(ValueError):
+        await service.extract_facts_batch({"1": "Eu trabalho no Nubank"})
+    assert await service.extraction_cache.get_many({"1": "Eu trabalho no Nubank"}) == {}
+
+
+@pytest.mark.asyncio
+async def test_eviction_and_version(repo, cache_enabled):
+    cache = ExtractionCache(repository=repo)
+    texts = {"1": "primeiro texto", "2": "segundo texto", "3": "terceiro texto"}
+    with patch.object(settings, "EXTRACTION_CACHE_MAX_ENTRIES", 2):
+        await cache.put_many({"1": []}, texts)
+        await cache.put_many({"2": []}, texts)
+        await cache.get_many({"1": texts["1"]})  # Refresh: "segundo" is now least recently used
+        await cache.put_many({"3": []}, texts)
+
+    assert await repo.count_cached_extractions() == 2
+    assert cache.stats()["evicted"] == 1
+    assert await cache.get_many(texts) == {"1": [], "3": []}
+
+    # A new prompt/model version never sees old entries
+    other = ExtractionCache(repository=repo)
+    other.version = "other-version"
+    assert await other.get_many(texts) == {}
+
+
+@pytest.mark.asyncio
+async def test_windows_are_keyed_on_content_not_speakers(repo, service):
+    rows = [
+        {
+            "telegram_message_id": i,
+            "chat_id": chat_id,
+            "sender_id": sender_id,
+            "sender_name": name,
+            "text": "Eu trabalho no Nubank",
+            "date": datetime.now(timezone.utc),
+            "is_outgoing": False,
+        }
+        for i, (chat_id, sender_id, name) in enumerate([(1, 10, "Alice"), (2, 20, "Bob")])
+    ]
+    ids = await repo.save_messages_returning_ids(rows)
+    fact = {"entity": "Nubank", "value": "Trabalha", "category": "work", "lines": [1]}
+    llm_returns(service, [{**fact, "source": "w0"}])
+
+    queue = ExtractionQueue(repository=repo, workers=1)
+    with patch("backend.services.extraction_queue.ai_service", service):
+        for (chat_id, sender_id), db_id in zip([(1, 10), (2, 20)], ids.values()):
+            await queue._process(await claim(repo, db_id, chat_id, sender_id))
+
+    # Bob forwarding Alice's message is served from the cache under his own name
+    service.client.aio.models.generate_content.assert_awaited_once()
+    assert await repo.message_ids_with_facts(list(ids.values())) == set(ids.values())
@@ -0,0 +1,193 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import AIService
+from backend.services.extraction_queue import ExtractionQueue
+
+
+def make_row(telegram_message_id, chat_id=1):
+    return {
+        "telegram_message_id": telegram_message_id,
+        "chat_id": chat_id,
+        "sender_id": 10,
+        "sender_name": "Alice",
+        "text": f"message {telegram_message_id}",
+        "date": datetime.now(timezone.utc),
+        "is_outgoing": False,
+    }
+
+
+async def seed_jobs(repo, count):
+    ids = await repo.save_messages_returning_ids([make_row(i) for i in range(count)])
+    return [{"message_id": db_id, "chat_id": 1, "sender_id": 10} for db_id in ids.values()]
+
+
+@pytest.fixture
+def fast_settings():
+    with patch("backend.services.extraction_queue.settings") as mock_settings:
+        mock_settings.LEARNING_BATCH_TOKEN_BUDGET = 3000
+        mock_settings.LEARNING_BATCH_MAX_MESSAGES = 40
+        mock_settings.LEARNING_DELAY = 0
+        mock_settings.EXTRACTION_MAX_ATTEMPTS = 2
+        mock_settings.EXTRACTION_RETRY_BASE_DELAY = 0
+        mock_settings.EXTRACTION_POLL_INTERVAL = 0.01
+        mock_settings.LEARNING_WINDOW_MAX_GAP_SECONDS = 300
+        yield mock_settings
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_batched_and_facts_saved(repo, fast_settings):
+    jobs = await seed_jobs(repo, 3)
+    target = jobs[1]["message_id"]
+
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.pack_by_token_budget = AIService.pack_by_token_budget
+        mock_ai.extract_facts_batch = AsyncMock(
+            return_value={"w0": [{"entity": "E", "value": "V", "category": "tech", "lines": [2]}]}
+        )
+        queue = ExtractionQueue(repository=repo, workers=1)
+        facts = await queue.enqueue_and_wait(jobs)
+        await queue.stop()
+
+    assert facts == 1
+    mock_ai.extract_facts_batch.assert_awaited_once()
+    assert await repo.message_ids_with_facts([target]) == {target}
+    assert await repo.count_extraction_jobs_by_status() == {"done": 3}
+    assert queue.stats()["jobs_completed"] == 3
+    assert queue.stats()["facts_extracted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_calls_are_retried_then_given_up(repo, fast_settings):
+    jobs = await seed_jobs(repo, 1)
+
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.pack_by_token_budget = AIService.pack_by_token_budget
+        mock_ai.extract_facts_batch = AsyncMock(side_effect=Exception("429 RESOURCE_EXHAUSTED"))
+        queue = ExtractionQueue(repository=repo, workers=1)
+        facts = await queue.enqueue_and_wait(jobs)
+        await queue.stop()
+
+    assert facts == 0
+    assert mock_ai.extract_facts_batch.await_count == 2
+    assert await repo.count_extraction_jobs_by_status() == {"failed": 1}
+    assert queue.stats()["jobs_failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_malformed_response_leaves_job_retryable(repo, fast_settings):
+    fast_settings.EXTRACTION_MAX_ATTEMPTS = 3
+    fast_settings.EXTRACTION_RETRY_BASE_DELAY = 60
+    jobs = await seed_jobs(repo, 1)
+    await repo.enqueue_extraction_jobs(jobs)
+    claimed = await repo.claim_extraction_jobs(limit=1)
+
+    with patch("backend.services.ai.genai.Client"):
+        service = AIService()
+    service.client = MagicMock()
+    service.client.aio.models.generate_content = AsyncMock(
+        return_value=MagicMock(text="Desculpe, não entendi.")
+    )
+    with patch("backend.services.extraction_queue.ai_service", service):
+        await ExtractionQueue(repository=repo, workers=1)._process(claimed)
+
+    assert await repo.count_extraction_jobs_by_status() == {"pending": 1}
+    assert await repo.message_ids_with_facts([jobs[0]["message_id"]]) == set()
+
+
+@pytest.mark.asyncio
+async def test_already_finished_jobs_do_not_block(repo, fast_settings):
+    jobs = await seed_jobs(repo, 1)
+    await repo.enqueue_extraction_jobs(jobs)
+    [job] = await repo.claim_extraction_jobs(limit=1)
+    await repo.complete_extraction_jobs({job.id: 0})
+
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.extract_facts_batch = AsyncMock()
+        queue = ExtractionQueue(repository=repo, workers=1)
+        assert await queue.enqueue_and_wait(jobs) == 0
+        await queue.stop()
+
+    mock_ai.extract_facts_batch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_start_recovers_interrupted_jobs(repo, fast_settings):
+    jobs = await seed_jobs(repo, 2)
+    await repo.enqueue_extraction_jobs(jobs)
+    await repo.claim_extraction_jobs(limit=2)  # Simulates a crash mid-extraction
+
+    queue = ExtractionQueue(repository=repo, workers=1)
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.pack_by_token_budget = AIService.pack_by_token_budget
+        mock_ai.extract_facts_batch = AsyncMock(return_value={})
+        assert await queue.enqueue_and_wait(jobs) == 0
+        await queue.stop()
+
+    assert queue.stats()["recovered_jobs"] == 2
+    assert await repo.count_extraction_jobs_by_status() == {"done": 2}
+
+
+@pytest.mark.asyncio
+async def test_window_facts_link_every_source_message(repo, fast_settings):
+    rows = [make_row(i) for i in range(3)]
+    rows[1]["sender_id"] = 20
+    ids = list((await repo.save_messages_returning_ids(rows)).values())
+    # The first message was filtered out locally; it still gives the window context
+    jobs = [{"message_id": db_id, "chat_id": 1, "sender_id": 10} for db_id in ids[1:]]
+
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.pack_by_token_budget = AIService.pack_by_token_budget
+        mock_ai.extract_facts_batch = AsyncMock(
+            return_value={
+                "w0": [
+                    {
+                        "entity": "Alice",
+                        "value": "likes tea",
+                        "category": "preference",
+                        "lines": [1, 3],
+                    }
+                ]
+            }
+        )
+        queue = ExtractionQueue(repository=repo, workers=1)
+        facts = await queue.enqueue_and_wait(jobs)
+        await queue.stop()
+
+    assert facts == 1
+    texts, contents = mock_ai.extract_facts_batch.await_args.args
+    assert texts["w0"].count("\n") == 2
+    assert "Alice" not in contents["w0"]
+    [fact] = await repo.get_recent_facts(chat_id=1, limit=5)
+    assert fact.source_message_id == ids[2]
+    assert await repo.get_fact_source_ids([fact.id]) == {fact.id: {ids[0], ids[2]}}
+
+
+@pytest.mark.asyncio
+async def test_already_extracted_neighbours_are_context_only(repo, fast_settings):
+    first, second = make_row(1), make_row(2)
+    first["text"] = "Eu trabalho no Nubank"
+    second.update(sender_id=20, sender_name="Bob", text="Que legal, eu adoro Rust")
+    second["date"] = first["date"] + timedelta(minutes=2)
+    ids = list((await repo.save_messages_returning_ids([first, second])).values())
+    nubank = {"entity": "Nubank", "value": "Trabalha", "category": "trabalho", "lines": [1]}
+    rust = {"entity": "Rust", "value": "Adora", "category": "tech", "lines": [2]}
+
+    with patch("backend.services.extraction_queue.ai_service") as mock_ai:
+        mock_ai.pack_by_token_budget = AIService.pack_by_token_budget
+        mock_ai.extract_facts_batch = AsyncMock(return_value={"w0": [nubank]})
+        queue = ExtractionQueue(repository=repo, workers=1)
+        await queue.enqueue_and_wait([{"message_id": ids[0], "chat_id": 1, "sender_id": 10}])
+
+        # The model re-reads line 1 in the second window but may not learn from it again
+        mock_ai.extract_facts_batch.return_value = {"w0": [dict(nubank), rust]}
+        await queue.enqueue_and_wait([{"message_id": ids[1], "chat_id": 1, "sender_id": 20}])
+        await queue.stop()
+
+    texts, _ = mock_ai.extract_facts_batch.await_args.args
+    assert texts["w0"].splitlines()[0] == "1. (contexto) Alice: Eu trabalho no Nubank"
+    facts = await repo.get_recent_facts(chat_id=1, limit=5)
+    assert sorted(f.entity_name for f in facts) == ["Nubank", "Rust"]
+    rust_fact = next(f for f in facts if f.entity_name == "Rust")
+    assert await repo.get_fact_source_ids([rust_fact.id]) == {rust_fact.id: {ids[1]}}
@@ -0,0 +1,130 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from backend.services.fact_cache import FactSetCache
+from backend.settings import settings
+
+
+def loader_for(repo, chat_id, sender_id=None):
+    async def load():
+        return await repo.get_recent_facts(chat_id, sender_id)
+
+    return AsyncMock(side_effect=load)
+
+
+@pytest.mark.asyncio
+async def test_hits_until_a_fact_write_touches_the_scope(repo):
+    cache = FactSetCache(repository=repo)
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 1,
+                "sender_id": 10,
+                "source_message_id": 1,
+                "entity_name": "Pet",
+                "value": "Gato",
+            }
+        ]
+    )
+    load = loader_for(repo, 1, 10)
+
+    assert len(await cache.get_or_load("recent", 1, 10, load)) == 1
+    assert len(await cache.get_or_load("recent", 1, 10, load)) == 1
+    assert load.await_count == 1
+
+    # Other chats and senders leave the entry alone
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 2,
+                "sender_id": 20,
+                "source_message_id": 2,
+                "entity_name": "Cor",
+                "value": "Azul",
+            }
+        ]
+    )
+    await cache.get_or_load("recent", 1, 10, load)
+    assert load.await_count == 1
+
+    # The same sender learning something in another chat is in scope
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 3,
+                "sender_id": 10,
+                "source_message_id": 3,
+                "entity_name": "Time",
+                "value": "Bahia",
+            }
+        ]
+    )
+    assert len(await cache.get_or_load("recent", 1, 10, load)) == 2
+    assert cache.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_consolidation_and_deletion_invalidate(repo):
+    cache = FactSetCache(repository=repo)
+    await repo.save_messages(
+        [
+            {
+                "telegram_message_id": 5,
+                "chat_id": 1,
+                "sender_id": 10,
+                "text": "tenho um gato",
+                "is_outgoing": False,
+            }
+        ]
+    )
+    db_ids = await repo.get_message_ids(1, [5])
+    await repo.save_fact_rows(
+        [
+            {
+                "chat_id": 1,
+                "sender_id": 10,
+                "source_message_id": db_ids[5],
+                "entity_name": "Pet",
+                "value": "Gato",
+            }
+        ]
+    )
+    load = loader_for(repo, 1, 10)
+    await cache.get_or_load("recent", 1, 10, load)
+
+    await repo.apply_fact_consolidation([], {})
+    await cache.get_or_load("recent", 1, 10, load)
+    assert load.await_count == 1
+
+    [fact] = await repo.get_recent_facts(1)
+    await repo.apply_fact_consolidation([], {fact.id: None})
+    await cache.get_or_load("recent", 1, 10, load)
+    assert load.await_count == 2
+
+    await repo.delete_messages(1, [5])
+    assert await cache.get_or_load("recent", 1, 10, load) == []
+
+
+@pytest.mark.asyncio
+async def test_write_during_load_is_not_served_as_fresh(repo):
+    cache = FactSetCache(repository=repo)
+
+    async def stale_load():
+        # A write commits while the (old) rows are being read
+        await repo.save_fact_rows(
+            [{"chat_id": 1, "source_message_id": 1, "entity_name": "Pet", "value": "Gato"}]
+        )
+        return []
+
+    assert await cache.get_or_load("recent", 1, None, stale_load) == []
+    assert len(await cache.get_or_load("recent", 1, None, loader_for(repo, 1))) == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_bound(repo):
+    cache = FactSetCache(repository=repo)
+    with patch.object(settings, "FACT_CACHE_MAX_ENTRIES", 2):
+        for chat_id in (1, 2, 3):
+            await cache.get_or_load("recent", chat_id, None, AsyncMock(return_value=[]))
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evicted"] == 1
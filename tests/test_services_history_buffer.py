@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from backend.database import Message
+from backend.services.history_buffer import ChatHistoryBuffer
+from backend.settings import settings
+
+BASE = datetime(2024, 1, 1, 12, 0)
+
+
+def row(tid, text="hi", minutes=0, chat_id=1):
+    return {
+        "telegram_message_id": tid,
+        "chat_id": chat_id,
+        "sender_id": 7,
+        "sender_name": "Ana",
+        "text": text,
+        "date": (BASE + timedelta(minutes=minutes)).replace(tzinfo=timezone.utc),
+        "is_outgoing": False,
+    }
+
+
+def test_events_before_warm_are_merged_with_db_rows():
+    buffer = ChatHistoryBuffer()
+    buffer.append(1, row(3, "live", minutes=3))
+    assert buffer.get(1, 20) is None
+
+    # SQLite rows carry naive datetimes
+    stored = [
+        Message(telegram_message_id=i, chat_id=1, text=f"db {i}", date=BASE + timedelta(minutes=i))
+        for i in (1, 2, 3)
+    ]
+    history = buffer.warm(1, stored)
+
+    assert [m.telegram_message_id for m in history] == [1, 2, 3]
+    assert [m.text for m in buffer.get(1, 2)] == ["db 2", "live"]
+    assert buffer.stats()["hits"] == 1
+    assert buffer.stats()["misses"] == 1
+
+
+def test_ring_keeps_newest_and_tracks_edits_and_deletes():
+    buffer = ChatHistoryBuffer()
+    buffer.warm(1, [])
+    with patch.object(settings, "HISTORY_BUFFER_MESSAGES_PER_CHAT", 3):
+        for i in range(5):
+            buffer.append(1, row(i, minutes=i))
+        assert [m.telegram_message_id for m in buffer.get(1, 3)] == [2, 3, 4]
+
+        buffer.edit(1, 4, "edited")
+        assert buffer.get(1, 1)[0].text == "edited"
+
+        # Private-chat deletions arrive without a chat ID
+        buffer.delete(None, [4])
+        assert buffer.get(1, 3) is None
+
+
+def test_lru_eviction_by_chat_count_and_memory():
+    buffer = ChatHistoryBuffer()
+    with patch.object(settings, "HISTORY_BUFFER_MAX_CHATS", 2):
+        for chat_id in (1, 2):
+            buffer.warm(chat_id, [row(1, chat_id=chat_id)])
+        buffer.get(1, 1)
+        buffer.warm(3, [row(1, chat_id=3)])
+    assert buffer.get(2, 1) is None
+    assert buffer.get(1, 1) is not None
+    assert buffer.stats()["evicted_chats"] == 1
+
+    with patch.object(settings, "HISTORY_BUFFER_MAX_BYTES", buffer.size + 100):
+        buffer.append(1, row(2, "x" * 1000, minutes=1))
+    assert buffer.stats()["chats"] == 1
+    assert buffer.get(1, 2) is not None
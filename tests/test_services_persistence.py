@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from backend.services.persistence import MessageWriter
+
+
+def make_row(telegram_message_id, chat_id=1):
+    return {
+        "telegram_message_id": telegram_message_id,
+        "chat_id": chat_id,
+        "sender_id": 10,
+        "sender_name": "Alice",
+        "text": f"message {telegram_message_id}",
+        "date": datetime.now(timezone.utc),
+        "is_outgoing": False,
+    }
+
+
+@pytest.mark.asyncio
+async def test_burst_is_flushed_in_one_transaction(repo):
+    writer = MessageWriter(repository=repo, flush_size=100, flush_interval_ms=20)
+
+    futures = [writer.enqueue(make_row(i)) for i in range(10)]
+    ids = await asyncio.gather(*futures)
+
+    assert all(ids)
+    assert len(set(ids)) == 10
+    assert writer.flush_count == 1
+    assert writer.stats()["rows_written"] == 10
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_triggered_by_size():
+    mock_repo = MagicMock()
+    mock_repo.save_messages_returning_ids = AsyncMock(
+        side_effect=lambda rows: {(r["chat_id"], r["telegram_message_id"]): 1 for r in rows}
+    )
+    # Very long interval: only the size threshold can trigger flushes
+    writer = MessageWriter(repository=mock_repo, flush_size=3, flush_interval_ms=60_000)
+
+    futures = [writer.enqueue(make_row(i)) for i in range(6)]
+    await asyncio.gather(*futures)
+
+    assert mock_repo.save_messages_returning_ids.await_count == 2
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending_rows(repo):
+    writer = MessageWriter(repository=repo, flush_size=1000, flush_interval_ms=60_000)
+    futures = [writer.enqueue(make_row(i)) for i in range(5)]
+
+    await writer.stop()
+
+    assert all(f.done() and f.result() for f in futures)
+    assert await repo.get_last_synced_id(1) == 4
+
+
+@pytest.mark.asyncio
+async def test_flush_error_resolves_none():
+    mock_repo = MagicMock()
+    mock_repo.save_messages_returning_ids = AsyncMock(side_effect=Exception("locked"))
+    writer = MessageWriter(repository=mock_repo, flush_size=10, flush_interval_ms=1)
+
+    assert await writer.save(make_row(1)) is None
+    assert writer.stats()["failed_rows"] == 1
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_edits_and_deletions_are_batched(repo):
+    writer = MessageWriter(repository=repo, flush_size=100, flush_interval_ms=20)
+    ids = await asyncio.gather(*[writer.enqueue(make_row(i)) for i in range(4)])
+    await repo.save_fact_rows(
+        [
+            {"chat_id": 1, "entity_name": "E", "value": "V", "source_message_id": ids[0]},
+            {"chat_id": 1, "entity_name": "F", "value": "W", "source_message_id": ids[1]},
+        ]
+    )
+
+    flushes = writer.flush_count
+    results = await asyncio.gather(
+        writer.edit({**make_row(0), "text": "edited message"}),
+        writer.edit({**make_row(2), "text": "  MESSAGE 2 "}),  # Same normalized text
+        writer.delete(1, [1]),
+        writer.delete(1, [3]),
+    )
+
+    assert results == [ids[0], None, 1, 0]
+    assert writer.flush_count == flushes  # Edits and deletions ride the same flush
+    assert writer.stats()["rows_edited"] == 1
+    assert writer.stats()["rows_deleted"] == 2
+    assert writer.stats()["facts_retracted"] == 1
+    assert [m.text for m in await repo.get_recent_history(1)] == ["edited message", "message 2"]
+    assert await repo.count_facts() == 0
+    await writer.stop()
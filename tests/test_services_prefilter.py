@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from backend.services.learning import LearningService
+from backend.services.prefilter import HeuristicPreFilter
+
+
+@pytest.fixture
+def prefilter():
+    return HeuristicPreFilter(threshold=0.4)
+
+
+@pytest.mark.parametrize(
+    "text, reason",
+    [
+        ("kkkkkkkkkkkkkkkkkkkk", "repetitive"),
+        ("hahahahahahahahaha", "repetitive"),
+        ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "url_only"),
+        (
+            'Traceback (most recent call last):\n  File "app.py", line 3\nValueError: boom',
+            "code_or_log",
+        ),
+        ("const x = {a: 1}; foo(x); bar[0] = x;", "code_or_log"),
+        ("ok blz entao ta bom", "low_score"),
+    ],
+)
+def test_low_value_messages_are_skipped(prefilter, text, reason):
+    result = prefilter.evaluate(text)
+    assert not result.passed
+    assert result.reason == reason
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Eu odeio Java, prefiro Python no trabalho",
+        "Minha irmã Ana faz aniversário dia 12 de março",
+        "Trabalho na Nubank desde 2021 como engenheiro",
+        "Ele mora em Curitiba e tem 30 anos",
+    ],
+)
+def test_fact_bearing_messages_pass(prefilter, text):
+    assert prefilter.evaluate(text).passed
+
+
+def test_skip_stats(prefilter):
+    assert prefilter.should_extract("Meu cachorro se chama Thor e adora pizza")
+    assert not prefilter.should_extract("kkkkkkkkkkkkkkkk")
+
+    stats = prefilter.stats()
+    assert stats["seen"] == 2
+    assert stats["skip_rate"] == 0.5
+    assert stats["skipped_by_reason"] == {"repetitive": 1}
+
+
+def test_evaluate_corpus_does_not_touch_live_stats(prefilter):
+    report = prefilter.evaluate_corpus(
+        ["kkkkkkkkkkkk", "Eu moro em Lisboa desde 2019", "https://example.com/x"], samples=1
+    )
+
+    assert report["total"] == 3
+    assert report["would_skip"] == 2
+    assert report["skipped_by_reason"] == {"repetitive": 1, "url_only": 1}
+    assert report["examples"]["url_only"][0]["text"] == "https://example.com/x"
+    assert prefilter.stats()["seen"] == 0
+
+
+@pytest.mark.asyncio
+async def test_learning_service_evaluates_stored_corpus(repo):
+    rows = [
+        {
+            "telegram_message_id": i,
+            "chat_id": 1,
+            "sender_id": 10,
+            "sender_name": "Alice",
+            "text": text,
+            "date": datetime.now(timezone.utc),
+            "is_outgoing": False,
+        }
+        for i, text in enumerate(["kkkkkkkkkkkkkk", "Minha mãe se chama Maria", "oi"])
+    ]
+    await repo.save_messages(rows)
+
+    service = LearningService()
+    with patch("backend.services.learning.repository", repo):
+        report = await service.evaluate_prefilter(chat_id=1)
+
+    # "oi" is below MIN_MESSAGE_LENGTH_FOR_LEARNING and never reaches the filter
+    assert report["total"] == 2
+    assert report["would_skip"] == 1
@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+from backend.services.prompt_builder import ConversationPromptBuilder, truncate_middle
+from backend.settings import settings
+from backend.utils import estimate_tokens
+
+
+def test_truncate_middle_keeps_both_ends():
+    text = "START " + "x" * 10_000 + " END"
+    cut = truncate_middle(text, 50)
+    assert estimate_tokens(cut) <= 50
+    assert cut.startswith("START") and cut.endswith("END")
+    assert "[…]" in cut
+    assert truncate_middle("short", 50) == "short"
+
+
+def test_build_drops_low_priority_facts_and_oldest_history():
+    builder = ConversationPromptBuilder()
+    facts = [f"- fact {i} " + "y" * 40 for i in range(100)]
+    history = [f"[Hoje 10:{i:02d}] Ana: line {i} " + "z" * 40 for i in range(60)]
+
+    with (
+        patch.object(settings, "PROMPT_FACTS_TOKEN_BUDGET", 60),
+        patch.object(settings, "PROMPT_HISTORY_TOKEN_BUDGET", 60),
+    ):
+        built = builder.build(facts, history, "User Ana says: oi")
+
+    report = built.report
+    assert "fact 0 " in built.text and "fact 99" not in built.text
+    assert "line 59" in built.text and "line 0 " not in built.text
+    assert report.facts <= 60 and report.history <= 60
+    assert report.facts_dropped > 0 and report.history_dropped > 0
+    assert builder.stats()["calls"] == 1
+
+
+def test_pasted_log_is_bounded():
+    builder = ConversationPromptBuilder()
+    pasted = "Traceback " + "frame\n" * 50_000
+    built = builder.build([], [f"[Hoje 10:00] Ana: {pasted}"], f"User Ana says: {pasted}")
+
+    assert built.report.truncated == 2
+    assert built.report.total <= builder.stats()["input_token_bound"]
+    assert estimate_tokens(built.text) <= built.report.total + 5
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from backend.services.ai import AIService
+from backend.services.rate_limiter import AdaptiveRateLimiter, Priority, is_rate_limit_error
+
+
+@pytest.mark.asyncio
+async def test_requests_within_budget_are_granted_immediately():
+    limiter = AdaptiveRateLimiter(requests_per_minute=10, tokens_per_minute=10_000)
+    for _ in range(10):
+        await asyncio.wait_for(limiter.acquire(100), 0.5)
+
+    stats = limiter.stats()
+    assert stats["granted"] == 10
+    assert stats["requests_available"] < 1
+
+
+@pytest.mark.asyncio
+async def test_conversation_goes_before_extraction_and_reports():
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, tokens_per_minute=100_000)
+    limiter.requests.tokens = 0  # Empty bucket: everyone queues (one grant per 0.1s)
+
+    order = []
+
+    async def call(name, priority):
+        await limiter.acquire(10, priority)
+        order.append(name)
+
+    tasks = [
+        asyncio.create_task(call("report", Priority.REPORT)),
+        asyncio.create_task(call("extraction", Priority.EXTRACTION)),
+    ]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("conversation", Priority.CONVERSATION)))
+    await asyncio.wait_for(asyncio.gather(*tasks), 2)
+
+    assert order == ["conversation", "extraction", "report"]
+    assert limiter.stats()["max_wait_ms"]["report"] > 0
+
+
+@pytest.mark.asyncio
+async def test_token_budget_limits_large_requests():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, tokens_per_minute=6000)
+    await limiter.acquire(6000)
+
+    # 600 tokens refill in ~6s at 6000 TPM
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(limiter.acquire(600), 0.2)
+
+
+def test_aimd_adjusts_limits():
+    limiter = AdaptiveRateLimiter(requests_per_minute=20, tokens_per_minute=100_000)
+
+    limiter.on_rate_limited()
+    assert limiter.stats()["rpm_limit"] == 10
+    assert limiter.stats()["tpm_limit"] == 50_000
+
+    limiter.on_success()
+    assert limiter.stats()["rpm_limit"] == 11
+
+    for _ in range(20):
+        limiter.on_rate_limited()
+    assert limiter.stats()["rate_factor"] == 0.1  # AI_RATE_MIN_FACTOR floor
+
+
+def test_is_rate_limit_error():
+    api_error = Exception("boom")
+    api_error.code = 429
+    assert is_rate_limit_error(api_error)
+    assert is_rate_limit_error(Exception("429 RESOURCE_EXHAUSTED. Quota exceeded"))
+    assert not is_rate_limit_error(Exception("500 INTERNAL"))
+
+
+@pytest.mark.asyncio
+async def test_ai_service_reports_rate_limit_to_limiter():
+    with patch("backend.services.ai.genai.Client"):
+        service = AIService()
+    service.client = MagicMock()
+    service.client.aio.models.generate_content = AsyncMock(
+        side_effect=Exception("429 RESOURCE_EXHAUSTED")
+    )
+
+    reply = await service.generate_natural_response.__wrapped__(service, 1, "oi")
+
+    assert "timeout" in reply
+    assert service.rate_limiter.rate_limited == 1
+    assert service.rate_limiter.stats()["granted"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.conversation import SHED_REPLY, ConversationService
+from backend.services.reply_admission import ReplyAdmissionController
+from backend.settings import settings
+
+PRIVATE_CHAT = 111
+GROUP_CHAT = -100222
+
+
+@pytest.mark.asyncio
+async def test_private_chats_go_first_and_busy_chats_wait():
+    controller = ReplyAdmissionController()
+    order = []
+
+    async def reply(name, chat_id):
+        assert await controller.acquire(chat_id)
+        order.append(name)
+
+    with patch.object(settings, "REPLY_MAX_CONCURRENT", 1):
+        assert await controller.acquire(GROUP_CHAT)
+        tasks = [
+            asyncio.create_task(reply("group", GROUP_CHAT - 1)),
+            asyncio.create_task(reply("private", PRIVATE_CHAT)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == {"private": 1, "group": 1}
+
+        controller.release(GROUP_CHAT)
+        await asyncio.sleep(0.01)
+        assert order == ["private"]
+        controller.release(PRIVATE_CHAT)
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+    assert order == ["private", "group"]
+    assert controller.stats()["admitted"] == 3
+
+
+@pytest.mark.asyncio
+async def test_per_chat_limit_does_not_block_other_chats():
+    controller = ReplyAdmissionController()
+    assert await controller.acquire(GROUP_CHAT)
+    second = asyncio.create_task(controller.acquire(GROUP_CHAT))
+    await asyncio.sleep(0)
+
+    # Another chat is admitted although a request for the busy chat is queued
+    assert await asyncio.wait_for(controller.acquire(PRIVATE_CHAT), 0.5)
+    assert not second.done()
+    controller.release(GROUP_CHAT)
+    assert await asyncio.wait_for(second, 0.5)
+    assert controller.stats()["active"] == 2
+
+
+@pytest.mark.asyncio
+async def test_overflow_and_stale_requests_are_shed():
+    controller = ReplyAdmissionController()
+    with (
+        patch.object(settings, "REPLY_MAX_CONCURRENT", 1),
+        patch.object(settings, "REPLY_QUEUE_MAX", 1),
+        patch.object(settings, "REPLY_QUEUE_MAX_WAIT", 0.05),
+    ):
+        assert await controller.acquire(PRIVATE_CHAT)
+        queued = asyncio.create_task(controller.acquire(GROUP_CHAT))
+        await asyncio.sleep(0)
+        # The queue is full and a group request ranks last: it is shed at once
+        assert await asyncio.wait_for(controller.acquire(GROUP_CHAT - 1), 0.5) is False
+        # Nobody releases: the queued request goes stale
+        assert await asyncio.wait_for(queued, 1) is False
+
+    stats = controller.stats()
+    assert stats["shed_overflow"] == 1
+    assert stats["shed_stale"] == 1
+    assert stats["queued"] == {"private": 0, "group": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    controller = ReplyAdmissionController()
+    assert await controller.acquire(GROUP_CHAT)
+    waiting = asyncio.create_task(controller.acquire(GROUP_CHAT))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    controller.release(GROUP_CHAT)
+    assert controller.stats()["active"] == 0
+    assert controller.stats()["queued"]["group"] == 0
+
+
+@pytest.mark.asyncio
+async def test_shed_reply_sends_cheap_fallback():
+    service = ConversationService()
+    service.client = MagicMock()
+    service.client.send_message = AsyncMock()
+    service.admission.acquire = AsyncMock(return_value=False)
+    with (
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch("backend.services.conversation.send_reaction", new_callable=AsyncMock) as react,
+    ):
+        await service._generate_and_send_reply(GROUP_CHAT, "oi", "TestUser", reply_to_msg_id=7)
+        await service._generate_and_send_reply(PRIVATE_CHAT, "oi", "TestUser")
+
+    mock_ai.generate_natural_response.assert_not_called()
+    react.assert_awaited_once_with(GROUP_CHAT, 7, settings.REPLY_SHED_REACTION)
+    service.client.send_message.assert_awaited_once_with(PRIVATE_CHAT, SHED_REPLY)
@@ -0,0 +1,117 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.conversation import ConversationService
+from backend.services.reply_stream import (
+    TELEGRAM_MESSAGE_LIMIT,
+    ProgressiveReply,
+    split_reaction,
+)
+from backend.settings import settings
+
+
+def make_client():
+    client = MagicMock()
+    client.send_message = AsyncMock(side_effect=lambda chat_id, text, reply_to=None: text)
+    client.edit_message = AsyncMock()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_first_sentence_sent_early_then_edited():
+    client = make_client()
+    reply = ProgressiveReply(client, 1, reply_to=9)
+    with patch.object(settings, "CONVERSATION_STREAM_EDIT_INTERVAL", 0):
+        await reply.feed("Boa mano")
+        client.send_message.assert_not_awaited()
+        await reply.feed("! Era o")
+        client.send_message.assert_awaited_once_with(1, "Boa mano! Era o", reply_to=9)
+        await reply.feed(" que?")
+        assert await reply.finish() == "Boa mano! Era o que?"
+
+    client.edit_message.assert_awaited_with(1, "Boa mano! Era o", "Boa mano! Era o que?")
+    assert reply.first_sent_after is not None
+
+
+@pytest.mark.asyncio
+async def test_edits_are_rate_limited():
+    client = make_client()
+    reply = ProgressiveReply(client, 1)
+    with (
+        patch.object(settings, "CONVERSATION_STREAM_EDIT_INTERVAL", 60),
+        patch("backend.services.reply_stream.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        await reply.feed("Primeira frase. ")
+        for word in ["mais ", "texto ", "chegando"]:
+            await reply.feed(word)
+        client.edit_message.assert_not_awaited()
+        await reply.finish()
+
+    # One final edit, after waiting out the interval
+    client.edit_message.assert_awaited_once()
+    mock_sleep.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_reaction_tag_split_across_chunks_and_long_text_appended():
+    client = make_client()
+    on_reaction = AsyncMock()
+    reply = ProgressiveReply(client, 1, on_reaction=on_reaction)
+    with patch.object(settings, "CONVERSATION_STREAM_EDIT_INTERVAL", 0):
+        await reply.feed("[REAC")
+        await reply.feed("TION: 😂] ")
+        on_reaction.assert_awaited_once_with("😂")
+        await reply.feed("x" * (TELEGRAM_MESSAGE_LIMIT + 10) + ".")
+        await reply.finish()
+
+    sent = [call.args[1] for call in client.send_message.await_args_list]
+    assert len(sent) == 2
+    assert "REACTION" not in sent[0]
+    assert len(sent[0]) == TELEGRAM_MESSAGE_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_reaction_tag_in_the_middle_is_sent_and_never_shown():
+    client = make_client()
+    on_reaction = AsyncMock()
+    reply = ProgressiveReply(client, 1, on_reaction=on_reaction)
+    with patch.object(settings, "CONVERSATION_STREAM_EDIT_INTERVAL", 0):
+        for chunk in [
+            "Boa! Deploy feito ",
+            "[REA",
+            "CTION: 🎉",
+            "] sem ",
+            "rollback. [REACTION: 👍]",
+        ]:
+            await reply.feed(chunk)
+        assert await reply.finish() == "Boa! Deploy feito sem rollback."
+
+    on_reaction.assert_awaited_once_with("🎉")
+    shown = [call.args[1] for call in client.send_message.await_args_list] + [
+        call.args[2] for call in client.edit_message.await_args_list
+    ]
+    assert not any("[" in text for text in shown)
+    assert split_reaction("Boa! [REACTION: 🎉] Valeu") == ("🎉", "Boa! Valeu")
+
+
+@pytest.mark.asyncio
+async def test_conversation_streams_reply():
+    async def chunks(*args):
+        for chunk in ["[REACTION: 🎉] Boa! ", "Deploy feito."]:
+            yield chunk
+
+    service = ConversationService()
+    service.client = make_client()
+    service.client.action.return_value = AsyncMock()
+    with (
+        patch.object(settings, "CONVERSATION_STREAMING_ENABLED", True),
+        patch("backend.services.conversation.ai_service") as mock_ai,
+        patch("backend.services.conversation.send_reaction", new_callable=AsyncMock) as mock_react,
+        patch("asyncio.sleep", new_callable=AsyncMock),
+    ):
+        mock_ai.stream_natural_response = chunks
+        await service._generate_and_send_reply(1, "Consegui!", "Ana", reply_to_msg_id=5)
+
+    mock_react.assert_awaited_once_with(1, 5, "🎉")
+    service.client.send_message.assert_awaited_once_with(1, "Boa!", reply_to=5)
+    assert service.client.edit_message.await_args.args[2] == "Boa! Deploy feito."
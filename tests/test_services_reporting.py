@@ -5,8 +5,9 @@ from backend.services.reporting import ReportingService
 
 
 @pytest.fixture
-def mock_session():
-    with patch("backend.services.reporting.Session") as mock:
+def mock_repository():
+    with patch("backend.services.reporting.repository") as mock:
+        mock.messages_since = AsyncMock(return_value=[])
         yield mock
 
 
@@ -23,65 +24,59 @@ def mock_ai_service():
 
 
 @pytest.mark.asyncio
-async def test_generate_daily_report_no_messages(mock_session, mock_client):
+async def test_generate_daily_report_no_messages(mock_repository, mock_client):
     # Mock empty messages
     with patch("backend.services.reporting.settings") as mock_settings:
         mock_settings.REPORT_CHANNEL_ID = 123
-        with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-            mock_thread.return_value = []
+        service = ReportingService()
+        await service.generate_daily_report()
 
-            service = ReportingService()
-            await service.generate_daily_report()
-
-            mock_client.send_message.assert_not_called()
+        mock_client.send_message.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_generate_daily_report_with_messages(mock_session, mock_client, mock_ai_service):
+async def test_generate_daily_report_with_messages(mock_repository, mock_client, mock_ai_service):
     # Mock messages
     mock_msg = MagicMock()
     mock_msg.chat_id = 123
+    mock_repository.messages_since.return_value = [mock_msg]
 
-    with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-        mock_thread.return_value = [mock_msg]
-
-        mock_ai_service.summarize_conversations = AsyncMock(return_value="Summary")
+    mock_ai_service.summarize_conversations = AsyncMock(return_value="Summary")
 
-        with patch("backend.services.reporting.settings") as mock_settings:
-            mock_settings.REPORT_CHANNEL_ID = -100
-            mock_settings.REPORT_CONTEXT_LIMIT = 1000
+    with patch("backend.services.reporting.settings") as mock_settings:
+        mock_settings.REPORT_CHANNEL_ID = -100
+        mock_settings.REPORT_CONTEXT_LIMIT = 1000
 
-            mock_entity = MagicMock()
-            mock_entity.id = 100
-            mock_client.get_entity = AsyncMock(return_value=mock_entity)
-            mock_client.send_message = AsyncMock()
+        mock_entity = MagicMock()
+        mock_entity.id = 100
+        mock_client.get_entity = AsyncMock(return_value=mock_entity)
+        mock_client.send_message = AsyncMock()
 
-            service = ReportingService()
-            await service.generate_daily_report()
+        service = ReportingService()
+        await service.generate_daily_report()
 
-            mock_client.send_message.assert_called()
-            args, _ = mock_client.send_message.call_args
-            assert "Summary" in args[1]
-            assert "Estatísticas" in args[1]
+        mock_client.send_message.assert_called()
+        args, _ = mock_client.send_message.call_args
+        assert "Summary" in args[1]
+        assert "Estatísticas" in args[1]
 
 
 @pytest.mark.asyncio
-async def test_generate_daily_report_no_channel_id(mock_session, mock_client, mock_ai_service):
+async def test_generate_daily_report_no_channel_id(mock_repository, mock_client, mock_ai_service):
     # Test Fallback to Saved Messages
     mock_msg = MagicMock()
     mock_client.get_me = AsyncMock(return_value=MagicMock(id=12345))
     mock_client.send_message = AsyncMock()
+    mock_repository.messages_since.return_value = [mock_msg]
 
-    with patch("asyncio.to_thread", new_callable=AsyncMock) as mock_thread:
-        mock_thread.return_value = [mock_msg]
-        mock_ai_service.summarize_conversations = AsyncMock(return_value="Summary")
+    mock_ai_service.summarize_conversations = AsyncMock(return_value="Summary")
 
-        with patch("backend.services.reporting.settings") as mock_settings:
-            mock_settings.REPORT_CHANNEL_ID = None
-            mock_settings.REPORT_CONTEXT_LIMIT = 1000
-            service = ReportingService()
-            await service.generate_daily_report()
-
-            # Should call get_me and then send_message
-            mock_client.get_me.assert_called_once()
-            mock_client.send_message.assert_called_once()
+    with patch("backend.services.reporting.settings") as mock_settings:
+        mock_settings.REPORT_CHANNEL_ID = None
+        mock_settings.REPORT_CONTEXT_LIMIT = 1000
+        service = ReportingService()
+        await service.generate_daily_report()
+
+        # Should call get_me and then send_message
+        mock_client.get_me.assert_called_once()
+        mock_client.send_message.assert_called_once()
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 from backend.services.learning import LearningService
@@ -26,31 +27,80 @@ async def test_learning_from_outgoing_message_robust():
     mock_event.sender = User(id=456, first_name="Me", last_name="Myself")
 
     with patch.object(service, "_save_message_to_db", return_value=999):
-        with patch.object(service, "_analyze_and_extract", new_callable=AsyncMock) as mock_extract:
+        with patch("backend.services.learning.extraction_queue") as mock_queue:
+            mock_queue.enqueue = AsyncMock(return_value=1)
             # Mock _get_me to return a user (not bot)
             with patch.object(service, "_get_me", new_callable=AsyncMock) as mock_get_me:
                 mock_user = MagicMock()
                 mock_user.bot = False
                 mock_get_me.return_value = mock_user
 
-                # We need to ensure asyncio.create_task is called and we await the coro
-                with patch("asyncio.create_task") as mock_create_task:
-                    # Capture the coroutine
-                    captured_coros = []
+                await service.handle_message_learning(mock_event)
 
-                    def side_effect(coro):
-                        captured_coros.append(coro)
-                        return MagicMock()
+                mock_queue.enqueue.assert_awaited_once()
+                job = mock_queue.enqueue.call_args.args[0][0]
+                assert job["message_id"] == 999
+                assert job["chat_id"] == 123
 
-                    mock_create_task.side_effect = side_effect
 
-                    await service.handle_message_learning(mock_event)
+@pytest.mark.asyncio
+async def test_edited_message_is_requeued_only_when_text_changed():
+    service = LearningService()
+    service._me = MagicMock(bot=False)
+
+    mock_event = MagicMock()
+    mock_event.chat_id = 123
+    mock_event.message.message = "Na verdade eu moro em Lisboa agora"
+    mock_event.message.id = 101
+    mock_event.message.out = False
+    mock_event.sender = User(id=456, first_name="Ana")
 
-                    assert mock_create_task.called
-                    if captured_coros:
-                        await captured_coros[0]
+    with (
+        patch("backend.services.learning.message_writer") as mock_writer,
+        patch("backend.services.learning.extraction_queue") as mock_queue,
+    ):
+        mock_queue.enqueue = AsyncMock(return_value=1)
 
-                    mock_extract.assert_called_once()
+        mock_writer.edit = AsyncMock(return_value=None)  # Same normalized text
+        await service.handle_message_edited(mock_event)
+        mock_queue.enqueue.assert_not_awaited()
+
+        mock_writer.edit = AsyncMock(return_value=999)
+        await service.handle_message_edited(mock_event)
+        mock_queue.enqueue.assert_awaited_once()
+        assert mock_queue.enqueue.call_args.args[0][0]["message_id"] == 999
+
+
+@pytest.mark.asyncio
+async def test_streamed_edits_of_own_messages_are_debounced():
+    service = LearningService()
+    service._me = MagicMock(bot=False)
+    events = []
+    for text in ["Olá! Eu", "Olá! Eu moro em", "Olá! Eu moro em Lisboa desde 2020."]:
+        event = MagicMock(chat_id=123)
+        event.message.message = text
+        event.message.id = 101
+        event.message.out = True
+        event.sender = User(id=456, first_name="Eu")
+        events.append(event)
+
+    with (
+        patch("backend.services.learning.settings.LEARNING_OWN_EDIT_DEBOUNCE_SECONDS", 0.05),
+        patch("backend.services.learning.message_writer") as mock_writer,
+        patch("backend.services.learning.extraction_queue") as mock_queue,
+    ):
+        mock_writer.edit = AsyncMock(return_value=999)
+        mock_queue.enqueue = AsyncMock(return_value=1)
+        for event in events:
+            await service.handle_message_edited(event)
+        mock_writer.edit.assert_not_awaited()
+        await asyncio.sleep(0.1)
+
+    # Only the final streamed text is stored and re-extracted
+    mock_writer.edit.assert_awaited_once()
+    assert mock_writer.edit.call_args.args[0]["text"] == "Olá! Eu moro em Lisboa desde 2020."
+    mock_queue.enqueue.assert_awaited_once()
+    assert service._pending_edits == {}
 
 
 @pytest.mark.asyncio
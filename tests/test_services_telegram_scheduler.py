@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from telethon.errors import FloodWaitError
+
+from backend.client import flood_sleep_disabled
+from backend.services.telegram_scheduler import TelegramRpcScheduler
+
+
+@pytest.mark.asyncio
+async def test_flood_wait_pauses_only_its_method_class():
+    scheduler = TelegramRpcScheduler(rpc_per_minute=600)
+    get_messages = AsyncMock(side_effect=[FloodWaitError(request=None, capture=0), ["msg"]])
+    get_entity = AsyncMock(return_value="entity")
+
+    history = asyncio.create_task(scheduler.call("get_messages", get_messages, "chat"))
+    await asyncio.sleep(0.05)
+
+    # get_messages is paused, get_entity is not
+    assert "get_messages" in scheduler.stats()["paused"]
+    assert await asyncio.wait_for(scheduler.call("get_entity", get_entity, 1), 0.2) == "entity"
+    assert not history.done()
+
+    assert await asyncio.wait_for(history, 3) == ["msg"]
+    assert scheduler.stats()["flood_waits"] == {"get_messages": 1}
+    assert get_messages.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_short_flood_wait_pauses_only_its_method_class():
+    # 30s is below Telethon's default flood_sleep_threshold, which used to hide it
+    clock = [1000.0]
+    sleeping, time_passes = asyncio.Event(), asyncio.Event()
+
+    async def fake_sleep(seconds):
+        sleeping.set()
+        await time_passes.wait()
+        clock[0] += seconds
+
+    scheduler = TelegramRpcScheduler(rpc_per_minute=600)
+    get_messages = AsyncMock(side_effect=[FloodWaitError(request=None, capture=30), ["msg"]])
+    get_entity = AsyncMock(return_value="entity")
+    with (
+        patch("backend.services.telegram_scheduler.monotonic", lambda: clock[0]),
+        patch("backend.services.telegram_scheduler.sleep", new=fake_sleep),
+    ):
+        history = asyncio.create_task(scheduler.call("get_messages", get_messages, "chat"))
+        await asyncio.wait_for(sleeping.wait(), 1)
+
+        assert scheduler.stats()["paused"] == {"get_messages": 31.0}
+        assert await asyncio.wait_for(scheduler.call("get_entity", get_entity, 1), 1) == "entity"
+        assert not history.done()
+
+        time_passes.set()
+        assert await asyncio.wait_for(history, 1) == ["msg"]
+    assert scheduler.stats()["flood_waits"] == {"get_messages": 1}
+    assert clock[0] >= 1031.0
+
+
+@pytest.mark.asyncio
+async def test_telethon_flood_sleep_is_disabled_only_inside_calls():
+    async def probe():
+        return flood_sleep_disabled.get()
+
+    scheduler = TelegramRpcScheduler(rpc_per_minute=600)
+    assert await scheduler.call("get_entity", probe) is True
+    assert flood_sleep_disabled.get() is False
+
+
+@pytest.mark.asyncio
+async def test_excessive_flood_wait_is_raised():
+    scheduler = TelegramRpcScheduler(rpc_per_minute=600)
+    func = AsyncMock(side_effect=FloodWaitError(request=None, capture=86400))
+
+    with pytest.raises(FloodWaitError):
+        await scheduler.call("get_messages", func)
+
+
+@pytest.mark.asyncio
+async def test_rpc_budget_is_enforced():
+    scheduler = TelegramRpcScheduler(rpc_per_minute=2)
+    func = AsyncMock(return_value=None)
+
+    await scheduler.call("get_entity", func)
+    await scheduler.call("get_entity", func)
+    # The third call has to wait ~30s for a token
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.call("get_entity", func), 0.2)
+    assert func.await_count == 2
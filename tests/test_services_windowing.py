@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from backend.database import Message
+from backend.services.windowing import build_windows, merge_time_ranges
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def make_message(i, sender_id, seconds, text="hello"):
+    return Message(
+        id=i,
+        telegram_message_id=i,
+        chat_id=1,
+        sender_id=sender_id,
+        sender_name=f"user{sender_id}",
+        text=text,
+        date=START + timedelta(seconds=seconds),
+    )
+
+
+def test_windows_split_on_silence():
+    messages = [make_message(1, 1, 0), make_message(2, 2, 30), make_message(3, 1, 1000)]
+    windows = build_windows(1, messages, max_gap_seconds=300, max_messages=20, max_turns=8)
+    assert [w.message_ids for w in windows] == [[1, 2], [3]]
+
+
+def test_windows_split_on_size_and_turns():
+    messages = [make_message(i, 1, i) for i in range(1, 6)]
+    windows = build_windows(1, messages, max_gap_seconds=300, max_messages=2, max_turns=8)
+    assert [w.message_ids for w in windows] == [[1, 2], [3, 4], [5]]
+
+    alternating = [make_message(i, i % 2, i) for i in range(1, 6)]
+    windows = build_windows(1, alternating, max_gap_seconds=300, max_messages=20, max_turns=2)
+    assert [w.message_ids for w in windows] == [[1, 2], [3, 4], [5]]
+
+
+def test_windows_skip_empty_messages_and_number_lines():
+    messages = [make_message(1, 1, 0, "oi"), make_message(2, 2, 1, ""), make_message(3, 2, 2)]
+    [window] = build_windows(1, messages, max_gap_seconds=300, max_messages=20, max_turns=8)
+
+    assert window.message_ids == [1, 3]
+    assert window.transcript() == "1. user1: oi\n2. user2: hello"
+    assert window.content() == '["oi", "hello"]'
+
+    window.context_ids = {1}
+    assert window.transcript() == "1. (contexto) user1: oi\n2. user2: hello"
+    assert window.content() == '["(contexto) oi", "hello"]'
+    assert [m.id for m in window.extractable] == [3]
+    assert [m.id for m in window.messages_for_lines([2, 2, 9, 0])] == [3]
+
+
+def test_merge_time_ranges():
+    dates = [START + timedelta(seconds=s) for s in (500, 0, 100)]
+    ranges = merge_time_ranges(dates, padding_seconds=60)
+    assert ranges == [
+        (START - timedelta(seconds=60), START + timedelta(seconds=160)),
+        (START + timedelta(seconds=440), START + timedelta(seconds=560)),
+    ]
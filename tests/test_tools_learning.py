@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from backend.tools import learning
 
@@ -20,3 +20,36 @@ async def test_learn_from_chat(mock_learning_service):
     assert "Result for chat 123" in result
     assert "Ingested 50 messages. Learned 5 new facts." in result
     mock_learning_service.ingest_history.assert_called_with(123, 50)
+
+
+@pytest.mark.asyncio
+async def test_backfill_chat_history(mock_learning_service):
+    result_obj = MagicMock()
+    result_obj.message = "Backfilled 300 new messages (120 queued for learning)."
+    mock_learning_service.backfill_history = AsyncMock(return_value=result_obj)
+
+    result = await learning.backfill_chat_history(chat_id=123)
+    assert "Backfilled 300 new messages" in result
+    mock_learning_service.backfill_history.assert_awaited_with(123, None)
+
+
+@pytest.mark.asyncio
+async def test_consolidate_facts():
+    report = MagicMock(facts_scanned=10, clusters=4, rows_reclaimed=5, superseded=1)
+    with patch("backend.tools.learning.fact_consolidation_service") as mock_service:
+        mock_service.consolidate = AsyncMock(return_value=report)
+        result = await learning.consolidate_facts()
+
+    mock_service.consolidate.assert_awaited_with(None)
+    assert "5 duplicate rows removed" in result
+
+
+@pytest.mark.asyncio
+async def test_rebuild_fact_index():
+    with patch("backend.tools.learning.ai_service") as mock_ai:
+        mock_ai.fact_retriever.rebuild = AsyncMock(
+            return_value={"facts": 1200, "index_lists": 0, "seconds": 0.5}
+        )
+        result = await learning.rebuild_fact_index()
+
+    assert "1200 facts" in result
@@ -39,3 +39,28 @@ async def test_resolve_username(mock_client):
 
     result = await search.resolve_username("test")
     assert "ResolvedUser" in result
+
+
+@pytest.mark.asyncio
+async def test_search_local_history():
+    with patch("backend.tools.search.local_search_service") as mock_service:
+        mock_service.search = AsyncMock(
+            return_value={"query": "python", "messages": [{"snippet": "[python]"}], "facts": []}
+        )
+
+        result = await search.search_local_history(
+            "python", chat_id=1, from_date="2024-01-01", limit=5
+        )
+
+        assert "[python]" in result
+        kwargs = mock_service.search.call_args.kwargs
+        assert kwargs["chat_id"] == 1
+        assert kwargs["since"].year == 2024
+        assert kwargs["until"] is None
+        assert kwargs["limit"] == 5
+
+
+@pytest.mark.asyncio
+async def test_search_local_history_invalid_date():
+    result = await search.search_local_history("python", from_date="yesterday")
+    assert "An error occurred" in result